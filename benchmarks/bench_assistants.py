@@ -0,0 +1,177 @@
+"""Throughput, latency and memory of every assistant method on a synthetic corpus.
+
+FreeEmailAssistant methods run directly on a seeded corpus of short, long,
+multi-paragraph and non-ASCII emails. EmailAssistant methods run against the
+local mock endpoint in benchmarks.mock_openai with a fixed injected latency,
+so the numbers isolate client-side overhead (prompt building, scheduling,
+parsing, streaming) from real API variance.
+
+Each case reports calls per second, p50/p99 latency and the peak traced
+memory of a separate tracemalloc pass. Results are written as JSON; pass an
+earlier file with --compare to flag regressions. Run from the repository root:
+
+    python -m benchmarks.bench_assistants --output bench.json
+    python -m benchmarks.bench_assistants --compare bench.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.corpus import compose_inputs, generate_corpus
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.metrics import _percentile
+from email_assistant.scheduler import RequestScheduler
+
+STYLES = ["professional", "friendly", "concise", "formal"]
+RESPONSE_TYPES = ["acknowledge", "meeting", "decline", "follow_up"]
+MEMORY_SAMPLES = 50
+
+
+def measure(fn, inputs, items_per_call=1):
+    """Time fn(*args) for every args tuple in inputs, then trace peak memory on a sample"""
+    fn(*inputs[0])
+    samples = []
+    started = time.perf_counter()
+    for args in inputs:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    wall = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        for args in inputs[:MEMORY_SAMPLES]:
+            fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls': len(samples),
+        'items': len(samples) * items_per_call,
+        'throughput': len(samples) * items_per_call / wall,
+        'p50_ms': _percentile(samples, 50) * 1000,
+        'p99_ms': _percentile(samples, 99) * 1000,
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def free_cases(corpus, composes):
+    assistant = FreeEmailAssistant()
+    texts = [text for _, text in corpus]
+    return {
+        'free.analyze_email_tone': (assistant.analyze_email_tone, [(t,) for t in texts], 1),
+        'free.improve_email': (assistant.improve_email,
+                               [(t, STYLES[i % len(STYLES)]) for i, t in enumerate(texts)], 1),
+        'free.compose_email': (assistant.compose_email, composes, 1),
+        'free.quick_responses': (assistant.quick_responses,
+                                 [(t, RESPONSE_TYPES[i % len(RESPONSE_TYPES)]) for i, t in enumerate(texts)], 1),
+    }
+
+
+def api_cases(corpus, composes, base_url, samples, batch_size):
+    # Limits far above what the mock can serve, so the scheduler never throttles the benchmark
+    scheduler = RequestScheduler(requests_per_minute=10 ** 7, tokens_per_minute=10 ** 10, max_retries=0)
+    assistant = EmailAssistant('sk-benchmark', scheduler=scheduler, base_url=base_url)
+    texts = [text for _, text in corpus][:samples]
+    batches = [(texts[i:i + batch_size],) for i in range(0, len(texts), batch_size)]
+    return {
+        'api.analyze_email_tone': (assistant.analyze_email_tone, [(t,) for t in texts], 1),
+        'api.analyze_many': (assistant.analyze_many, batches, batch_size),
+        'api.improve_email': (assistant.improve_email,
+                              [(t, STYLES[i % len(STYLES)]) for i, t in enumerate(texts)], 1),
+        'api.compose_email': (assistant.compose_email, composes[:samples], 1),
+        'api.quick_responses': (assistant.quick_responses, [(t, "custom") for t in texts], 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print per-case changes against a baseline run and return the names of regressed cases"""
+    regressions = []
+    print(f"\n{'case':<26} {'p50 change':>11} {'throughput change':>18}")
+    for name, current in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        p50 = current['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        throughput = current['throughput'] / before['throughput'] - 1 if before['throughput'] else 0.0
+        flag = ''
+        if p50 > threshold or throughput < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<26} {p50:>+10.1%} {throughput:>+17.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark both email assistants on a synthetic corpus")
+    parser.add_argument('--corpus-size', type=int, default=400, help="Emails in the generated corpus")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--api-samples', type=int, default=40,
+                        help="Emails sent through each EmailAssistant method")
+    parser.add_argument('--batch-size', type=int, default=8, help="Emails per analyze_many call")
+    parser.add_argument('--latency', type=float, default=0.05, help="Injected mock API latency in seconds")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Delay between streamed chunks")
+    parser.add_argument('--skip-api', action='store_true', help="Only benchmark FreeEmailAssistant")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file from an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative slowdown that counts as a regression (default 0.10)")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.corpus_size, args.seed)
+    composes = compose_inputs(args.corpus_size, args.seed)
+    cases = free_cases(corpus, composes)
+
+    server = None
+    if not args.skip_api:
+        server = MockOpenAIServer(latency=args.latency, token_delay=args.token_delay).start()
+        cases.update(api_cases(corpus, composes, server.base_url, args.api_samples, args.batch_size))
+
+    results = {}
+    print(f"{'case':<26} {'calls':>6} {'items/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9}")
+    try:
+        for name, (fn, inputs, items_per_call) in cases.items():
+            result = results[name] = measure(fn, inputs, items_per_call)
+            print(f"{name:<26} {result['calls']:>6} {result['throughput']:>10.1f} {result['p50_ms']:>9.3f} "
+                  f"{result['p99_ms']:>9.3f} {result['peak_kib']:>9.1f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'corpus_size': args.corpus_size,
+            'seed': args.seed,
+            'api_samples': args.api_samples,
+            'latency': args.latency,
+            'token_delay': args.token_delay,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Quick-reply latency and failover with several backends.
+
+Starts two mock endpoints, a slower "primary" and a faster "local" one, and
+sends the same custom quick replies through:
+
+- one EmailAssistant on the primary endpoint only
+- a BackendRegistry with both, where LatencySelector sends quick replies to
+  whichever has been faster and everything else to the primary
+
+then makes the primary answer every request with a 503 and sends analyses
+through both, to count how many fail without and with failover. Run from
+the repository root:
+
+    python -m benchmarks.bench_backends
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.backends import Backend, BackendRegistry
+from email_assistant.scheduler import CircuitBreaker, RequestScheduler
+
+
+def scheduler():
+    # No rate limits to speak of, and give up on a dead endpoint quickly
+    return RequestScheduler(requests_per_minute=10 ** 7, tokens_per_minute=10 ** 10, max_retries=1,
+                            base_delay=0.01, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+
+def timed(fn, items):
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare one backend with latency-aware selection and failover")
+    parser.add_argument('--size', type=int, default=50, help="Quick replies and analyses each")
+    parser.add_argument('--primary-latency', type=float, default=0.08, help="Mock primary latency in seconds")
+    parser.add_argument('--local-latency', type=float, default=0.02, help="Mock local latency in seconds")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    emails = [text for _, text in generate_corpus(args.size, args.seed)]
+    primary = MockOpenAIServer(latency=args.primary_latency).start()
+    local = MockOpenAIServer(latency=args.local_latency).start()
+    single = EmailAssistant('sk-benchmark', scheduler=scheduler(), base_url=primary.base_url)
+    registry = BackendRegistry([
+        Backend('primary', primary.base_url, 'sk-benchmark', scheduler=scheduler()),
+        Backend('local', local.base_url, model='local-model', json_mode=True, scheduler=scheduler()),
+    ])
+    multi = EmailAssistant('sk-benchmark', backends=registry)
+
+    print(f"{'setup':<22} {'quick p50 ms':>13} {'quick p95 ms':>13}")
+    for label, assistant in (('primary only', single), ('latency-aware', multi)):
+        p50, p95 = timed(lambda text: assistant.quick_responses(text, 'custom', use_cache=False), emails)
+        print(f"{label:<22} {p50 * 1000:>13.1f} {p95 * 1000:>13.1f}")
+    for backend in registry.stats():
+        print(f"  {backend['name']}: {backend['calls']} calls, average {backend['latency'] * 1000:.1f} ms")
+
+    primary.error_rate = 1.0
+    print(f"\n{'primary down':<22} {'analyses failed':>16}")
+    for label, assistant in (('primary only', single), ('with failover', multi)):
+        failed = sum('error' in assistant.analyze_email_tone(text, use_cache=False) for text in emails)
+        print(f"{label:<22} {failed:>9} / {len(emails)}")
+    for server in (primary, local):
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
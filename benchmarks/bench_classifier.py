@@ -0,0 +1,78 @@
+"""Throughput of the hashed n-gram tone classifier against the keyword rules.
+
+A ToneClassifier is trained on the synthetic corpus, labeled with the
+rule engine's own tones so the two can be compared for agreement, then
+both decide tone for the same emails:
+
+- rules: the per-email loop of lexicon scan plus formal/casual vote
+- classifier: one predict() call over the whole batch
+
+and the full analysis is timed through FreeEmailAssistant.analyze_many with
+and without the classifier. Run from the repository root:
+
+    python -m benchmarks.bench_classifier
+"""
+import argparse
+import time
+
+from benchmarks.corpus import generate_corpus
+from email_assistant.classifier import ToneClassifier
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.preprocess import strip_email
+
+
+def rule_tones(texts, lexicon=FreeEmailAssistant.lexicon):
+    """The keyword vote from FreeEmailAssistant, one lexicon scan per email"""
+    tones = []
+    for text in texts:
+        scan = lexicon.scan(text)
+        formal, casual = scan.count('formal'), scan.count('casual')
+        tones.append('Formal' if formal > casual else 'Casual' if casual > formal else 'Neutral')
+    return tones
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the tone classifier with the keyword rules")
+    parser.add_argument('--train', type=int, default=2000, help="Training emails")
+    parser.add_argument('--size', type=int, default=5000, help="Emails per timed batch")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case (best is used)")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    rules = FreeEmailAssistant()
+    train_texts = [strip_email(text).text for _, text in generate_corpus(args.train, args.seed)]
+    start = time.perf_counter()
+    model = ToneClassifier.train(train_texts, rule_tones(train_texts))
+    print(f"Trained on {len(train_texts)} emails in {time.perf_counter() - start:.2f}s "
+          f"({model.weights.nbytes / 1024:.0f} KiB of weights)")
+
+    emails = [text for _, text in generate_corpus(args.size, args.seed + 1)]
+    texts = [strip_email(text).text for text in emails]
+    expected = rule_tones(texts)
+    agreement = sum(a == b for a, b in zip(model.predict(texts), expected)) / len(texts)
+    print(f"Agreement with the rules on {len(texts)} unseen emails: {agreement:.1%}\n")
+
+    classified = FreeEmailAssistant(model)
+    cases = [
+        ('tone: rules per email', lambda: rule_tones(texts)),
+        ('tone: classifier batch', lambda: model.predict(texts)),
+        ('analyze_many: rules', lambda: rules.analyze_many(emails)),
+        ('analyze_many: classifier', lambda: classified.analyze_many(emails)),
+    ]
+    print(f"{'case':<28} {'emails/s':>12} {'us/email':>10}")
+    for label, fn in cases:
+        elapsed = best_time(fn, args.repeat)
+        print(f"{label:<28} {len(texts) / elapsed:>12,.0f} {elapsed / len(texts) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
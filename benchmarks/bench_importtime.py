@@ -0,0 +1,85 @@
+"""Cold-start import cost of the engine modules, checked against a budget.
+
+Each module is imported in a fresh interpreter with `python -X importtime`
+and the cumulative time of its top-level entry is taken (median of several
+runs, after one run to write bytecode caches). The check fails when a module
+goes over its budget or pulls in a dependency it is meant to import lazily,
+e.g. the rule engine importing Streamlit. Run from the repository root:
+
+    python -m benchmarks.bench_importtime
+    python -m benchmarks.bench_importtime --scale 2   # slower CI machine
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> milliseconds allowed for a cold import
+BUDGETS = {
+    'email_assistant': 5,
+    'email_assistant.free': 25,
+    'email_assistant.assistant': 60,
+    'email_assistant.batch': 100,
+    'email_assistant.service': 400,
+}
+
+# Heavy dependencies that must not be imported as a side effect of importing the module
+FORBIDDEN = {
+    'email_assistant': ('streamlit', 'openai', 'email_assistant.free', 'email_assistant.assistant'),
+    'email_assistant.free': ('streamlit', 'openai', 'asyncio', 'tiktoken', 'numpy', 'sqlite3'),
+    'email_assistant.assistant': ('streamlit', 'openai', 'asyncio', 'tiktoken', 'numpy', 'sqlite3'),
+    'email_assistant.batch': ('streamlit', 'openai', 'numpy'),
+    'email_assistant.service': ('streamlit', 'numpy'),
+}
+
+
+def import_profile(module):
+    """Return (cumulative microseconds for module, set of every module it imported)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    imported = set()
+    total = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.add(name.strip())
+        # Nested imports are indented further; the module itself is at the top level
+        if name == f' {module}':
+            total = int(cumulative)
+    return total, imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cold import times against their budgets")
+    parser.add_argument('--runs', type=int, default=5, help="Timed imports per module (median is used)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every budget, e.g. for slow machines")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'module':<28} {'ms':>8} {'budget':>8}")
+    for module, budget in BUDGETS.items():
+        _, imported = import_profile(module)
+        times = [import_profile(module)[0] / 1000 for _ in range(args.runs)]
+        median = statistics.median(times)
+        allowed = budget * args.scale
+        status = 'ok' if median <= allowed else 'OVER'
+        print(f"{module:<28} {median:>8.1f} {allowed:>8.1f}  {status}")
+        if median > allowed:
+            failures.append(f"{module} took {median:.1f}ms (budget {allowed:.1f}ms)")
+        leaked = sorted(name for name in FORBIDDEN.get(module, ()) if name in imported)
+        if leaked:
+            failures.append(f"{module} imports {', '.join(leaked)} eagerly")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
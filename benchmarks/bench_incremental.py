@@ -0,0 +1,67 @@
+"""Rescoring a draft on every edit: whole-email analysis vs incremental.
+
+Builds long drafts from several corpus emails and replays adding a sentence
+to one paragraph in the middle, word by word, as the live scoring in the
+Analyze and Improve tabs sees it. Times FreeEmailAssistant.analyze_email_tone
+on the whole draft against IncrementalAnalyzer, which rescans only the
+paragraph being edited, and checks the results are identical. Run from the
+repository root:
+
+    python -m benchmarks.bench_incremental
+"""
+import argparse
+import time
+
+from benchmarks.corpus import generate_corpus
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.incremental import IncrementalAnalyzer, split_paragraphs
+
+
+SENTENCE = "Could you also please confirm the new deadline with the team before Friday"
+
+
+def edits(paragraphs, sentence=SENTENCE):
+    """The draft after each word of sentence has been added to its middle paragraph"""
+    middle = len(paragraphs) // 2
+    words = sentence.split()
+    for typed in range(1, len(words) + 1):
+        edited = paragraphs[middle] + ' ' + ' '.join(words[:typed])
+        yield '\n\n'.join(paragraphs[:middle] + [edited] + paragraphs[middle + 1:])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure live rescoring of a draft being typed")
+    parser.add_argument('--drafts', type=int, default=50, help="Drafts to edit")
+    parser.add_argument('--emails', type=int, default=4, help="Corpus emails joined into each draft")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    free = FreeEmailAssistant()
+    texts = [text for _, text in generate_corpus(args.drafts * args.emails, args.seed)]
+    drafts = []
+    for i in range(0, len(texts), args.emails):
+        paragraphs = [p for text in texts[i:i + args.emails] for p in split_paragraphs(text)]
+        drafts.extend(edits(paragraphs))
+
+    start = time.perf_counter()
+    full = [free.analyze_email_tone(draft) for draft in drafts]
+    full_time = time.perf_counter() - start
+
+    live = IncrementalAnalyzer(free)
+    start = time.perf_counter()
+    incremental = [live.analyze(draft) for draft in drafts]
+    incremental_time = time.perf_counter() - start
+    assert incremental == full
+
+    average = sum(map(len, drafts)) / len(drafts)
+    print(f"{len(drafts)} edits over {args.drafts} drafts of {average:,.0f} characters on average")
+    print(f"{'engine':<14} {'us/edit':>13}")
+    print(f"{'whole email':<14} {full_time / len(drafts) * 1e6:>13.1f}")
+    print(f"{'incremental':<14} {incremental_time / len(drafts) * 1e6:>13.1f}")
+    stats = live.segments.stats()
+    print(f"\nparagraphs reused: {stats['reused']} / {stats['reused'] + stats['computed']} "
+          f"({stats['reuse_rate']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare the compiled lexicon scanner with per-word substring scans.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lexicon
+"""
+import random
+import timeit
+
+from email_assistant.free import FreeEmailAssistant
+
+WORDS = ("the project meeting schedule review budget team update proposal deadline "
+         "client report which this while their status thanks please regards").split()
+
+# The app's own lexicon, so the benchmark follows any change to its word lists
+LEXICON = FreeEmailAssistant.lexicon
+
+# The substring baseline tests each concept once, by its first word, as the original app did
+LISTS = {
+    name: sorted({word for (category, _), word in LEXICON.concepts.items() if category == name})
+    for name in LEXICON.categories
+}
+
+
+def substring_scan(text):
+    """The original approach: one `in` scan per word plus per-sentence splits"""
+    lower = text.lower()
+    counts = {name: sum(1 for word in words if word in lower) for name, words in LISTS.items()}
+    sentences = text.split('.')
+    avg = sum(len(s.split()) for s in sentences) / max(len(sentences), 1)
+    return counts, avg, len(text.split())
+
+
+def make_email(words, rng):
+    out = []
+    for _ in range(words):
+        out.append(rng.choice(WORDS))
+        if rng.random() < 0.07:
+            out[-1] += '.'
+    return 'Hello team,\n\n' + ' '.join(out) + '\n\nBest regards,\nSam'
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'words':>8} {'substring ms':>14} {'lexicon ms':>12} {'speedup':>8}")
+    for size in (50, 500, 5000, 50000):
+        text = make_email(size, rng)
+        number = max(1, 20000 // size)
+        old = min(timeit.repeat(lambda: substring_scan(text), number=number, repeat=5)) / number
+        new = min(timeit.repeat(lambda: LEXICON.scan(text), number=number, repeat=5)) / number
+        print(f"{size:>8} {old * 1000:>14.3f} {new * 1000:>12.3f} {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
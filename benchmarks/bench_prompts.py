@@ -0,0 +1,113 @@
+"""Token budgeting and prompt-prefix reuse for EmailAssistant prompts.
+
+Part one strips quoted history and footers from a corpus of pasted reply
+chains, cuts what is left to the assistant's max_email_tokens and reports
+the tokens kept out of each request. Part two sends analyses to an endpoint
+and compares:
+
+- raw vs stripped-and-trimmed prompts for the same long threads
+- the first call for an email vs repeating it (e.g. a regenerate), where the
+  whole prompt prefix can come from the provider's cache
+
+By default the endpoint is benchmarks.mock_openai with a per-token prefill
+cost and OpenAI-style prefix caching (prompts of 1024+ tokens, 128-token
+blocks). Pass --base-url/--api-key to measure a real provider instead; note
+that OpenAI only caches prefixes of at least 1024 tokens, so the short shared
+instruction prefix alone is below that threshold. Run from the repository root:
+
+    python -m benchmarks.bench_prompts
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.corpus import generate_threads
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.metrics import InMemorySink, Metrics
+from email_assistant.preprocess import strip_email
+from email_assistant.scheduler import RequestScheduler
+from email_assistant.tokens import count_tokens, fit_tokens
+
+
+def bench_trimming(threads, max_tokens):
+    before = [count_tokens(text) for text in threads]
+    start = time.perf_counter()
+    fitted = [fit_tokens(strip_email(text).text, max_tokens)[0] for text in threads]
+    elapsed = time.perf_counter() - start
+    after = [count_tokens(text) for text in fitted]
+    saved = sum(before) - sum(after)
+    print(f"{len(threads)} threads, budget {max_tokens} tokens: {sum(before)} -> {sum(after)} tokens "
+          f"({saved / sum(before):.0%} saved, {sum(1 for b in before if b > max_tokens)} over budget), "
+          f"{elapsed / len(threads) * 1e6:.0f}us per email")
+
+
+def timed_analyses(assistant, emails):
+    samples = []
+    for text in emails:
+        start = time.perf_counter()
+        assistant.analyze_email_tone(text, use_cache=False)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def make_assistant(api_key, base_url, max_email_tokens):
+    sink = InMemorySink()
+    scheduler = RequestScheduler(requests_per_minute=10 ** 7, tokens_per_minute=10 ** 10, max_retries=0)
+    assistant = EmailAssistant(api_key, scheduler=scheduler, metrics=Metrics([sink]), base_url=base_url)
+    if max_email_tokens is None:
+        # Send emails exactly as pasted, as before prompts were stripped and trimmed
+        assistant._fit_email = lambda text: (text, 0)
+    else:
+        assistant.max_email_tokens = max_email_tokens
+    return assistant, sink
+
+
+def bench_calls(threads, api_key, base_url, max_tokens):
+    rows = []
+    for label, budget in (('raw', None), ('trimmed', max_tokens)):
+        assistant, sink = make_assistant(api_key, base_url, budget)
+        first = timed_analyses(assistant, threads)
+        repeat = timed_analyses(assistant, threads)
+        summary = sink.summary()
+        rows.append((label, first, repeat, summary['prompt_tokens'], summary['cached_tokens'],
+                     summary['tokens_saved']))
+
+    print(f"\n{'prompts':<10} {'first p50 ms':>13} {'repeat p50 ms':>14} {'prompt tokens':>14} "
+          f"{'cached':>8} {'trimmed':>8}")
+    for label, first, repeat, prompt_tokens, cached, saved in rows:
+        print(f"{label:<10} {first:>13.1f} {repeat:>14.1f} {prompt_tokens:>14} {cached:>8} {saved:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure prompt trimming and prefix reuse")
+    parser.add_argument('--threads', type=int, default=40, help="Reply chains in the corpus")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--max-tokens', type=int, default=EmailAssistant.max_email_tokens,
+                        help="Per-email token budget")
+    parser.add_argument('--latency', type=float, default=0.02, help="Mock latency in seconds")
+    parser.add_argument('--prefill', type=float, default=0.02,
+                        help="Mock seconds per 1000 uncached prompt tokens")
+    parser.add_argument('--base-url', help="Use this OpenAI-compatible endpoint instead of the mock")
+    parser.add_argument('--api-key', default=os.environ.get('OPENAI_API_KEY', 'sk-benchmark'))
+    args = parser.parse_args(argv)
+
+    threads = generate_threads(args.threads, args.seed, max_depth=12)
+    bench_trimming(threads, args.max_tokens)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockOpenAIServer(latency=args.latency, prefill=args.prefill).start()
+        base_url = server.base_url
+    try:
+        bench_calls(threads, args.api_key, base_url, args.max_tokens)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
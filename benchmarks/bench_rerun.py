@@ -0,0 +1,116 @@
+"""Streamlit rerun latency with and without cached assistants.
+
+Each script is rerun headlessly through streamlit.testing. The "uncached"
+column clears st.cache_resource before every rerun, which reproduces the old
+behaviour of building the assistant on every widget interaction. The
+"profiled" column is cached reruns with the sidebar's "Profile reruns" mode
+on, i.e. the cost of recording spans.
+
+A rerun that makes no API call never creates an OpenAI client (backends
+create them on first use), so for the AI app those columns mostly time
+rendering. What caching the assistant saves there is measured separately:
+one API-backed action against the mock endpoint with a new EmailAssistant
+each time, as every interaction used to pay for, and with one reused
+assistant whose client and connection pool stay open.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rerun
+"""
+import os
+import statistics
+import string
+import time
+import timeit
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.templating import CompiledTemplate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = ['free-email-assistant.py', 'email-assistant.py']
+RERUNS = 30
+
+SAMPLE_TEMPLATE = """Hi {recipient},
+
+I hope this email finds you well. I would like to schedule a meeting to discuss {purpose}.
+
+Key topics to cover:
+{key_points}
+
+Best regards,
+[Your Name]"""
+
+
+def time_reruns(script, clear_cache, profiling=False):
+    at = AppTest.from_file(os.path.join(ROOT, script), default_timeout=60)
+    at.secrets['OPENAI_API_KEY'] = 'sk-benchmark'
+    at.session_state['profiling'] = profiling
+    at.run()
+    samples = []
+    for _ in range(RERUNS):
+        if clear_cache:
+            st.cache_resource.clear()
+        start = time.perf_counter()
+        at.run()
+        samples.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    return statistics.median(samples)
+
+
+def time_actions(reuse, server):
+    """Median seconds of one uncached analysis, on one reused EmailAssistant or a new one per action"""
+    shared = EmailAssistant('sk-benchmark', base_url=server.base_url)
+    samples = []
+    for _ in range(RERUNS):
+        start = time.perf_counter()
+        assistant = shared if reuse else EmailAssistant('sk-benchmark', base_url=server.base_url)
+        analysis = assistant.analyze_email_tone("Could we move Friday's review to Monday?", use_cache=False)
+        samples.append(time.perf_counter() - start)
+        if 'error' in analysis:
+            raise RuntimeError(analysis['error'])
+    return statistics.median(samples)
+
+
+def bench_actions():
+    server = MockOpenAIServer().start()
+    try:
+        # The first call pays for importing openai, whichever way the assistant is built
+        EmailAssistant('sk-benchmark', base_url=server.base_url).analyze_email_tone("Warm up", use_cache=False)
+        new = time_actions(reuse=False, server=server)
+        reused = time_actions(reuse=True, server=server)
+    finally:
+        server.shutdown()
+    print(f"API action (mock endpoint): new assistant {new * 1000:.2f}ms, reused {reused * 1000:.2f}ms "
+          f"(saved {(new - reused) * 1000:.2f}ms)")
+
+
+def bench_templates():
+    values = {'recipient': 'client', 'purpose': 'the Q3 roadmap', 'key_points': '• Budget\n• Timeline'}
+    compiled = CompiledTemplate(SAMPLE_TEMPLATE)
+    number = 100000
+    fmt = timeit.timeit(lambda: SAMPLE_TEMPLATE.format(**values), number=number) / number
+    pre = timeit.timeit(lambda: compiled.render(**values), number=number) / number
+    parse = timeit.timeit(lambda: list(string.Formatter().parse(SAMPLE_TEMPLATE)), number=number) / number
+    print(f"template render: str.format {fmt * 1e6:.2f}us, compiled {pre * 1e6:.2f}us "
+          f"(parse cost avoided per render {parse * 1e6:.2f}us)")
+
+
+def main():
+    print(f"{'script':<26} {'uncached ms':>12} {'cached ms':>10} {'saved':>7} {'profiled ms':>12}")
+    for script in SCRIPTS:
+        uncached = time_reruns(script, clear_cache=True)
+        cached = time_reruns(script, clear_cache=False)
+        profiled = time_reruns(script, clear_cache=False, profiling=True)
+        print(f"{script:<26} {uncached * 1000:>12.1f} {cached * 1000:>10.1f} {(uncached - cached) * 1000:>6.1f}ms "
+              f"{profiled * 1000:>12.1f}")
+    bench_actions()
+    bench_templates()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Throughput of the offline rewrite engine on long emails.
+
+Builds long drafts by joining corpus emails and compares, per style:
+
+- one scan per rule: each rule's regex (and the sentence tokens) run over
+  the draft separately, collecting matches only
+- RuleSet.rewrite: one pass over the words, trying each rule only where
+  its trigger words start, producing the edited draft and its edits
+
+Run from the repository root:
+
+    python -m benchmarks.bench_rewrite
+"""
+import argparse
+import re
+import time
+
+from benchmarks.corpus import generate_corpus
+from email_assistant.rewrite import _SENTENCE_END, _SPLITS, DEFAULT_RULES, STYLES, RuleSet
+
+
+def per_rule_scanner(rules, style):
+    """Match every rule with its own pass over the text, the way separate re.sub calls would"""
+    patterns = [re.compile(rule.pattern) for rule in rules if rule.styles is None or style in rule.styles]
+    patterns.append(re.compile('|'.join(re.escape(split) for split in _SPLITS)))
+    patterns.append(re.compile(_SENTENCE_END))
+
+    def scan(text):
+        return [match.span() for pattern in patterns for match in pattern.finditer(text)]
+
+    return scan
+
+
+def best_time(fn, items, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure offline rewriting throughput on long emails")
+    parser.add_argument('--drafts', type=int, default=50, help="Long drafts to rewrite")
+    parser.add_argument('--emails', type=int, default=8, help="Corpus emails joined into each draft")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case (best is used)")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    texts = [text for _, text in generate_corpus(args.drafts * args.emails, args.seed)]
+    drafts = ['\n\n'.join(texts[i:i + args.emails]) for i in range(0, len(texts), args.emails)]
+    megabytes = sum(len(draft) for draft in drafts) / 1e6
+    rules = RuleSet(DEFAULT_RULES)
+    print(f"{len(drafts)} drafts of {megabytes * 1e6 / len(drafts):,.0f} characters on average")
+
+    print(f"\n{'style':<14} {'case':<16} {'drafts/s':>9} {'MB/s':>7} {'edits/draft':>12}")
+    for style in STYLES:
+        scan = per_rule_scanner(DEFAULT_RULES, style)
+        edits = sum(len(rules.rewrite(draft, style).edits) for draft in drafts) / len(drafts)
+        for label, fn in (('one scan/rule', scan), ('combined pass', lambda text: rules.rewrite(text, style))):
+            elapsed = best_time(fn, drafts, args.repeat)
+            print(f"{style:<14} {label:<16} {len(drafts) / elapsed:>9,.0f} {megabytes / elapsed:>7.2f} "
+                  f"{edits if label == 'combined pass' else '':>12}")
+
+
+if __name__ == "__main__":
+    main()
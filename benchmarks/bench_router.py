@@ -0,0 +1,68 @@
+"""API calls and latency with offline-first routing.
+
+Runs the same analyses and compositions from the synthetic corpus through
+EmailAssistant alone and through HybridAssistant at a few confidence
+thresholds, against benchmarks.mock_openai, and reports how many requests
+went to the API and the median and p95 latency per request. Run from the
+repository root:
+
+    python -m benchmarks.bench_router
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.corpus import compose_inputs, generate_corpus
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.router import HybridAssistant
+from email_assistant.scheduler import RequestScheduler
+
+
+def run(engine, emails, composes):
+    samples = []
+    for text in emails:
+        start = time.perf_counter()
+        engine.analyze_email_tone(text, use_cache=False)
+        samples.append(time.perf_counter() - start)
+    for purpose, recipient, points, tone in composes:
+        start = time.perf_counter()
+        engine.compose_email(purpose, recipient, points, tone, use_cache=False)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare API-only and offline-first routing")
+    parser.add_argument('--size', type=int, default=100, help="Analyses and compositions each")
+    parser.add_argument('--latency', type=float, default=0.05, help="Mock latency in seconds")
+    parser.add_argument('--thresholds', default='0.3,0.5,0.7,0.9', help="Comma-separated thresholds")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    emails = [text for _, text in generate_corpus(args.size, args.seed)]
+    composes = compose_inputs(args.size, args.seed)
+    server = MockOpenAIServer(latency=args.latency).start()
+    try:
+        scheduler = RequestScheduler(requests_per_minute=10 ** 7, tokens_per_minute=10 ** 10)
+        ai = EmailAssistant('sk-benchmark', scheduler=scheduler, base_url=server.base_url)
+        free = FreeEmailAssistant()
+        requests = len(emails) + len(composes)
+
+        print(f"{'engine':<18} {'API calls':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        p50, p95 = run(ai, emails, composes)
+        print(f"{'api only':<18} {requests:>10} {p50 * 1000:>8.2f} {p95 * 1000:>8.2f}")
+        for threshold in (float(value) for value in args.thresholds.split(',')):
+            router = HybridAssistant(free, ai, threshold=threshold)
+            p50, p95 = run(router, emails, composes)
+            stats = router.stats.snapshot()
+            print(f"{f'hybrid @ {threshold:.2f}':<18} {stats['api']:>10} {p50 * 1000:>8.2f} {p95 * 1000:>8.2f}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
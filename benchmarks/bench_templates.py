@@ -0,0 +1,81 @@
+"""Template selection and bulk rendering for FreeEmailAssistant.compose_email.
+
+Compares, on the bundled templates:
+
+- selection: the old chain of substring checks on the purpose against
+  TemplateLibrary.select's keyword index
+- rendering: str.format on subject and body per recipient, the compiled
+  template per recipient, and render_many over a whole mail-merge list
+
+and times a reload() with no changed files, which the free app runs on
+every rerun. Run from the repository root:
+
+    python -m benchmarks.bench_templates
+"""
+import argparse
+import time
+
+from benchmarks.corpus import compose_inputs
+from email_assistant.templating import TemplateLibrary
+
+
+def chain_select(purpose, tone):
+    """The if/elif chain compose_email used before the keyword index"""
+    purpose_lower = purpose.lower()
+    if 'meeting' in purpose_lower:
+        return 'meeting_request'
+    elif 'follow' in purpose_lower:
+        return 'follow_up'
+    elif 'request' in purpose_lower or 'ask' in purpose_lower:
+        return 'request'
+    elif tone.lower() == 'friendly':
+        return 'friendly'
+    return 'professional'
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure template selection and mail-merge rendering")
+    parser.add_argument('--recipients', type=int, default=10000, help="Rows in the mail merge")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case (best is used)")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    library = TemplateLibrary()
+    library.reload()
+    inputs = compose_inputs(args.recipients, args.seed)
+    template = library['meeting_request']
+    rows = [{'purpose': purpose, 'recipient': recipient.lower(), 'key_points': points}
+            for purpose, recipient, points, _ in inputs]
+    subject, body = template.subject.source, template.body.source
+
+    def format_each():
+        return [f"Subject: {subject.format(**row)}\n\n{body.format(**row)}" for row in rows]
+
+    assert format_each() == template.message.render_many(rows)
+    cases = [
+        ('select: if/elif chain', lambda: [chain_select(p, t) for p, _, _, t in inputs]),
+        ('select: keyword index', lambda: [library.select(p, t) for p, _, _, t in inputs]),
+        ('render: str.format', format_each),
+        ('render: compiled', lambda: [template.message.render(**row) for row in rows]),
+        ('render: render_many', lambda: template.message.render_many(rows)),
+    ]
+    print(f"{'case':<24} {'per second':>12} {'us each':>9}")
+    for label, fn in cases:
+        elapsed = best_time(fn, args.repeat)
+        print(f"{label:<24} {len(rows) / elapsed:>12,.0f} {elapsed / len(rows) * 1e6:>9.2f}")
+
+    elapsed = best_time(library.reload, args.repeat)
+    print(f"\nreload() with nothing changed: {elapsed * 1e6:.0f}us for {len(library)} templates")
+
+
+if __name__ == "__main__":
+    main()
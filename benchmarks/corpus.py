@@ -0,0 +1,113 @@
+"""Seeded synthetic email corpus for benchmarks.
+
+Generates a reproducible mix of short notes, long single-paragraph emails,
+multi-paragraph emails with greetings, lists and sign-offs, and non-ASCII
+messages, so timings are comparable between runs and machines. Pasted reply
+chains with quoted history, signatures and disclaimers come from
+generate_threads.
+"""
+import random
+
+GREETINGS = ["Hi {name},", "Hello {name},", "Dear {name},", "Hey {name}!", "Good morning {name},"]
+CLOSINGS = ["Best regards,\n{sender}", "Thanks,\n{sender}", "Cheers,\n{sender}", "Sincerely,\n{sender}", "{sender}"]
+NAMES = ["Alex", "Priya", "Jordan", "Mei", "Sam", "Olu", "Chris", "Dana"]
+SUBJECTS = ["the Q3 roadmap", "the vendor contract", "next week's offsite", "the onboarding checklist",
+            "budget approval", "the release schedule", "customer feedback", "the hiring plan"]
+SENTENCES = [
+    "I wanted to follow up on {subject} before the end of the week.",
+    "Could you please share your thoughts on {subject} when you have a moment?",
+    "We reviewed {subject} with the team and have a few open questions.",
+    "Thanks for sending over the latest numbers on {subject}.",
+    "I appreciate your help getting {subject} across the line.",
+    "Let me know if a quick meeting would make it easier to settle {subject}.",
+    "The main risk with {subject} is that the timeline keeps slipping and nobody owns the follow-up items that came out of the last review, which makes it hard to plan the next quarter with any confidence.",
+    "Kindly confirm whether the changes to {subject} are final.",
+]
+NON_ASCII = [
+    "Merci pour votre réponse rapide concernant {subject}.",
+    "Vielen Dank für die schnelle Rückmeldung zu {subject}.",
+    "ご確認ありがとうございます。{subject}について連絡します。",
+    "Спасибо за информацию о {subject}.",
+    "¿Podemos revisar {subject} mañana por la mañana? 🙂",
+]
+
+KINDS = ('short', 'long', 'multi_paragraph', 'non_ascii')
+
+SIGNATURE = """--
+{sender}
+Senior Program Manager | Example Corp
++1 555 0100 | {sender_lower}@example.com"""
+DISCLAIMER = ("CONFIDENTIALITY NOTICE: This email and any attachments are for the exclusive and confidential "
+              "use of the intended recipient. If you are not the intended recipient, please do not read, "
+              "distribute or take action in reliance upon this message. If you have received this in error, "
+              "please notify the sender immediately and delete this message from your system.")
+
+
+def _sentences(rng, count, pool, subject):
+    return ' '.join(rng.choice(pool).format(subject=subject) for _ in range(count))
+
+
+def make_email(rng, kind):
+    """One synthetic email of the given kind"""
+    name, sender = rng.sample(NAMES, 2)
+    subject = rng.choice(SUBJECTS)
+    greeting = rng.choice(GREETINGS).format(name=name)
+    closing = rng.choice(CLOSINGS).format(sender=sender)
+
+    if kind == 'short':
+        return f"{_sentences(rng, rng.randint(1, 2), SENTENCES, subject)}\n{sender}"
+    if kind == 'long':
+        return f"{greeting} {_sentences(rng, rng.randint(40, 80), SENTENCES, subject)} {closing}"
+    if kind == 'multi_paragraph':
+        paragraphs = [_sentences(rng, rng.randint(2, 6), SENTENCES, subject) for _ in range(rng.randint(3, 7))]
+        bullets = '\n'.join(f"- {rng.choice(SUBJECTS)}" for _ in range(rng.randint(2, 5)))
+        return f"{greeting}\n\n" + '\n\n'.join(paragraphs) + f"\n\n{bullets}\n\n{closing}"
+    if kind == 'non_ascii':
+        body = ' '.join(rng.choice(NON_ASCII + SENTENCES).format(subject=subject) for _ in range(rng.randint(3, 10)))
+        return f"{greeting}\n\n{body}\n\n{closing}"
+    raise ValueError(f"Unknown email kind: {kind}")
+
+
+def generate_corpus(size=400, seed=1234, kinds=KINDS):
+    """Return a list of (kind, email_text) pairs, cycling evenly through kinds"""
+    rng = random.Random(seed)
+    return [(kinds[i % len(kinds)], make_email(rng, kinds[i % len(kinds)])) for i in range(size)]
+
+
+def compose_inputs(size=100, seed=1234):
+    """Return (purpose, recipient, key_points, tone) tuples for compose benchmarks"""
+    rng = random.Random(seed)
+    purposes = ["Request a meeting about {s}", "Follow up on {s}", "Ask for feedback on {s}", "Update on {s}"]
+    recipients = ["Colleague", "Boss/Manager", "Client", "Friend", "Customer"]
+    tones = ["professional", "friendly", "formal", "casual"]
+    return [
+        (
+            rng.choice(purposes).format(s=rng.choice(SUBJECTS)),
+            rng.choice(recipients),
+            '\n'.join(f"- {rng.choice(SUBJECTS)}" for _ in range(rng.randint(1, 4))),
+            rng.choice(tones),
+        )
+        for _ in range(size)
+    ]
+
+
+def make_thread(rng, depth):
+    """A reply on top of depth earlier messages, each quoted one level deeper, with signatures"""
+    thread = ""
+    for level in range(depth, -1, -1):
+        name, sender = rng.sample(NAMES, 2)
+        message = make_email(rng, rng.choice(('short', 'multi_paragraph')))
+        signature = SIGNATURE.format(sender=sender, sender_lower=sender.lower())
+        message = f"{message}\n\n{signature}\n\n{DISCLAIMER}"
+        if thread:
+            day = rng.randint(1, 28)
+            quoted = '\n'.join('> ' + line if line else '>' for line in thread.splitlines())
+            message = f"{message}\n\nOn Mon, Mar {day}, 2026 at 9:{day:02d} AM {name} <{name.lower()}@example.com> wrote:\n{quoted}"
+        thread = message
+    return thread
+
+
+def generate_threads(size=100, seed=1234, max_depth=6):
+    """Return pasted reply chains with 1..max_depth quoted earlier messages"""
+    rng = random.Random(seed)
+    return [make_thread(rng, rng.randint(1, max_depth)) for _ in range(size)]
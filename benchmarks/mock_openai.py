@@ -0,0 +1,201 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers /v1/chat/completions with canned replies shaped like the real API:
+an analysis JSON object for analysis prompts, a JSON array for batched
+analysis prompts and plain prose otherwise, streamed as server-sent events
+when the request asks for it. Every response waits latency seconds (plus up
+to jitter seconds) before the first byte, and streamed replies wait
+token_delay seconds between chunks, so client-side overhead can be measured
+against a known, repeatable network cost. A share error_rate of requests is
+answered with error_status (503 by default) instead, carrying a Retry-After
+header when retry_after is set, to exercise retries, backoff and failover.
+With missing_items set, batched analysis replies leave out their last
+missing_items items, to exercise the retries of incomplete batches.
+
+Prompt-prefix caching is modelled on OpenAI's: prompts of at least 1024
+tokens reuse any previously seen prefix in 128-token blocks, reported as
+usage.prompt_tokens_details.cached_tokens. With prefill set, each uncached
+prompt token adds prefill / 1000 seconds, so trimming and prefix reuse show
+up in latency as well as in token counts.
+
+    python -m benchmarks.mock_openai --port 8089 --latency 0.05
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANALYSIS = {"tone": "professional", "clarity_score": 8, "politeness_score": 9,
+            "improvements": ["Shorten the opening paragraph", "State the deadline explicitly"]}
+REPLY = ("Subject: Following up\n\nHi there,\n\nThank you for your message. I have reviewed the details "
+         "and will share an update by the end of the week. Please let me know if anything changes in the "
+         "meantime.\n\nBest regards,\nAlex")
+
+_BATCH_RE = re.compile(r'<email index="(\d+)">')
+
+CHARS_PER_TOKEN = 4
+PREFIX_BLOCK_TOKENS = 128
+PREFIX_MIN_TOKENS = 1024
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockOpenAI/1.0'
+    # Headers and body go out in separate writes; without this Nagle adds ~40ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply_content(self, prompt):
+        indices = _BATCH_RE.findall(prompt)
+        if indices:
+            kept = indices[:max(0, len(indices) - self.server.missing_items)]
+            return json.dumps([dict(ANALYSIS, index=int(i)) for i in kept])
+        if 'JSON' in prompt:
+            return json.dumps(ANALYSIS)
+        return REPLY
+
+    def _send_json(self, status, payload, headers=()):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['content-length'])))
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        server = self.server
+        server.requests += 1
+        if server.error_rate and random.random() < server.error_rate:
+            headers = [('retry-after-ms', str(round(server.retry_after * 1000)))] if server.retry_after else []
+            self._send_json(server.error_status, {"error": {"message": "Mock outage", "type": "server_error"}},
+                            headers)
+            return
+        prompt = '\n'.join(m['content'] for m in body['messages'])
+        prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+        cached_tokens = server.cached_prefix_tokens(prompt)
+        time.sleep(server.latency + random.uniform(0, server.jitter)
+                   + server.prefill * (prompt_tokens - cached_tokens) / 1000)
+
+        content = self._reply_content(prompt)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // CHARS_PER_TOKEN,
+                 "total_tokens": prompt_tokens + len(content) // CHARS_PER_TOKEN,
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body['model']}
+
+        if not body.get('stream'):
+            self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]))
+            return
+
+        self.send_response(200)
+        self.send_header('content-type', 'text/event-stream')
+        self.send_header('transfer-encoding', 'chunked')
+        self.end_headers()
+        words = re.findall(r'\S+\s*', content)
+        chunks = [{"delta": {"content": word}, "finish_reason": None} for word in words]
+        chunks.append({"delta": {}, "finish_reason": "stop"})
+        for i, choice in enumerate(chunks):
+            if i and server.token_delay:
+                time.sleep(server.token_delay)
+            self._write_event(dict(base, object="chat.completion.chunk", choices=[dict(choice, index=0)]))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            self._write_event(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _write_event(self, payload):
+        self._write_chunk(b'data: ' + json.dumps(payload).encode() + b'\n\n')
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """Threaded mock server; base_url is what to hand to openai.OpenAI"""
+
+    daemon_threads = True
+    # The default backlog of 5 makes concurrent clients wait out SYN retries
+    request_queue_size = 128
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, token_delay=0.0, prefill=0.0,
+                 error_rate=0.0, error_status=503, retry_after=None, missing_items=0):
+        super().__init__((host, port), MockOpenAIHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # Seconds to send as Retry-After with each error, or None for no header
+        self.retry_after = retry_after
+        self.missing_items = missing_items
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.prefill = prefill
+        self.requests = 0
+        self._prefixes = set()
+        self._prefix_lock = threading.Lock()
+
+    def cached_prefix_tokens(self, prompt):
+        """Tokens of prompt covered by previously seen prefixes; remembers this prompt's prefixes"""
+        block = PREFIX_BLOCK_TOKENS * CHARS_PER_TOKEN
+        digest = hashlib.sha1()
+        keys = []
+        for start in range(0, len(prompt) - block + 1, block):
+            digest.update(prompt[start:start + block].encode('utf-8'))
+            keys.append(digest.digest())
+        with self._prefix_lock:
+            hits = next((n for n, key in enumerate(keys) if key not in self._prefixes), len(keys))
+            self._prefixes.update(keys)
+        if len(prompt) // CHARS_PER_TOKEN < PREFIX_MIN_TOKENS:
+            return 0
+        return hits * PREFIX_BLOCK_TOKENS
+
+    def handle_error(self, request, client_address):
+        # Clients dropping kept-alive connections at exit is expected, not worth a traceback
+        pass
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_port}/v1"
+
+    def start(self):
+        """Serve from a daemon thread and return self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI chat completions endpoint")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds before the first byte")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency, up to this many seconds")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument('--prefill', type=float, default=0.0, help="Seconds per 1000 uncached prompt tokens")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with a 503")
+    args = parser.parse_args(argv)
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.jitter, args.token_delay, args.prefill,
+                              args.error_rate)
+    print(f"Mock OpenAI endpoint at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,15 @@
-import openai
 import streamlit as st
-import json
-from datetime import datetime
-import re
-
-class EmailAssistant:
-    def __init__(self, api_key):
-        """Initialize the Email Assistant with OpenAI API key"""
-        openai.api_key = api_key
-        self.client = openai.OpenAI(api_key=api_key)
-    
-    def analyze_email_tone(self, email_text):
-        """Analyze the tone and professionalism of an email"""
-        prompt = f"""
-        Analyze this email for:
-        1. Tone (professional, casual, friendly, formal, etc.)
-        2. Clarity score (1-10)
-        3. Politeness level (1-10)
-        4. Potential improvements
-        
-        Email: {email_text}
-        
-        Respond in JSON format with keys: tone, clarity_score, politeness_score, improvements
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
-            )
-            return json.loads(response.choices[0].message.content)
-        except Exception as e:
-            return {"error": f"Failed to analyze email: {str(e)}"}
-    
-    def improve_email(self, email_text, style="professional"):
-        """Improve an email's clarity and tone"""
-        prompt = f"""
-        Improve this email to be more {style}. Keep the core message but enhance:
-        - Clarity and structure
-        - Appropriate tone
-        - Grammar and flow
-        - Politeness
-        
-        Original email: {email_text}
-        
-        Return only the improved email text.
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.4
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"Failed to improve email: {str(e)}"
-    
-    def compose_email(self, purpose, recipient_type, key_points, tone="professional"):
-        """Compose a new email from scratch"""
-        prompt = f"""
-        Compose an email with these details:
-        - Purpose: {purpose}
-        - Recipient: {recipient_type} 
-        - Key points to include: {key_points}
-        - Tone: {tone}
-        
-        Create a complete email with subject line and body.
-        Format as:
-        Subject: [subject line]
-        
-        [email body]
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.5
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"Failed to compose email. Error: {str(e)}"
-
-    def quick_responses(self, received_email, response_type="acknowledge"):
-        """Generate quick response templates"""
-        responses = {
-            "acknowledge": "Thank you for your email. I've received it and will get back to you shortly.",
-            "meeting": "Thank you for reaching out. I'm available for a meeting. Please let me know what times work best for you.",
-            "decline": "Thank you for thinking of me. Unfortunately, I won't be able to participate at this time.",
-            "follow_up": "I wanted to follow up on my previous email. Please let me know if you need any additional information."
-        }
-        
-        if response_type in responses:
-            return responses[response_type]
-        
-        # AI-generated custom response
-        prompt = f"""
-        Generate a brief, polite response to this email:
-        {received_email}
-        
-        Response type: {response_type}
-        Keep it short and professional.
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return responses.get("acknowledge", "Thank you for your email.")
+
+from email_assistant.assistant import EmailAssistant
+from email_assistant.cache import CompletionCache
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.incremental import IncrementalAIAnalyzer
+from email_assistant.metrics import InMemorySink, JsonlSink, scoped_sink
+from email_assistant.prefetch import Prefetcher
+from email_assistant.profiling import span
+from email_assistant.router import HybridAssistant
+from email_assistant.store import AnalysisStore
+from email_assistant.ui_profiling import profiled_action, run_profiled
 
 def get_api_key():
     """Get API key from Streamlit secrets only"""
@@ -129,7 +25,133 @@ def get_api_key():
         st.error(f"Error loading API key: {str(e)}")
         st.stop()
 
+@st.cache_resource
+def get_completion_cache():
+    """Process-wide completion cache shared by every session and rerun"""
+    db_path = st.secrets.get("COMPLETION_CACHE_DB")
+    return CompletionCache(max_entries=256, ttl=3600, db_path=db_path)
+
+@st.cache_resource
+def get_analysis_store():
+    """Process-wide store of finished analyses, if ANALYSIS_STORE_DB is configured"""
+    db_path = st.secrets.get("ANALYSIS_STORE_DB")
+    return AnalysisStore(db_path) if db_path else None
+
+@st.cache_resource
+def get_assistant(api_key):
+    """One EmailAssistant (and connection pool) per API key, reused across reruns.
+    
+    A [backends] table in the secrets adds other OpenAI-compatible endpoints,
+    e.g. a local model for quick replies; see email_assistant.backends.
+    """
+    backends = None
+    if "backends" in st.secrets:
+        from email_assistant.backends import BackendRegistry
+        
+        backends = BackendRegistry.from_config(st.secrets["backends"], api_key)
+    return EmailAssistant(api_key, cache=get_completion_cache(), store=get_analysis_store(), backends=backends)
+
+@st.cache_resource
+def get_free_assistant():
+    """Rule engine that answers the requests it is confident about without an API call"""
+    return FreeEmailAssistant(store=get_analysis_store())
+
+@st.cache_resource
+def get_routing_log():
+    """JSONL file of routing decisions, if ROUTING_LOG is configured"""
+    path = st.secrets.get("ROUTING_LOG")
+    return [JsonlSink(path)] if path else []
+
+def get_router(assistant):
+    """This session's HybridAssistant, so its threshold and routing stats are per user"""
+    router = st.session_state.get("router")
+    if router is None or router.ai is not assistant:
+        router = HybridAssistant(get_free_assistant(), assistant, sinks=get_routing_log())
+        st.session_state["router"] = router
+    return router
+
+def route_caption(router):
+    """Where the last routed request was answered"""
+    decision = router.last_decision
+    if decision is None:
+        return ""
+    if decision.route == "local":
+        return f"Answered offline (confidence {decision.confidence:.2f}), no API call"
+    if decision.forced:
+        return "Answered by the AI model, as requested"
+    return f"Answered by the AI model (offline confidence {decision.confidence:.2f})"
+
+def backend_caption(backends):
+    """Each backend's average latency, or why it has none"""
+    states = []
+    for backend in backends.stats():
+        if not backend['healthy']:
+            states.append(f"{backend['name']} down")
+        elif backend['latency'] is None:
+            states.append(f"{backend['name']} untried")
+        else:
+            states.append(f"{backend['name']} {backend['latency']:.2f}s")
+    return "Backends: " + " · ".join(states)
+
+@st.cache_resource
+def get_prefetch_executor():
+    """Thread pool shared by every session's speculative completions"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+def get_prefetcher(assistant):
+    """This session's Prefetcher, capped at PREFETCH_MAX_COST dollars of speculative spend"""
+    prefetcher = st.session_state.get("prefetcher")
+    if prefetcher is None or prefetcher.assistant is not assistant:
+        max_cost = float(st.secrets.get("PREFETCH_MAX_COST", 0.05))
+        prefetcher = Prefetcher(assistant, get_prefetch_executor(), max_cost=max_cost)
+        st.session_state["prefetcher"] = prefetcher
+    return prefetcher
+
+def get_live_analyzer(assistant, name):
+    """This session's debounced incremental analyzer for one text box"""
+    analyzers = st.session_state.setdefault("live_analyzers", {})
+    live = analyzers.get(name)
+    if live is None or live.assistant is not assistant:
+        debounce = float(st.secrets.get("LIVE_ANALYSIS_DEBOUNCE", 1.0))
+        live = analyzers[name] = IncrementalAIAnalyzer(assistant, debounce=debounce)
+    return live
+
+@st.fragment(run_every=1.0)
+def render_live_analysis(live, text):
+    """Poll for the debounced analysis of text without rerunning the whole page"""
+    analysis = live.result_for(text)
+    if analysis is None:
+        st.caption("⏳ Scoring the paragraphs you changed...")
+    elif "error" in analysis:
+        st.caption("Live analysis unavailable right now")
+    else:
+        st.caption(f"Tone: {analysis['tone']} · Clarity {analysis['clarity_score']}/10 · "
+                   f"Politeness {analysis['politeness_score']}/10")
+
+def render_metrics_panel(panel, summary):
+    """Show this session's API latency and spend in the sidebar"""
+    with panel.container():
+        st.subheader("📈 Session metrics")
+        if not summary['calls']:
+            st.caption("No completions yet")
+            return
+        col1, col2 = st.columns(2)
+        col1.metric("p50 latency", f"{summary['p50']:.2f}s")
+        col2.metric("p95 latency", f"{summary['p95']:.2f}s")
+        col1.metric("Spend", f"${summary['cost']:.4f}")
+        col2.metric("API calls", summary['api_calls'])
+        st.caption(f"{summary['prompt_tokens'] + summary['completion_tokens']} tokens · "
+                   f"{summary['cache_hits']} cache hits · {summary['errors']} errors")
+        if summary['tokens_saved'] or summary['cached_tokens']:
+            st.caption(f"{summary['tokens_saved']} tokens trimmed · "
+                       f"{summary['cached_tokens']} prompt tokens served from the provider cache")
+
 def main():
+    run_profiled(render_app, ["Compose", "Improve", "Analyze", "Quick Reply"])
+
+def render_app():
     st.set_page_config(page_title="Smart Email Assistant", page_icon="📧")
     
     st.title("📧 Smart Email Assistant")
@@ -139,108 +161,213 @@ def main():
     api_key = get_api_key()
     
     # Initialize assistant
-    assistant = EmailAssistant(api_key)
+    with span("get_assistant"):
+        assistant = get_assistant(api_key)
+    cache = assistant.cache
     
-    # Main interface
-    tab1, tab2, tab3, tab4 = st.tabs(["📝 Compose", "✨ Improve", "📊 Analyze", "⚡ Quick Reply"])
+    session_metrics = st.session_state.setdefault("call_metrics", InMemorySink())
+    prefetcher = get_prefetcher(assistant)
+    router = get_router(assistant)
     
-    with tab1:
-        st.header("Compose New Email")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            purpose = st.text_input("What's the purpose of this email?", 
-                                  placeholder="e.g., Request a meeting, Follow up on proposal")
-            recipient = st.selectbox("Who are you writing to?", 
-                                   ["Colleague", "Boss/Manager", "Client", "Friend", "Customer", "Other"])
-        
-        with col2:
-            tone = st.selectbox("Desired tone", ["Professional", "Friendly", "Formal", "Casual"])
-            key_points = st.text_area("Key points to include", 
-                                    placeholder="- Main request\n- Background context\n- Next steps needed")
-        
-        if st.button("✍️ Compose Email"):
-            if purpose and key_points:
-                with st.spinner("Composing your email..."):
-                    result = assistant.compose_email(purpose, recipient, key_points, tone.lower())
-                    st.subheader("Your Generated Email:")
-                    
-                    if "Failed to compose email" in result:
-                        st.error(result)
-                    else:
-                        st.success("Email composed successfully!")
-                        st.text_area("Generated Email", result, height=300, key="composed")
-            else:
-                st.warning("Please fill in the purpose and key points")
+    with st.sidebar:
+        use_cache = st.checkbox("Reuse identical responses", value=True,
+                                help="Serve repeated requests from the response cache instead of calling the API again")
+        stats = cache.stats()
+        st.caption(f"Cache: {stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%})")
+        if assistant.store is not None:
+            stored = assistant.store.stats()
+            st.caption(f"Stored analyses: {stored['hits']} reused / {stored['misses']} new ({stored['hit_rate']:.0%})")
+        offline_first = st.checkbox("Answer simple requests offline", value=True,
+                                    help="Analyze and compose with the built-in rules and templates first, "
+                                         "and call the API only when they are not confident")
+        router.threshold = st.slider("Offline confidence needed", 0.0, 1.0, router.threshold, 0.05,
+                                     disabled=not offline_first)
+        routing = router.stats.snapshot()
+        if routing['requests']:
+            st.caption(f"Routing: {routing['local']} offline / {routing['api']} API "
+                       f"({routing['local_rate']:.0%} offline) · ~{routing['latency_saved']:.1f}s saved")
+        live_analysis = st.checkbox("Score as I type", value=False,
+                                    help="Rescore the email after each pause in editing; only paragraphs "
+                                         "that changed are sent to the API")
+        prefetch = st.checkbox("Prefetch likely next steps", value=False,
+                               help="After an analysis, start improving the email and drafting a custom reply "
+                                    "in the background so the next click returns instantly")
+        prefetcher.use_cache = use_cache
+        if not prefetch:
+            prefetcher.cancel()
+        speculated = prefetcher.stats()
+        if speculated['issued'] or speculated['skipped']:
+            st.caption(f"Prefetch: {speculated['hits']}/{speculated['issued']} used ({speculated['hit_rate']:.0%}) · "
+                       f"{speculated['wasted_tokens']} tokens (${speculated['wasted_cost']:.4f}) wasted · "
+                       f"{speculated['skipped']} skipped at the spend cap")
+        if len(assistant.backends) > 1:
+            st.caption(backend_caption(assistant.backends))
+        parsing = assistant.parse_stats.snapshot()
+        if parsing['replies']:
+            st.caption(f"Analysis replies: {parsing['parse_failure_rate']:.0%} needed repair or failed, "
+                       f"{parsing['repair_rate']:.0%} repaired")
+        metrics_panel = st.empty()
     
-    with tab2:
-        st.header("Improve Existing Email")
-        email_text = st.text_area("Paste your email here:", height=200, 
-                                placeholder="Paste the email you want to improve...")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            improvement_style = st.selectbox("Improvement style", 
-                                           ["Professional", "Friendly", "Concise", "Detailed"])
+    # Main interface
+    with scoped_sink(session_metrics):
+        tab1, tab2, tab3, tab4 = st.tabs(["📝 Compose", "✨ Improve", "📊 Analyze", "⚡ Quick Reply"])
         
-        if st.button("✨ Improve Email"):
-            if email_text.strip():
-                with st.spinner("Improving your email..."):
-                    improved = assistant.improve_email(email_text, improvement_style.lower())
+        with tab1, span("tab:Compose"):
+            st.header("Compose New Email")
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                purpose = st.text_input("What's the purpose of this email?", 
+                                      placeholder="e.g., Request a meeting, Follow up on proposal")
+                recipient = st.selectbox("Who are you writing to?", 
+                                       ["Colleague", "Boss/Manager", "Client", "Friend", "Customer", "Other"])
+            
+            with col2:
+                tone = st.selectbox("Desired tone", ["Professional", "Friendly", "Formal", "Casual"])
+                key_points = st.text_area("Key points to include", 
+                                        placeholder="- Main request\n- Background context\n- Next steps needed")
+            
+            col1, col2 = st.columns(2)
+            compose = col1.button("✍️ Compose Email")
+            compose_ai = col2.button("🤖 Compose with AI", help="Skip the offline templates for this email")
+            if compose or compose_ai:
+                with profiled_action("Compose"):
+                    if purpose and key_points:
+                        st.subheader("Your Generated Email:")
+                        stream = router.compose_email_stream(purpose, recipient, key_points, tone.lower(),
+                                                             use_cache=use_cache,
+                                                             force_api=compose_ai or not offline_first)
+                        output = st.empty()
+                        with output.container(), span("stream"):
+                            result = st.write_stream(stream)
                     
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.subheader("Original")
-                        st.text_area("Original Email", email_text, height=250, key="original", disabled=True)
-                    with col2:
-                        st.subheader("Improved")
-                        st.text_area("Improved Email", improved, height=250, key="improved")
-            else:
-                st.warning("Please enter an email to improve")
-    
-    with tab3:
-        st.header("Analyze Email")
-        analysis_text = st.text_area("Paste email to analyze:", height=200,
-                                   placeholder="Paste the email you want to analyze...")
+                        if stream.error:
+                            st.error(stream.error)
+                        else:
+                            output.text_area("Generated Email", result.strip(), height=300, key="composed")
+                            st.success("Email composed successfully!")
+                        st.caption(f"{stream.timing_summary()} · {route_caption(router)}")
+                    else:
+                        st.warning("Please fill in the purpose and key points")
         
-        if st.button("📊 Analyze Email"):
-            if analysis_text.strip():
-                with st.spinner("Analyzing email..."):
-                    analysis = assistant.analyze_email_tone(analysis_text)
-                    
-                    if "error" not in analysis:
-                        col1, col2, col3 = st.columns(3)
+        with tab2, span("tab:Improve"):
+            st.header("Improve Existing Email")
+            email_text = st.text_area("Paste your email here:", height=200, 
+                                    placeholder="Paste the email you want to improve...")
+            if live_analysis and email_text.strip():
+                live = get_live_analyzer(assistant, "improve")
+                live.use_cache = use_cache
+                live.update(email_text)
+                render_live_analysis(live, email_text)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                improvement_style = st.selectbox("Improvement style", 
+                                               ["Professional", "Friendly", "Concise", "Detailed"],
+                                               key="improvement_style")
+            
+            if st.button("✨ Improve Email"):
+                with profiled_action("Improve"):
+                    if email_text.strip():
+                        col1, col2 = st.columns(2)
                         with col1:
-                            st.metric("Clarity Score", f"{analysis.get('clarity_score', 'N/A')}/10")
+                            st.subheader("Original")
+                            st.text_area("Original Email", email_text, height=250, key="original", disabled=True)
                         with col2:
-                            st.metric("Politeness", f"{analysis.get('politeness_score', 'N/A')}/10")
-                        with col3:
-                            st.info(f"**Tone:** {analysis.get('tone', 'Unknown')}")
+                            st.subheader("Improved")
+                            improved = prefetcher.improve(email_text, improvement_style.lower()) if prefetch else None
+                            if improved is not None:
+                                st.text_area("Improved Email", improved, height=250, key="improved")
+                                st.caption("Prefetched while you were reading the analysis")
+                            else:
+                                stream = assistant.improve_email_stream(email_text, improvement_style.lower(),
+                                                                        use_cache=use_cache)
+                                output = st.empty()
+                                with output.container(), span("stream"):
+                                    improved = st.write_stream(stream)
+                            
+                                if stream.error:
+                                    st.error(stream.error)
+                                else:
+                                    output.text_area("Improved Email", improved.strip(), height=250, key="improved")
+                                st.caption(stream.timing_summary())
+                    else:
+                        st.warning("Please enter an email to improve")
+        
+        with tab3, span("tab:Analyze"):
+            st.header("Analyze Email")
+            analysis_text = st.text_area("Paste email to analyze:", height=200,
+                                       placeholder="Paste the email you want to analyze...")
+            if live_analysis and analysis_text.strip():
+                live = get_live_analyzer(assistant, "analyze")
+                live.use_cache = use_cache
+                live.update(analysis_text)
+                render_live_analysis(live, analysis_text)
+            
+            col1, col2 = st.columns(2)
+            analyze = col1.button("📊 Analyze Email")
+            analyze_ai = col2.button("🤖 Analyze with AI", help="Skip the offline rules for this email")
+            if analyze or analyze_ai:
+                with profiled_action("Analyze"):
+                    if analysis_text.strip():
+                        with st.spinner("Analyzing email..."):
+                            with span("analyze_email_tone"):
+                                analysis = router.analyze_email_tone(analysis_text, use_cache=use_cache,
+                                                                     force_api=analyze_ai or not offline_first)
                         
-                        if 'improvements' in analysis:
-                            st.subheader("💡 Suggested Improvements")
-                            st.write(analysis['improvements'])
+                            if "error" not in analysis:
+                                col1, col2, col3 = st.columns(3)
+                                with col1:
+                                    st.metric("Clarity Score", f"{analysis.get('clarity_score', 'N/A')}/10")
+                                with col2:
+                                    st.metric("Politeness", f"{analysis.get('politeness_score', 'N/A')}/10")
+                                with col3:
+                                    st.info(f"**Tone:** {analysis.get('tone', 'Unknown')}")
+                            
+                                if 'improvements' in analysis:
+                                    st.subheader("💡 Suggested Improvements")
+                                    st.write(analysis['improvements'])
+                                st.caption(route_caption(router))
+                            else:
+                                st.error("Failed to analyze email. Please try again.")
+                    
+                        if prefetch:
+                            # The usual next steps are Improve on this text and a custom reply to it
+                            prefetcher.cancel(keep_text=analysis_text)
+                            style = st.session_state.get("improvement_style", "Professional").lower()
+                            prefetcher.prefetch_improve(analysis_text, style)
+                            prefetcher.prefetch_quick_reply(analysis_text, "custom")
                     else:
-                        st.error("Failed to analyze email. Please try again.")
-            else:
-                st.warning("Please enter an email to analyze")
-    
-    with tab4:
-        st.header("Quick Responses")
-        received_email = st.text_area("Email you received (optional):", height=150,
-                                    placeholder="Paste the email you're responding to...")
+                        st.warning("Please enter an email to analyze")
         
-        col1, col2 = st.columns(2)
-        response_types = ["acknowledge", "meeting", "decline", "follow_up", "custom"]
+        with tab4, span("tab:Quick Reply"):
+            st.header("Quick Responses")
+            received_email = st.text_area("Email you received (optional):", height=150,
+                                        placeholder="Paste the email you're responding to...")
+            
+            col1, col2 = st.columns(2)
+            response_types = ["acknowledge", "meeting", "decline", "follow_up", "custom"]
+            
+            for i, resp_type in enumerate(response_types):
+                col = col1 if i % 2 == 0 else col2
+                with col:
+                    if st.button(f"📝 {resp_type.title()} Response"):
+                        with profiled_action("Quick Reply"):
+                            with st.spinner(f"Generating {resp_type} response..."):
+                                response = prefetcher.quick_reply(received_email, resp_type) if prefetch else None
+                                if response is None:
+                                    with span("quick_responses"):
+                                        response = router.quick_responses(received_email, resp_type,
+                                                                          use_cache=use_cache,
+                                                                          force_api=not offline_first)
+                                if prefetch and resp_type != "custom" and received_email.strip():
+                                    # Users work through the response types; have the custom one ready
+                                    prefetcher.cancel(keep_text=received_email)
+                                    prefetcher.prefetch_quick_reply(received_email, "custom")
+                                st.subheader(f"{resp_type.title()} Response:")
+                                st.text_area("Quick Response", response, height=100, key=f"quick_{resp_type}")
         
-        for i, resp_type in enumerate(response_types):
-            col = col1 if i % 2 == 0 else col2
-            with col:
-                if st.button(f"📝 {resp_type.title()} Response"):
-                    with st.spinner(f"Generating {resp_type} response..."):
-                        response = assistant.quick_responses(received_email, resp_type)
-                        st.subheader(f"{resp_type.title()} Response:")
-                        st.text_area("Quick Response", response, height=100, key=f"quick_{resp_type}")
+    render_metrics_panel(metrics_panel, session_metrics.summary())
 
 if __name__ == "__main__":
     main()
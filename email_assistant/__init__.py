@@ -0,0 +1,21 @@
+"""Shared building blocks for the Smart Email Assistant apps
+
+The engines are re-exported lazily, so `import email_assistant` stays cheap
+and only the engine actually used gets imported.
+"""
+
+_EXPORTS = {
+    'FreeEmailAssistant': 'email_assistant.free',
+    'EmailAssistant': 'email_assistant.assistant',
+    'AsyncEmailAssistant': 'email_assistant.assistant',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,698 @@
+"""OpenAI-backed email engines.
+
+EmailAssistant and AsyncEmailAssistant wrap chat completions with caching,
+rate limiting, reply parsing and metrics. Requests go to a single OpenAI
+endpoint by default, or through an email_assistant.backends registry that
+picks the endpoint and model per task and fails over between them. The
+openai package is imported when the first assistant is created rather than
+with this module, since it is one of the slowest imports in the project;
+asyncio likewise waits for the first AsyncEmailAssistant.gather call.
+"""
+import functools
+import json
+import time
+from collections import namedtuple
+
+from email_assistant.backends import Backend, BackendRegistry, LatencySelector, should_fail_over
+from email_assistant.metrics import InMemorySink, Metrics, make_record
+from email_assistant.parsing import (IncompleteReplyError, ParseStats, ReplyParseError, extract_json,
+                                     normalize_analysis, parse_analysis)
+from email_assistant.preprocess import strip_email
+from email_assistant.profiling import span
+from email_assistant.prompts import PROMPTS, prompt_text
+from email_assistant.scheduler import DeadlineExceeded
+from email_assistant.streaming import TimedStream
+from email_assistant.tokens import count_tokens, fit_tokens
+
+# One completion call in progress: its request, cache lookup and what to report to the metrics once it ends
+_Call = namedtuple('_Call', ['operation', 'started', 'request', 'cache', 'key', 'cached', 'tokens_saved'])
+
+
+class _StreamedReply:
+    """What has arrived of a streamed completion: text deltas, time to first byte and token usage"""
+    
+    def __init__(self, started):
+        self.started = started
+        self.parts = []
+        self.first_byte = None
+        self.usage = None
+    
+    def add(self, chunk):
+        """Take in one stream chunk; returns its text delta, or None when it carries none"""
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter() - self.started
+        if chunk.usage:
+            self.usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            self.parts.append(chunk.choices[0].delta.content)
+            return self.parts[-1]
+        return None
+
+
+class EmailAssistant:
+    model = "gpt-3.5-turbo"
+    
+    # Completion tokens budgeted per email in a batched analysis reply
+    analysis_item_tokens = 120
+    # Completion tokens reserved against the tokens-per-minute limit until the real usage is known
+    reply_token_estimate = 500
+    # Emails still longer than this once quoted history and footers are stripped lose their middle
+    max_email_tokens = 3000
+    
+    canned_responses = {
+        "acknowledge": "Thank you for your email. I've received it and will get back to you shortly.",
+        "meeting": "Thank you for reaching out. I'm available for a meeting. Please let me know what times work best for you.",
+        "decline": "Thank you for thinking of me. Unfortunately, I won't be able to participate at this time.",
+        "follow_up": "I wanted to follow up on my previous email. Please let me know if you need any additional information."
+    }
+    
+    def __init__(self, api_key, cache=None, scheduler=None, call_timeout=60, metrics=None, base_url=None,
+                 store=None, backends=None, selector=None):
+        """Initialize the Email Assistant with OpenAI API key, an optional completion cache and request scheduler.
+        
+        backends is an optional BackendRegistry to send requests through
+        instead of the one OpenAI endpoint at base_url (which scheduler then
+        applies to), and selector an optional LatencySelector over it.
+        """
+        import openai
+        
+        openai.api_key = api_key
+        self.backends = backends or BackendRegistry([Backend("openai", base_url, api_key, self.model,
+                                                             scheduler=scheduler)])
+        self.selector = selector or LatencySelector(self.backends)
+        self.cache = cache
+        # Optional email_assistant.store.AnalysisStore of finished analyses, checked before any API call
+        self.store = store
+        self.scheduler = self.backends.primary.scheduler
+        self.metrics = metrics or Metrics([InMemorySink()])
+        self.call_timeout = call_timeout
+        self.parse_stats = ParseStats()
+    
+    @property
+    def client(self):
+        """The preferred backend's OpenAI client"""
+        return self.backends.primary.client
+    
+    def task_settings(self, operation):
+        """TaskSettings of the backend operation is sent to first"""
+        return self.selector.candidates(operation)[0].settings(operation)
+    
+    def _cache_key(self, backend, operation, request):
+        """Cache key of request as backend sends it for operation: endpoint, model and task settings included"""
+        sent = backend.request(request, operation)
+        identity = [backend.name, backend.base_url, sent["model"], sent.get("max_tokens"), "response_format" in sent]
+        return self.cache.make_key(identity, sent["temperature"], sent["messages"])
+    
+    def _cache_lookup(self, request, operation, use_cache):
+        """Return (cache, key, cached_text) for the backend operation is sent to first; cache is None when
+        caching is off for this call"""
+        if not use_cache or self.cache is None or self.cache.bypass:
+            return None, None, None
+        key = self._cache_key(self.selector.candidates(operation)[0], operation, request)
+        return self.cache, key, self.cache.get(key)
+    
+    @property
+    def analysis_engine(self):
+        """Name analyses are stored under in an AnalysisStore"""
+        return "openai"
+    
+    def _analysis_version(self, backend):
+        from email_assistant.store import fingerprint
+        
+        prompts = [(PROMPTS[name].instructions, PROMPTS[name].content.source)
+                   for name in ("analyze", "analyze_many", "repair")]
+        tasks = [(operation, tuple(backend.settings(operation)), "response_format" in backend.request(
+                  self._request([], 0, json_mode=True), operation)) for operation in ("analyze", "analyze_many")]
+        return fingerprint(self.max_email_tokens, prompts, backend.name, backend.base_url, tasks)
+    
+    @property
+    def analysis_version(self):
+        """Changes whenever the analysis prompts, the email budget, or the endpoint, model or task settings of
+        the backend analyses are sent to first change"""
+        return self._analysis_version(self.selector.candidates("analyze")[0])
+    
+    def _stored_analyses(self, emails, use_cache):
+        """Return (keys, {key: analysis}) from the analysis store; keys is None when it is off for this call"""
+        if not use_cache or self.store is None:
+            return None, {}
+        from email_assistant.store import content_key
+        
+        started = time.perf_counter()
+        keys = [content_key(strip_email(text).text) for text in emails]
+        found = self.store.get_many(self.analysis_engine, self.analysis_version, keys)
+        for key in keys:
+            if key in found:
+                self._record("analyze", started, cache_hit=True)
+        return keys, found
+    
+    def _store_analyses(self, keys, analyses, backends):
+        """Store each analysis under the version of the backend that produced it"""
+        if keys is None:
+            return
+        by_version = {}
+        for key, analysis, backend in zip(keys, analyses, backends):
+            if backend is not None:
+                by_version.setdefault(self._analysis_version(backend), []).append((key, analysis))
+        for version, items in by_version.items():
+            self.store.put_many(self.analysis_engine, version, items)
+    
+    def _cache_store(self, backend, operation, request, content, use_cache):
+        """Cache content for a request without a lookup, e.g. a repaired reply"""
+        if use_cache and self.cache is not None and not self.cache.bypass:
+            self.cache.set(self._cache_key(backend, operation, request), content)
+    
+    def _request(self, prompt, temperature, json_mode=False):
+        """Keyword arguments for chat.completions.create; prompt is a list of chat messages.
+        
+        Each backend then fills in its model and settings, dropping JSON
+        mode where the model does not support it.
+        """
+        request = {
+            "model": self.model,
+            "messages": prompt,
+            "temperature": temperature,
+        }
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+        return request
+    
+    def _reserve_tokens(self, request):
+        """Rate-limit tokens to reserve for request as a backend sends it"""
+        return (count_tokens(prompt_text(request["messages"]), request["model"])
+                + (request.get("max_tokens") or self.reply_token_estimate))
+    
+    def _deadline(self):
+        return None if self.call_timeout is None else time.monotonic() + self.call_timeout
+    
+    @staticmethod
+    def _remaining(deadline_at):
+        return None if deadline_at is None else deadline_at - time.monotonic()
+    
+    def _attempts(self, request, operation):
+        """Yield (backend, request as it sends it, tokens to reserve, seconds left) for each backend _create
+        may try, in the selector's order for operation, until the shared call deadline has passed"""
+        deadline_at = self._deadline()
+        for backend in self.selector.candidates(operation):
+            remaining = self._remaining(deadline_at)
+            if remaining is not None and remaining <= 0:
+                return
+            backend_request = backend.request(request, operation)
+            yield backend, backend_request, self._reserve_tokens(backend_request), remaining
+    
+    @staticmethod
+    def _failed_over(backend, error):
+        """Count a failed attempt against backend and return error, or raise it when no other backend would help"""
+        if not should_fail_over(error):
+            raise error
+        backend.observe(None)
+        return error
+    
+    @staticmethod
+    def _settle(backend, started, reserved, response):
+        """Record backend's latency and settle the reserved tokens against the actual usage"""
+        backend.observe(time.perf_counter() - started)
+        usage = getattr(response, "usage", None)
+        backend.scheduler.settle(reserved, getattr(usage, "total_tokens", None))
+    
+    def _create(self, request, operation="completion", **options):
+        """Send a chat completion request to the selector's best backend for operation, failing over down the list.
+        
+        Each backend applies its own rate limits and retry policy; together
+        they share one call deadline. Returns (backend, response).
+        """
+        error = None
+        for backend, backend_request, reserved, remaining in self._attempts(request, operation):
+            client = backend.client
+            started = time.perf_counter()
+            try:
+                with span('api_call', backend=backend.name, operation=operation):
+                    response = backend.scheduler.call(
+                        lambda timeout: client.chat.completions.create(**backend_request, **options, timeout=timeout),
+                        tokens=reserved,
+                        deadline=remaining
+                    )
+            except Exception as e:
+                error = self._failed_over(backend, e)
+                continue
+            self._settle(backend, started, reserved, response)
+            return backend, response
+        raise error or DeadlineExceeded("No backend could be tried before the call deadline")
+    
+    def _record(self, operation, started, model=None, **details):
+        """Report one completion call (API or cache) to the metrics sinks"""
+        self.metrics.record(make_record(operation, model or self.model, started, **details))
+    
+    def _begin(self, prompt, temperature, use_cache=True, json_mode=False, operation="completion", tokens_saved=0):
+        """Build the request for a completion and look it up in the cache; returns a _Call"""
+        started = time.perf_counter()
+        request = self._request(prompt, temperature, json_mode)
+        cache, key, cached = self._cache_lookup(request, operation, use_cache)
+        return _Call(operation, started, request, cache, key, cached, tokens_saved)
+    
+    def _cache_hit(self, call, parse=None):
+        """Record a cache hit and return (parsed reply, backend that would have been asked first)"""
+        self._record(call.operation, call.started, cache_hit=True, tokens_saved=call.tokens_saved)
+        return (parse(call.cached) if parse else call.cached), self.selector.candidates(call.operation)[0]
+    
+    def _failed(self, call, error, model=None, **details):
+        self._record(call.operation, call.started, model, error=error, tokens_saved=call.tokens_saved, **details)
+    
+    def _answered(self, call, backend, content, parse=None, **details):
+        """Record a finished API call, then parse its reply and cache it under the backend that answered.
+        Returns (result, backend)."""
+        self._record(call.operation, call.started, backend.settings(call.operation).model,
+                     tokens_saved=call.tokens_saved, **details)
+        key = self._cache_key(backend, call.operation, call.request) if call.cache is not None else None
+        return self._finish(call.cache, key, content, parse, backend), backend
+    
+    @staticmethod
+    def _finish(cache, key, content, parse, backend=None):
+        """Parse a fresh reply from backend and cache it only once parsing succeeded"""
+        try:
+            result = parse(content) if parse else content
+        except IncompleteReplyError as e:
+            e.backend = backend
+            raise
+        if cache is not None:
+            cache.set(key, content)
+        return result
+    
+    def _complete(self, prompt, temperature, parse=None, use_cache=True, json_mode=False, operation="completion",
+                  tokens_saved=0):
+        """Run a chat completion, serving identical requests from the cache.
+        
+        parse is applied to the reply text on both hits and misses; replies
+        it rejects by raising are never cached. Returns (result, backend),
+        where backend answered the request, or would have been asked first
+        for a cache hit; replies are cached under that backend's key.
+        """
+        call = self._begin(prompt, temperature, use_cache, json_mode, operation, tokens_saved)
+        if call.cached is not None:
+            return self._cache_hit(call, parse)
+        try:
+            backend, response = self._create(call.request, operation)
+        except Exception as e:
+            self._failed(call, e)
+            raise
+        return self._answered(call, backend, response.choices[0].message.content, parse, usage=response.usage)
+    
+    def _complete_stream(self, prompt, temperature, use_cache=True, operation="completion", tokens_saved=0):
+        """Yield the reply as text deltas as it is generated; cache hits are yielded whole"""
+        call = self._begin(prompt, temperature, use_cache, operation=operation, tokens_saved=tokens_saved)
+        if call.cached is not None:
+            self._cache_hit(call)
+            yield call.cached
+            return
+        
+        reply, backend, stream = _StreamedReply(call.started), None, None
+        try:
+            backend, stream = self._create(call.request, operation, stream=True,
+                                           stream_options={"include_usage": True})
+            for chunk in stream:
+                delta = reply.add(chunk)
+                if delta:
+                    yield delta
+        except Exception as e:
+            self._stream_failed(call, backend, reply, e)
+            raise
+        except BaseException:
+            # Abandoned mid-reply (e.g. a cancelled prefetch): stop downloading, but still count the call
+            if stream is not None:
+                stream.close()
+            self._stream_abandoned(call, backend, reply)
+            raise
+        self._stream_finished(call, backend, reply)
+    
+    def _stream_finished(self, call, backend, reply):
+        self._answered(call, backend, "".join(reply.parts), first_byte=reply.first_byte, usage=reply.usage)
+    
+    def _stream_failed(self, call, backend, reply, error):
+        model = backend.settings(call.operation).model if backend is not None else None
+        self._failed(call, error, model, first_byte=reply.first_byte)
+    
+    def _stream_abandoned(self, call, backend, reply):
+        """Record a stream the caller stopped reading: its tokens are spent, but nothing is cached"""
+        model = backend.settings(call.operation).model if backend is not None else None
+        self._record(call.operation, call.started, model, first_byte=reply.first_byte, tokens_saved=call.tokens_saved)
+    
+    def _run(self, steps):
+        """Drive a steps generator such as _analyze_steps to its result.
+        
+        Each value it yields is a round of completion calls (zero-argument
+        callables); they are made in order and the list of their outcomes
+        is sent back, with the exception standing in for a call that raised.
+        AsyncEmailAssistant runs the same generators, awaiting each round.
+        """
+        replies = None
+        while True:
+            try:
+                calls = steps.send(replies)
+            except StopIteration as done:
+                return done.value
+            replies = []
+            for call in calls:
+                try:
+                    replies.append(call())
+                except Exception as e:
+                    replies.append(e)
+    
+    def _fit_email(self, email_text):
+        """Strip quoted history and footers, then cut to max_email_tokens; returns (text, tokens_saved)"""
+        with span('fit_email'):
+            stripped = strip_email(email_text).text
+            if stripped == email_text:
+                return fit_tokens(email_text, self.max_email_tokens, self.model)
+            text, _ = fit_tokens(stripped, self.max_email_tokens, self.model)
+            return text, count_tokens(email_text, self.model) - count_tokens(text, self.model)
+    
+    def _analyze_prompt(self, email_text):
+        return PROMPTS["analyze"].render(email=email_text)
+    
+    def _repair_prompt(self, reply):
+        return PROMPTS["repair"].render(reply=reply)
+    
+    def _improve_prompt(self, email_text, style):
+        return PROMPTS["improve"].render(style=style, email=email_text)
+    
+    def _compose_prompt(self, purpose, recipient_type, key_points, tone):
+        return PROMPTS["compose"].render(purpose=purpose, recipient_type=recipient_type, key_points=key_points,
+                                         tone=tone)
+    
+    def _quick_prompt(self, received_email, response_type):
+        return PROMPTS["quick_reply"].render(response_type=response_type, email=received_email)
+    
+    def _analyze_steps(self, email_text, use_cache):
+        """analyze_email_tone as rounds of completion calls for _run"""
+        keys, stored = self._stored_analyses([email_text], use_cache)
+        if stored:
+            return stored[keys[0]]
+        email_text, saved = self._fit_email(email_text)
+        prompt = self._analyze_prompt(email_text)
+        
+        [reply] = yield [functools.partial(self._complete, prompt, 0.3, parse=parse_analysis, use_cache=use_cache,
+                                           json_mode=True, operation="analyze", tokens_saved=saved)]
+        if isinstance(reply, ReplyParseError):
+            # One targeted repair call on the broken reply instead of re-running the analysis
+            [reply] = yield [functools.partial(self._complete, self._repair_prompt(reply.text), 0, parse=parse_analysis,
+                                               use_cache=False, json_mode=True, operation="repair")]
+            if not isinstance(reply, Exception):
+                (analysis, _), backend = reply
+                reply = (analysis, "repaired"), backend
+                self._cache_store(backend, "analyze", self._request(prompt, 0.3, json_mode=True),
+                                  json.dumps(analysis), use_cache)
+        if isinstance(reply, Exception):
+            if isinstance(reply, ReplyParseError):
+                self.parse_stats.record("failed")
+            return {"error": f"Failed to analyze email: {str(reply)}"}
+        (analysis, outcome), backend = reply
+        self.parse_stats.record(outcome)
+        self._store_analyses(keys, [analysis], [backend])
+        return analysis
+    
+    def analyze_email_tone(self, email_text, use_cache=True):
+        """Analyze the tone and professionalism of an email"""
+        return self._run(self._analyze_steps(email_text, use_cache))
+    
+    def _analyze_many_prompt(self, batch):
+        emails = "\n\n".join(f'<email index="{i}">\n{text}\n</email>' for i, text in enumerate(batch))
+        return PROMPTS["analyze_many"].render(count=len(batch), emails=emails)
+    
+    def _plan_batches(self, emails, indices, batch_size, token_budget):
+        """Group email indices into batches that fit both batch_size and the token budget"""
+        overhead = count_tokens(prompt_text(self._analyze_many_prompt([])), self.model)
+        batches, batch, used = [], [], overhead
+        for i in indices:
+            cost = count_tokens(emails[i], self.model) + self.analysis_item_tokens
+            if batch and (len(batch) >= batch_size or used + cost > token_budget):
+                batches.append(batch)
+                batch, used = [], overhead
+            batch.append(i)
+            used += cost
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    @staticmethod
+    def _split_many(content, size):
+        """Map batch position to analysis for every item of a batch reply.
+        
+        Raises IncompleteReplyError, carrying the well-formed items, when
+        any are missing or malformed, so a short reply is never cached and
+        the retry rounds send the missing items again.
+        """
+        data, _ = extract_json(content, list)
+        
+        items = {}
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.pop("index"))
+                analysis = normalize_analysis(item)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 0 <= index < size:
+                items[index] = analysis
+        if len(items) < size:
+            raise IncompleteReplyError(f"Batch reply has {len(items)} of {size} analyses", content, items)
+        return items
+    
+    def _analyze_many_steps(self, emails, batch_size, token_budget, max_attempts, use_cache):
+        """analyze_many as rounds of completion calls for _run: one round per attempt, one call per batch"""
+        keys, stored = self._stored_analyses(emails, use_cache)
+        results = [stored.get(key) for key in keys] if keys is not None else [None] * len(emails)
+        pending = fresh = [i for i, analysis in enumerate(results) if analysis is None]
+        emails, saved = list(emails), [0] * len(emails)
+        for i in pending:
+            emails[i], saved[i] = self._fit_email(emails[i])
+        errors, backends = {}, [None] * len(emails)
+        
+        for _ in range(max_attempts):
+            if not pending:
+                break
+            batches = self._plan_batches(emails, pending, batch_size, token_budget)
+            replies = yield [functools.partial(self._complete, self._analyze_many_prompt([emails[i] for i in batch]),
+                                               0.3, parse=functools.partial(self._split_many, size=len(batch)),
+                                               use_cache=use_cache, operation="analyze_many",
+                                               tokens_saved=sum(saved[i] for i in batch))
+                             for batch in batches]
+            for batch, reply in zip(batches, replies):
+                if isinstance(reply, IncompleteReplyError):
+                    items, backend = reply.items, reply.backend
+                elif isinstance(reply, Exception):
+                    items = {}
+                    errors.update((i, str(reply)) for i in batch)
+                else:
+                    items, backend = reply
+                for position, analysis in items.items():
+                    results[batch[position]] = analysis
+                    backends[batch[position]] = backend
+            pending = [i for i in pending if results[i] is None]
+        
+        for i in pending:
+            results[i] = {"error": f"Failed to analyze email: {errors.get(i, 'missing from batch response')}"}
+        if keys is not None:
+            self._store_analyses([keys[i] for i in fresh], [results[i] for i in fresh], [backends[i] for i in fresh])
+        return results
+    
+    def analyze_many(self, emails, batch_size=8, token_budget=3000, max_attempts=3, use_cache=True):
+        """Analyze many emails with one API call per batch, returning results in input order.
+        
+        Each batch's prompt plus its expected reply stays within
+        token_budget tokens. Items missing or
+        malformed in a reply are retried in later batches; any still missing
+        after max_attempts rounds get an error dict like analyze_email_tone.
+        Emails already in the analysis store are answered from it without
+        being sent.
+        """
+        return self._run(self._analyze_many_steps(emails, batch_size, token_budget, max_attempts, use_cache))
+    
+    def improve_email_stream(self, email_text, style="professional", use_cache=True):
+        """Stream an improved version of an email as a TimedStream of text deltas"""
+        email_text, saved = self._fit_email(email_text)
+        prompt = self._improve_prompt(email_text, style)
+        return TimedStream(self._complete_stream(prompt, 0.4, use_cache=use_cache, operation="improve",
+                                                 tokens_saved=saved),
+                           error_format="Failed to improve email: {}")
+    
+    def improve_email(self, email_text, style="professional", use_cache=True):
+        """Improve an email's clarity and tone"""
+        stream = self.improve_email_stream(email_text, style, use_cache=use_cache)
+        text = "".join(stream)
+        return stream.error or text.strip()
+    
+    def compose_email_stream(self, purpose, recipient_type, key_points, tone="professional", use_cache=True):
+        """Stream a new email as a TimedStream of text deltas"""
+        prompt = self._compose_prompt(purpose, recipient_type, key_points, tone)
+        return TimedStream(self._complete_stream(prompt, 0.5, use_cache=use_cache, operation="compose"),
+                           error_format="Failed to compose email. Error: {}")
+    
+    def compose_email(self, purpose, recipient_type, key_points, tone="professional", use_cache=True):
+        """Compose a new email from scratch"""
+        stream = self.compose_email_stream(purpose, recipient_type, key_points, tone, use_cache=use_cache)
+        text = "".join(stream)
+        return stream.error or text.strip()
+
+    def _quick_steps(self, received_email, response_type, use_cache, fallback):
+        """quick_responses as rounds of completion calls for _run"""
+        if response_type in self.canned_responses:
+            return self.canned_responses[response_type]
+        
+        # AI-generated custom response
+        received_email, saved = self._fit_email(received_email)
+        prompt = self._quick_prompt(received_email, response_type)
+        
+        [reply] = yield [functools.partial(self._complete, prompt, 0.3, use_cache=use_cache, operation="quick_reply",
+                                           tokens_saved=saved)]
+        if isinstance(reply, Exception):
+            return self.canned_responses.get(fallback)
+        text, _ = reply
+        return text.strip()
+    
+    def quick_responses(self, received_email, response_type="acknowledge", use_cache=True,
+                        fallback="acknowledge"):
+        """Generate quick response templates; if the API call fails, the canned reply named by fallback (or None)"""
+        return self._run(self._quick_steps(received_email, response_type, use_cache, fallback))
+
+class AsyncEmailAssistant(EmailAssistant):
+    """EmailAssistant on openai.AsyncOpenAI, for running many requests concurrently.
+    
+    Only what waits on the API is redefined here; requests, caching, reply
+    parsing and the steps of each operation are EmailAssistant's.
+    """
+    
+    def __init__(self, api_key, cache=None, scheduler=None, max_concurrency=8, call_timeout=60, metrics=None,
+                 base_url=None, store=None, backends=None, selector=None):
+        """Initialize like EmailAssistant, with a limit on how many calls gather runs at once"""
+        super().__init__(api_key, cache=cache, scheduler=scheduler, call_timeout=call_timeout, metrics=metrics,
+                         base_url=base_url, store=store, backends=backends, selector=selector)
+        self.max_concurrency = max_concurrency
+    
+    @property
+    def client(self):
+        """The preferred backend's AsyncOpenAI client"""
+        return self.backends.primary.async_client
+    
+    async def _create(self, request, operation="completion", **options):
+        """Async counterpart of EmailAssistant._create"""
+        error = None
+        for backend, backend_request, reserved, remaining in self._attempts(request, operation):
+            client = backend.async_client
+            started = time.perf_counter()
+            try:
+                with span('api_call', backend=backend.name, operation=operation):
+                    response = await backend.scheduler.call_async(
+                        lambda timeout: client.chat.completions.create(**backend_request, **options, timeout=timeout),
+                        tokens=reserved,
+                        deadline=remaining
+                    )
+            except Exception as e:
+                error = self._failed_over(backend, e)
+                continue
+            self._settle(backend, started, reserved, response)
+            return backend, response
+        raise error or DeadlineExceeded("No backend could be tried before the call deadline")
+    
+    async def _complete(self, prompt, temperature, parse=None, use_cache=True, json_mode=False,
+                        operation="completion", tokens_saved=0):
+        """Async counterpart of EmailAssistant._complete"""
+        call = self._begin(prompt, temperature, use_cache, json_mode, operation, tokens_saved)
+        if call.cached is not None:
+            return self._cache_hit(call, parse)
+        try:
+            backend, response = await self._create(call.request, operation)
+        except Exception as e:
+            self._failed(call, e)
+            raise
+        return self._answered(call, backend, response.choices[0].message.content, parse, usage=response.usage)
+    
+    async def _complete_stream(self, prompt, temperature, use_cache=True, operation="completion", tokens_saved=0):
+        """Async counterpart of EmailAssistant._complete_stream; improve_email_stream and
+        compose_email_stream then return TimedStreams to consume with `async for`"""
+        call = self._begin(prompt, temperature, use_cache, operation=operation, tokens_saved=tokens_saved)
+        if call.cached is not None:
+            self._cache_hit(call)
+            yield call.cached
+            return
+        
+        reply, backend, stream = _StreamedReply(call.started), None, None
+        try:
+            backend, stream = await self._create(call.request, operation, stream=True,
+                                                 stream_options={"include_usage": True})
+            async for chunk in stream:
+                delta = reply.add(chunk)
+                if delta:
+                    yield delta
+        except Exception as e:
+            self._stream_failed(call, backend, reply, e)
+            raise
+        except BaseException:
+            # Closed with aclose() or the task was cancelled, e.g. the client of a streaming endpoint went away
+            if stream is not None:
+                await stream.close()
+            self._stream_abandoned(call, backend, reply)
+            raise
+        self._stream_finished(call, backend, reply)
+    
+    async def _run(self, steps):
+        """Async counterpart of EmailAssistant._run: the calls of each round run concurrently through gather"""
+        async def attempt(call):
+            try:
+                return await call()
+            except Exception as e:
+                return e
+        
+        replies = None
+        while True:
+            try:
+                calls = steps.send(replies)
+            except StopIteration as done:
+                return done.value
+            replies = await self.gather([functools.partial(attempt, call) for call in calls])
+    
+    async def analyze_email_tone(self, email_text, use_cache=True):
+        """Analyze the tone and professionalism of an email"""
+        return await self._run(self._analyze_steps(email_text, use_cache))
+    
+    async def analyze_many(self, emails, batch_size=8, token_budget=3000, max_attempts=3, use_cache=True):
+        """Async analyze_many: every batch of a retry round is sent concurrently"""
+        return await self._run(self._analyze_many_steps(emails, batch_size, token_budget, max_attempts, use_cache))
+    
+    async def improve_email(self, email_text, style="professional", use_cache=True):
+        """Improve an email's clarity and tone"""
+        stream = self.improve_email_stream(email_text, style, use_cache=use_cache)
+        text = "".join([delta async for delta in stream])
+        return stream.error or text.strip()
+    
+    async def compose_email(self, purpose, recipient_type, key_points, tone="professional", use_cache=True):
+        """Compose a new email from scratch"""
+        stream = self.compose_email_stream(purpose, recipient_type, key_points, tone, use_cache=use_cache)
+        text = "".join([delta async for delta in stream])
+        return stream.error or text.strip()
+    
+    async def quick_responses(self, received_email, response_type="acknowledge", use_cache=True,
+                              fallback="acknowledge"):
+        """Generate quick response templates; if the API call fails, the canned reply named by fallback (or None)"""
+        return await self._run(self._quick_steps(received_email, response_type, use_cache, fallback))
+    
+    async def gather(self, calls, concurrency=None, timeout=None):
+        """Run many calls at once and return their results in input order.
+        
+        Each call is a zero-argument callable returning an awaitable, e.g.
+        functools.partial(assistant.improve_email, text, "friendly"). At most
+        `concurrency` calls are in flight, and a call that exceeds `timeout`
+        seconds comes back as an asyncio.TimeoutError instance.
+        """
+        import asyncio
+        
+        semaphore = asyncio.Semaphore(concurrency or self.max_concurrency)
+        timeout = self.call_timeout if timeout is None else timeout
+        
+        async def run(call):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(call(), timeout)
+                except asyncio.TimeoutError as e:
+                    return e
+        
+        return await asyncio.gather(*(run(call) for call in calls))
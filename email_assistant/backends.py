@@ -0,0 +1,282 @@
+"""Chat completion backends: which endpoint and model answer each request.
+
+A Backend is one OpenAI-compatible endpoint (OpenAI itself, another
+provider, or a local llama.cpp / vLLM server) with its own rate limits and
+circuit breaker, a default model and per-task overrides of the model,
+temperature and max_tokens, e.g. a small model for quick replies. A
+BackendRegistry holds the backends in order of preference and gives all of
+them one HTTP connection pool. LatencySelector decides, per request, which
+backends to try and in what order:
+
+- short tasks (quick replies by default) go to the fastest healthy backend,
+  by a moving average of observed latency in which a failed call counts as
+  a failure_latency-second sample
+- everything else goes to the first healthy backend in registry order
+- backends whose circuit breaker is open go last, and EmailAssistant fails
+  over down the list when a backend errors
+
+Backends are configured as a mapping, e.g. the [backends] table of a TOML
+file or of Streamlit secrets:
+
+    [backends.openai]
+    api_key_env = "OPENAI_API_KEY"
+    model = "gpt-3.5-turbo"
+
+    [backends.local]
+    base_url = "http://127.0.0.1:8080/v1"
+    model = "llama-3.2-3b-instruct"
+    operations = ["quick_reply", "analyze"]
+
+    [backends.local.tasks.quick_reply]
+    max_tokens = 200
+
+openai is imported when the first client is created.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+from email_assistant.parsing import supports_json_mode
+from email_assistant.profiling import span
+from email_assistant.scheduler import CircuitOpenError, DeadlineExceeded, RequestScheduler, is_retryable
+
+TaskSettings = namedtuple('TaskSettings', ['model', 'temperature', 'max_tokens'], defaults=(None, None, None))
+
+# Operations where a fast answer matters more than which model gives it
+FAST_OPERATIONS = frozenset({'quick_reply'})
+
+
+def should_fail_over(error):
+    """Whether another backend might succeed where this one failed"""
+    return isinstance(error, (CircuitOpenError, DeadlineExceeded)) or is_retryable(error)
+
+
+class Backend:
+    """One OpenAI-compatible endpoint with its own rate limits, models and latency record"""
+
+    def __init__(self, name, base_url=None, api_key=None, model="gpt-3.5-turbo", tasks=None, operations=None,
+                 scheduler=None, json_mode=None, smoothing=0.3, failure_latency=30.0):
+        self.name = name
+        self.base_url = base_url
+        # Local servers ignore the key, but the client refuses to start without one
+        self.api_key = api_key or "local"
+        self.model = model
+        self.tasks = {operation: TaskSettings(**settings) if isinstance(settings, dict) else settings
+                      for operation, settings in (tasks or {}).items()}
+        # Operations this backend may answer; None for all
+        self.operations = frozenset(operations) if operations is not None else None
+        self.scheduler = scheduler or RequestScheduler()
+        # None infers JSON mode support from the model name, which only knows OpenAI's models
+        self.json_mode = json_mode
+        self.smoothing = smoothing
+        # Seconds a failed call counts as in the latency average, like a call that timed out
+        self.failure_latency = failure_latency
+        self.latency = None
+        self.calls = 0
+        self.failures = 0
+        self.registry = None
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Backend({self.name!r}, base_url={self.base_url!r}, model={self.model!r})"
+
+    def serves(self, operation):
+        return self.operations is None or operation in self.operations
+
+    @property
+    def healthy(self):
+        """False while the circuit breaker is open and not yet due for a trial call, or a trial call is in flight"""
+        breaker = self.scheduler.breaker
+        if breaker.state == 'open':
+            return time.monotonic() - breaker.opened_at >= breaker.reset_timeout
+        return breaker.state == 'closed'
+
+    def settings(self, operation):
+        """TaskSettings for operation, with the model filled in"""
+        settings = self.tasks.get(operation, TaskSettings())
+        return settings._replace(model=settings.model or self.model)
+
+    def request(self, request, operation):
+        """A copy of chat.completions.create arguments adjusted to this backend's settings for operation"""
+        settings = self.settings(operation)
+        request = dict(request, model=settings.model)
+        if settings.temperature is not None:
+            request['temperature'] = settings.temperature
+        if settings.max_tokens is not None:
+            request['max_tokens'] = settings.max_tokens
+        json_mode = self.json_mode if self.json_mode is not None else supports_json_mode(settings.model)
+        if not json_mode:
+            request.pop('response_format', None)
+        return request
+
+    def observe(self, seconds):
+        """Record one call's latency, or None for a failed call"""
+        with self._lock:
+            self.calls += 1
+            if seconds is None:
+                self.failures += 1
+                seconds = self.failure_latency
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += self.smoothing * (seconds - self.latency)
+
+    @property
+    def client(self):
+        """openai.OpenAI client on the registry's shared connection pool"""
+        if self._client is None:
+            with span('create_client', backend=self.name):
+                import openai
+
+                http_client = self.registry.http_client() if self.registry is not None else None
+                # Retries are handled by the scheduler, not the client
+                self._client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                             http_client=http_client)
+        return self._client
+
+    @property
+    def async_client(self):
+        """openai.AsyncOpenAI client on the registry's shared async connection pool"""
+        if self._async_client is None:
+            with span('create_client', backend=self.name):
+                import openai
+
+                http_client = self.registry.async_http_client() if self.registry is not None else None
+                self._async_client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                                        max_retries=0, http_client=http_client)
+        return self._async_client
+
+    def stats(self):
+        return {'name': self.name, 'model': self.model, 'healthy': self.healthy, 'latency': self.latency,
+                'calls': self.calls, 'failures': self.failures}
+
+
+class BackendRegistry:
+    """Backends in order of preference, sharing one HTTP connection pool"""
+
+    def __init__(self, backends=(), max_connections=64, max_keepalive=32):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self._backends = {}
+        self._http = None
+        self._async_http = None
+        self._lock = threading.Lock()
+        for backend in backends:
+            self.add(backend)
+
+    @classmethod
+    def from_config(cls, config, api_key=None, **kwargs):
+        """Registry from a {name: settings} mapping, in its order.
+
+        Each backend reads its key from the environment variable named by
+        api_key_env, or takes api_key directly; api_key here is the fallback
+        for backends that name neither.
+        """
+        backends = []
+        for name, settings in config.items():
+            settings = dict(settings)
+            env = settings.pop('api_key_env', None)
+            key = settings.pop('api_key', None) or (os.environ.get(env) if env else None) or api_key
+            scheduler = settings.pop('scheduler', None)
+            if scheduler is not None and not isinstance(scheduler, RequestScheduler):
+                # e.g. requests_per_minute / tokens_per_minute from the config file
+                scheduler = RequestScheduler(**scheduler)
+            tasks = {operation: dict(task) for operation, task in settings.pop('tasks', {}).items()}
+            backends.append(Backend(name, api_key=key, tasks=tasks, scheduler=scheduler, **settings))
+        return cls(backends, **kwargs)
+
+    @classmethod
+    def load(cls, path, api_key=None, **kwargs):
+        """Registry from the [backends] table of a TOML file"""
+        import tomllib
+
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+        try:
+            return cls.from_config(config['backends'], api_key, **kwargs)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{path}: invalid backend configuration: {e}") from e
+
+    def add(self, backend):
+        if backend.name in self._backends:
+            raise ValueError(f"Backend {backend.name!r} is already registered")
+        backend.registry = self
+        self._backends[backend.name] = backend
+        return backend
+
+    def __getitem__(self, name):
+        return self._backends[name]
+
+    def __iter__(self):
+        return iter(list(self._backends.values()))
+
+    def __len__(self):
+        return len(self._backends)
+
+    @property
+    def primary(self):
+        return next(iter(self._backends.values()))
+
+    def _limits(self):
+        import openai
+
+        # The Limits class of whichever HTTP library this openai release is built on
+        limits = type(openai.DEFAULT_CONNECTION_LIMITS)
+        return limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+
+    def http_client(self):
+        """The httpx.Client every backend's sync client sends through"""
+        with self._lock:
+            if self._http is None:
+                import openai
+
+                # openai's own client class keeps its default timeouts and redirect handling
+                self._http = openai.DefaultHttpxClient(limits=self._limits())
+            return self._http
+
+    def async_http_client(self):
+        """The httpx.AsyncClient every backend's async client sends through"""
+        with self._lock:
+            if self._async_http is None:
+                import openai
+
+                self._async_http = openai.DefaultAsyncHttpxClient(limits=self._limits())
+            return self._async_http
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
+        self.close()
+
+    def stats(self):
+        return [backend.stats() for backend in self]
+
+
+class LatencySelector:
+    """Orders a registry's backends for each request"""
+
+    def __init__(self, registry, fast_operations=FAST_OPERATIONS):
+        self.registry = registry
+        self.fast_operations = frozenset(fast_operations)
+
+    def candidates(self, operation):
+        """Backends to try for operation, best first.
+
+        A fast operation prefers the lowest average latency; a backend not
+        measured yet sorts first so it gets measured. Unhealthy backends are
+        kept at the end as a last resort.
+        """
+        backends = [backend for backend in self.registry if backend.serves(operation)]
+        if not backends:
+            raise LookupError(f"No backend is configured for {operation!r}")
+        healthy = [backend for backend in backends if backend.healthy]
+        if operation in self.fast_operations:
+            healthy.sort(key=lambda backend: backend.latency or 0.0)
+        return healthy + [backend for backend in backends if not backend.healthy]
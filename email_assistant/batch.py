@@ -0,0 +1,259 @@
+"""Headless batch analysis of mail archives.
+
+Streams messages out of an mbox file, a Maildir or a directory of .eml files,
+scores them with a rule-based assistant on a process pool and writes the
+results incrementally as JSONL or CSV:
+
+    python -m email_assistant.batch archive.mbox -o results.jsonl
+
+(`python free-email-assistant.py batch ...` does the same, but pays for
+importing Streamlit first.)
+"""
+import argparse
+import csv
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from email import policy
+from email.parser import BytesParser
+
+RESULT_FIELDS = ['source', 'message_id', 'subject', 'tone', 'clarity_score', 'politeness_score', 'improvements']
+
+_parser = BytesParser(policy=policy.default)
+_analyzer = None
+
+
+def iter_mbox(path):
+    """Yield (source, raw_bytes) for each message in an mbox file, one message in memory at a time"""
+    with open(path, 'rb') as f:
+        lines = None
+        index = 0
+        for line in f:
+            if line.startswith(b'From '):
+                if lines is not None:
+                    yield f"{path}:{index}", _join_message(lines)
+                    index += 1
+                lines = []
+                continue
+            if lines is None:
+                continue
+            # Undo mboxrd ">From " quoting
+            if line.startswith(b'>') and line.lstrip(b'>').startswith(b'From '):
+                line = line[1:]
+            lines.append(line)
+        if lines is not None:
+            yield f"{path}:{index}", _join_message(lines)
+
+
+def _join_message(lines):
+    # Drop the blank line that separates a message from the next "From " line
+    if lines and lines[-1] in (b'\n', b'\r\n'):
+        lines.pop()
+    return b''.join(lines)
+
+
+def iter_files(paths):
+    """Yield (source, raw_bytes) for each readable file path"""
+    for file_path in paths:
+        try:
+            with open(file_path, 'rb') as f:
+                yield file_path, f.read()
+        except OSError:
+            continue
+
+
+def _scan_dir(path):
+    for entry in os.scandir(path):
+        if entry.is_file() and not entry.name.startswith('.'):
+            yield entry.path
+
+
+def _walk_eml(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.eml'):
+                yield os.path.join(root, name)
+
+
+def iter_messages(path):
+    """Yield (source, raw_bytes) for every message in an mbox, Maildir or .eml directory"""
+    if os.path.isfile(path):
+        if path.lower().endswith('.eml'):
+            yield from iter_files([path])
+        else:
+            yield from iter_mbox(path)
+    elif os.path.isdir(os.path.join(path, 'cur')) or os.path.isdir(os.path.join(path, 'new')):
+        for sub in ('new', 'cur'):
+            if os.path.isdir(os.path.join(path, sub)):
+                yield from iter_files(_scan_dir(os.path.join(path, sub)))
+    elif os.path.isdir(path):
+        yield from iter_files(_walk_eml(path))
+    else:
+        raise FileNotFoundError(f"No mailbox found at {path}")
+
+
+def message_text(msg):
+    """Extract the readable body of a parsed message"""
+    body = msg.get_body(preferencelist=('plain', 'html'))
+    if body is None:
+        return ''
+    try:
+        return body.get_content()
+    except (LookupError, KeyError, ValueError):
+        payload = body.get_payload(decode=True) or b''
+        return payload.decode('utf-8', errors='replace')
+
+
+def _init_worker(analyzer_factory):
+    global _analyzer
+    _analyzer = analyzer_factory()
+
+
+def _analyze_chunk(chunk):
+    messages = [(source, _parser.parsebytes(raw)) for source, raw in chunk]
+    texts = [message_text(msg) for _, msg in messages]
+    if hasattr(_analyzer, 'analyze_many'):
+        analyses = _analyzer.analyze_many(texts)
+    else:
+        analyses = [_analyzer.analyze_email_tone(text) for text in texts]
+    rows = []
+    for (source, msg), analysis in zip(messages, analyses):
+        rows.append({
+            'source': source,
+            'message_id': str(msg.get('Message-ID', '')),
+            'subject': str(msg.get('Subject', '')),
+            'tone': analysis['tone'],
+            'clarity_score': analysis['clarity_score'],
+            'politeness_score': analysis['politeness_score'],
+            'improvements': analysis['improvements'],
+        })
+    return rows
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class JsonlWriter:
+    """Write one JSON object per line"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.f.flush()
+
+
+class CsvWriter:
+    """Write rows as CSV with improvements joined by semicolons"""
+
+    def __init__(self, f):
+        self.f = f
+        self.writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        self.writer.writeheader()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.writer.writerow(dict(row, improvements='; '.join(row['improvements'])))
+        self.f.flush()
+
+
+WRITERS = {'jsonl': JsonlWriter, 'csv': CsvWriter}
+
+
+def analyze_messages(messages, writer, analyzer_factory, workers=None, chunk_size=500, progress=None):
+    """Analyze (source, raw_bytes) pairs on a process pool and hand results to writer in input order.
+
+    At most two chunks per worker are in flight, so memory stays bounded by
+    chunk_size no matter how many messages the source yields.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 2
+    count = 0
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(analyzer_factory,)) as pool:
+        pending = deque()
+        for chunk in _chunked(messages, chunk_size):
+            pending.append(pool.apply_async(_analyze_chunk, (chunk,)))
+            while len(pending) >= max_pending:
+                count += _drain(pending, writer)
+                if progress:
+                    progress(count, time.perf_counter() - start)
+        while pending:
+            count += _drain(pending, writer)
+            if progress:
+                progress(count, time.perf_counter() - start)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'messages': count,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(count / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _drain(pending, writer):
+    rows = pending.popleft().get()
+    writer.write_rows(rows)
+    return len(rows)
+
+
+def _report(count, elapsed):
+    rate = count / elapsed if elapsed else 0.0
+    sys.stderr.write(f"\r{count} messages, {rate:,.0f} msg/s")
+    sys.stderr.flush()
+
+
+def main(argv=None, analyzer_factory=None):
+    """Command line entry point for batch analysis; analyzes with FreeEmailAssistant by default"""
+    if analyzer_factory is None:
+        from email_assistant.free import FreeEmailAssistant as analyzer_factory
+    parser = argparse.ArgumentParser(prog='batch', description="Analyze every message in a mail archive")
+    parser.add_argument('archive', help="mbox file, Maildir or directory of .eml files")
+    parser.add_argument('-o', '--output', required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=sorted(WRITERS), help="output format (default: from extension)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="messages per worker task")
+    parser.add_argument('--tone-model', help="ToneClassifier weights (.npy) to decide tone instead of the keyword rules")
+    args = parser.parse_args(argv)
+
+    if args.tone_model:
+        from email_assistant.classifier import ToneClassifier
+
+        analyzer_factory = functools.partial(analyzer_factory, tone_classifier=ToneClassifier.load(args.tone_model))
+
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    with open(args.output, 'w', encoding='utf-8', newline='') as f:
+        stats = analyze_messages(
+            iter_messages(args.archive),
+            WRITERS[fmt](f),
+            analyzer_factory,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            progress=_report,
+        )
+
+    sys.stderr.write(
+        f"\nAnalyzed {stats['messages']} messages in {stats['seconds']}s "
+        f"({stats['messages_per_second']} msg/s)\n"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
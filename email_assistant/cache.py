@@ -0,0 +1,123 @@
+"""Completion cache for OpenAI chat calls.
+
+Entries are keyed on a hash of (model, temperature, prompt). Lookups hit an
+in-memory LRU first and fall back to an optional SQLite file, so identical
+requests made on a Streamlit rerun, or by another process sharing the file,
+skip the API round trip. Both tiers expire entries after a TTL and evict the
+least recently used ones once they grow past their size limit.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CompletionCache:
+    """In-memory LRU cache with an optional on-disk SQLite tier"""
+
+    def __init__(self, max_entries=256, ttl=3600, db_path=None, max_db_entries=10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_entries = max_db_entries
+        self.bypass = False
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed_at)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model, temperature, prompt):
+        """Stable hash of everything that determines a completion"""
+        payload = json.dumps([model, temperature, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._db.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store value under key in every tier"""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, now),
+                )
+                self._db.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+                overflow = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0] - self.max_db_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM completions WHERE key IN "
+                        "(SELECT key FROM completions ORDER BY accessed_at LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.evictions += overflow
+                self._db.commit()
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM completions")
+                self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters for display"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'evictions': self.evictions,
+            'entries': len(self._memory),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,311 @@
+"""Linear tone classifier over hashed word n-grams.
+
+A drop-in replacement for the formal/casual keyword vote in
+FreeEmailAssistant. Emails are split into tokens exactly like the lexicon
+scanner splits them, every unigram and bigram is hashed into one of
+n_features buckets, and a linear model maps the bucket counts to one score
+per tone label. There is no vocabulary to store: the hash of a token is its
+column.
+
+A batch is scored as one sparse (emails x features) @ (features x labels)
+product: the whole batch is hashed as a single byte buffer, the weight rows
+of every feature are gathered with one take() and summed per email with one
+np.add.reduceat, so a thousand emails cost a handful of NumPy calls instead
+of a Python loop per email or per token.
+
+Weights are one float32 .npy file of shape (n_features + 1, labels) whose
+last row holds the biases; the label names sit next to it in a .json file
+with the same stem. Train from a CSV with "text" and "label" columns:
+
+    python -m email_assistant.classifier train labeled.csv -o models/tone.npy
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from email_assistant.lexicon import word_bytes
+from email_assistant.preprocess import strip_email
+from email_assistant.store import fingerprint
+
+DEFAULT_FEATURES = 2 ** 14
+
+_SPACE = ord(' ')
+
+# Tokens are hashed as sum(byte[k] * P**k) mod 2**32 for an odd P, which has an inverse mod 2**32
+_P = 0x01000193
+_P_INVERSE = pow(_P, -1, 2 ** 32)
+# Odd multipliers for combining hashes; the high bits of the product depend on every input bit
+_MIX = np.uint32(0x9E3779B1)
+_PAIR = np.uint32(0x85EBCA6B)
+_powers = np.ones(1, dtype=np.uint32)
+_inverse_powers = np.ones(1, dtype=np.uint32)
+
+
+def _power_tables(size):
+    """P**k and P**-k mod 2**32 for k < size, grown on demand and shared by every call"""
+    global _powers, _inverse_powers
+    if len(_powers) < size:
+        size = max(size, 2 * len(_powers))
+        _powers = np.ones(size, dtype=np.uint32)
+        np.cumprod(np.full(size - 1, _P, dtype=np.uint32), out=_powers[1:])
+        _inverse_powers = np.ones(size, dtype=np.uint32)
+        np.cumprod(np.full(size - 1, _P_INVERSE, dtype=np.uint32), out=_inverse_powers[1:])
+    return _powers, _inverse_powers
+
+
+def token_hashes(texts):
+    """Return (hashes, bounds) for the tokens of texts.
+
+    hashes holds a 32-bit hash of every token, text by text, and text i owns
+    hashes[bounds[i]:bounds[i + 1]].
+
+    The whole batch is joined into one byte buffer and hashed without a
+    Python-level loop over tokens: a running sum of byte[k] * P**k gives the
+    hash of bytes [start, end) as the difference of two prefix sums, and
+    multiplying by P**-start makes it independent of where the token sits.
+    """
+    chunks = [word_bytes(text) for text in texts]
+    data = np.frombuffer(b' '.join(chunks), dtype=np.uint8)
+    text_starts = np.cumsum([0] + [len(chunk) + 1 for chunk in chunks[:-1]])
+
+    # Padded with a space on both sides, word/space changes alternate between token starts and ends
+    is_word = np.zeros(len(data) + 2, dtype=bool)
+    np.not_equal(data, _SPACE, out=is_word[1:-1])
+    edges = np.flatnonzero(is_word[1:] != is_word[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+
+    powers, inverse_powers = _power_tables(len(data) + 1)
+    prefix = np.zeros(len(data) + 1, dtype=np.uint32)
+    np.multiply(data, powers[:len(data)], out=prefix[1:])
+    np.cumsum(prefix[1:], out=prefix[1:])
+    hashes = (prefix[ends] - prefix[starts]) * inverse_powers[starts]
+
+    bounds = np.empty(len(texts) + 1, dtype=np.intp)
+    bounds[:-1] = np.searchsorted(starts, text_starts)
+    bounds[-1] = len(starts)
+    return hashes, bounds
+
+
+class HashedFeatures(namedtuple('HashedFeatures', ['columns', 'unigram_bounds', 'bigram_bounds', 'norms'])):
+    """Bucket of every n-gram in a batch of texts.
+
+    columns holds all unigrams, text by text, then all bigrams, text by text;
+    text i owns columns[unigram_bounds[i]:unigram_bounds[i + 1]] and
+    columns[bigram_bounds[i]:bigram_bounds[i + 1]]. norms holds one length
+    normalizer per text, so long and short emails score on the same scale.
+    """
+
+    __slots__ = ()
+
+    def sum_rows(self, values):
+        """Per-text sums of values, which holds one entry (or row) per column"""
+        starts = np.concatenate((self.unigram_bounds[:-1], self.bigram_bounds[:-1]))
+        ends = np.concatenate((self.unigram_bounds[1:], self.bigram_bounds[1:]))
+        # Segments are contiguous, so each non-empty one runs up to the start of the next
+        nonempty = starts < ends
+        sums = np.zeros((len(starts),) + values.shape[1:], dtype=values.dtype)
+        if nonempty.any():
+            sums[nonempty] = np.add.reduceat(values, starts[nonempty], axis=0)
+        return sums[:len(self.norms)] + sums[len(self.norms):]
+
+    def rows(self):
+        """The text each column came from"""
+        texts = np.arange(len(self.norms))
+        return np.concatenate((np.repeat(texts, np.diff(self.unigram_bounds)),
+                               np.repeat(texts, np.diff(self.bigram_bounds))))
+
+
+def hashed_features(texts, n_features):
+    """Hash the unigrams and bigrams of texts into n_features buckets (a power of two)"""
+    shift = np.uint32(32 - (n_features.bit_length() - 1))
+    hashes, bounds = token_hashes(texts)
+    lengths = np.diff(bounds)
+
+    # A bigram pairs each token with the next one, unless the next one starts another text
+    follows = np.ones(max(len(hashes) - 1, 0), dtype=bool)
+    follows[bounds[1:-1][(bounds[1:-1] > 0) & (bounds[1:-1] < len(hashes))] - 1] = False
+    bigrams = ((hashes[:-1] * _PAIR) ^ hashes[1:])[follows]
+    features = np.concatenate((hashes, bigrams))
+    features *= _MIX
+    features >>= shift
+
+    bigram_counts = np.maximum(lengths - 1, 0)
+    bigram_bounds = np.empty_like(bounds)
+    bigram_bounds[0] = len(hashes)
+    np.cumsum(bigram_counts, out=bigram_bounds[1:])
+    bigram_bounds[1:] += len(hashes)
+    norms = np.sqrt(np.maximum(lengths + bigram_counts, 1)).astype(np.float32)
+    return HashedFeatures(features.astype(np.intp), bounds, bigram_bounds, norms)
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    np.exp(scores, out=scores)
+    scores /= scores.sum(axis=1, keepdims=True)
+    return scores
+
+
+class ToneClassifier:
+    """Hashed n-gram linear model; weights has one row per bucket plus a bias row"""
+
+    def __init__(self, weights, labels):
+        weights = np.asarray(weights, dtype=np.float32)
+        if weights.ndim != 2 or weights.shape[1] != len(labels):
+            raise ValueError(f"Weights of shape {weights.shape} do not match {len(labels)} labels")
+        n_features = weights.shape[0] - 1
+        if n_features < 2 or n_features & (n_features - 1):
+            raise ValueError(f"Weights need a power-of-two number of feature rows plus a bias row, not {n_features}")
+        self.weights = weights
+        self.labels = list(labels)
+        self._version = None
+
+    @property
+    def n_features(self):
+        return self.weights.shape[0] - 1
+
+    @property
+    def version(self):
+        """Hash of the weights and labels, computed on first use"""
+        if self._version is None:
+            self._version = fingerprint(self.weights.tobytes(), self.labels)
+        return self._version
+
+    @staticmethod
+    def _labels_path(path):
+        return os.path.splitext(path)[0] + '.json'
+
+    @classmethod
+    def load(cls, path):
+        """Load weights from path and labels from the .json file next to it"""
+        with open(cls._labels_path(path), encoding='utf-8') as f:
+            labels = json.load(f)['labels']
+        return cls(np.load(path, allow_pickle=False), labels)
+
+    def save(self, path):
+        """Write the weights to path (a .npy file) and the labels next to it"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.save(path, self.weights, allow_pickle=False)
+        with open(self._labels_path(path), 'w', encoding='utf-8') as f:
+            json.dump({'labels': self.labels, 'n_features': self.n_features}, f)
+
+    def _scores(self, features):
+        scores = features.sum_rows(self.weights.take(features.columns, axis=0))
+        scores /= features.norms[:, None]
+        scores += self.weights[-1]
+        return scores
+
+    def scores(self, texts):
+        """Raw label scores, one row per text"""
+        return self._scores(hashed_features(texts, self.n_features))
+
+    def predict_proba(self, texts):
+        """Label probabilities, one row per text"""
+        return _softmax(self.scores(texts))
+
+    def predict(self, texts):
+        """The most likely label for each text"""
+        if not texts:
+            return []
+        return [self.labels[i] for i in self.scores(texts).argmax(axis=1)]
+
+    @classmethod
+    def train(cls, texts, labels, n_features=DEFAULT_FEATURES, steps=200, learning_rate=0.2, l2=1e-6):
+        """Fit a softmax regression on texts with full-batch Adam.
+
+        The texts are hashed once up front; every step is then one scoring
+        pass and one gradient scatter over the same features.
+        """
+        names = sorted(set(labels))
+        index = {name: i for i, name in enumerate(names)}
+        targets = np.array([index[label] for label in labels])
+        model = cls(np.zeros((n_features + 1, len(names)), dtype=np.float32), names)
+        features = hashed_features(texts, n_features)
+        rows = features.rows()
+
+        moment = np.zeros_like(model.weights)
+        velocity = np.zeros_like(model.weights)
+        beta1, beta2 = 0.9, 0.999
+        gradient = np.empty_like(model.weights)
+        for step in range(1, steps + 1):
+            error = _softmax(model._scores(features))
+            error[np.arange(len(texts)), targets] -= 1
+            error /= len(texts)
+
+            contributions = (error / features.norms[:, None]).take(rows, axis=0)
+            for j in range(len(names)):
+                gradient[:-1, j] = np.bincount(features.columns, weights=contributions[:, j], minlength=n_features)
+            gradient[:-1] += l2 * model.weights[:-1]
+            gradient[-1] = error.sum(axis=0)
+
+            moment *= beta1
+            moment += (1 - beta1) * gradient
+            velocity *= beta2
+            velocity += (1 - beta2) * gradient ** 2
+            correction = np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+            model.weights -= learning_rate * correction * moment / (np.sqrt(velocity) + 1e-8)
+        return model
+
+
+def read_labeled_csv(path, text_column='text', label_column='label'):
+    """Return (texts, labels) from a CSV file, with quoted history stripped from each text"""
+    texts, labels = [], []
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            text, label = row.get(text_column), row.get(label_column)
+            if text and label:
+                texts.append(strip_email(text).text)
+                labels.append(label.strip())
+    return texts, labels
+
+
+def _train_command(args):
+    texts, labels = read_labeled_csv(args.csv, args.text_column, args.label_column)
+    if len(set(labels)) < 2:
+        sys.stderr.write("Need at least two distinct labels to train\n")
+        return 1
+
+    order = np.random.default_rng(args.seed).permutation(len(texts))
+    held = int(len(texts) * args.holdout)
+    test, train = order[:held], order[held:]
+    model = ToneClassifier.train(
+        [texts[i] for i in train], [labels[i] for i in train],
+        n_features=args.features, steps=args.steps, learning_rate=args.learning_rate,
+    )
+    if held:
+        predicted = model.predict([texts[i] for i in test])
+        accuracy = sum(p == labels[i] for p, i in zip(predicted, test)) / held
+        sys.stderr.write(f"Held-out accuracy on {held} emails: {accuracy:.1%}\n")
+
+    model.save(args.output)
+    sys.stderr.write(f"Wrote {model.weights.nbytes / 1024:.0f} KiB of weights for {model.labels} to {args.output}\n")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='classifier', description="Hashed n-gram tone classifier")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train', help="Train weights from a labeled CSV")
+    train.add_argument('csv', help="CSV file with one email per row")
+    train.add_argument('-o', '--output', required=True, help="weights file to write (.npy)")
+    train.add_argument('--text-column', default='text')
+    train.add_argument('--label-column', default='label')
+    train.add_argument('--features', type=int, default=DEFAULT_FEATURES, help="hash buckets (a power of two)")
+    train.add_argument('--steps', type=int, default=200, help="optimizer steps over the whole training set")
+    train.add_argument('--learning-rate', type=float, default=0.2)
+    train.add_argument('--holdout', type=float, default=0.1, help="fraction of rows kept back for scoring")
+    train.add_argument('--seed', type=int, default=0, help="seed for picking the held-out rows")
+    args = parser.parse_args(argv)
+
+    return _train_command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""Offline, rule-based email engine.
+
+FreeEmailAssistant scores tone with word lists, fills in templates (see
+email_assistant/templates; TemplateLibrary picks one per purpose) and
+rewrites drafts with the grammar and style rules of email_assistant.rewrite;
+it needs no API key and imports nothing heavier than the standard library, so
+batch jobs and workers can use it without loading Streamlit or OpenAI.
+Pass a trained email_assistant.classifier.ToneClassifier to replace the
+keyword tone vote with a learned one, and an AnalysisStore to reuse the
+analyses of emails seen before.
+"""
+import functools
+
+from email_assistant.lexicon import Lexicon
+from email_assistant.preprocess import strip_email
+from email_assistant.rewrite import DEFAULT_RULES, RuleSet
+from email_assistant.templating import TemplateLibrary
+
+# Part of every stored analysis_version. Bump it whenever a change alters what analyze_email_tone returns
+# for the same email: the scoring in _analyze_scan, the lexicon tokenizer or strip_email. Word list edits
+# are picked up on their own.
+RULES_VERSION = 1
+
+
+class FreeEmailAssistant:
+    # Word lists used by analyze_email_tone, compiled once for all instances
+    lexicon = Lexicon({
+        'formal': ['dear', 'sincerely', 'regards', 'respectfully'],
+        'casual': ['hi', 'hey', 'thanks', 'cheers'],
+        # One concept per stem, so "thanks ... thankful" scores like the single word it is
+        'polite': ['please', ('thank', 'thanks', 'thankful'), ('appreciate', 'appreciated'), 'kindly'],
+        'greeting': ['hi', 'hello', 'dear'],
+        'closing': ['regards', 'sincerely', 'thanks', 'cheers'],
+    })
+    
+    # Compose templates from email_assistant/templates, read on first use and shared by every instance
+    templates = TemplateLibrary()
+    
+    # Grammar and style rules used by rewrite_email, compiled per style on first use
+    rewriter = RuleSet(DEFAULT_RULES)
+    
+    improvement_tips = {
+        'professional': [
+            "Use formal salutation (Dear/Sir/Madam)",
+            "Include clear subject line",
+            "Use complete sentences",
+            "End with formal closing (Sincerely/Best regards)",
+            "Proofread for grammar and spelling"
+        ],
+        'friendly': [
+            "Use casual greeting (Hi/Hey)",
+            "Add personal touch or warmth",
+            "Use conversational tone",
+            "Include emojis if appropriate",
+            "End with casual closing (Cheers/Thanks)"
+        ],
+        'concise': [
+            "Remove unnecessary words",
+            "Use bullet points for lists",
+            "One main point per paragraph",
+            "Clear call-to-action",
+            "Keep sentences under 20 words"
+        ]
+    }
+    
+    response_templates = {
+        "acknowledge": """Thank you for your email. I have received it and will review the details carefully. I'll get back to you within [timeframe] with a response.
+
+Best regards,
+[Your Name]""",
+        
+        "meeting": """Thank you for reaching out. I would be happy to schedule a meeting to discuss this further.
+
+I'm available:
+• [Day] at [Time]
+• [Day] at [Time]
+• [Day] at [Time]
+
+Please let me know which time works best for you, or suggest alternative times if these don't suit your schedule.
+
+Best regards,
+[Your Name]""",
+        
+        "decline": """Thank you for thinking of me for this opportunity. After careful consideration, I won't be able to participate at this time due to [brief reason - optional].
+
+I appreciate you reaching out and wish you the best with this initiative.
+
+Best regards,
+[Your Name]""",
+        
+        "follow_up": """I wanted to follow up on my previous email sent on [date] regarding [subject].
+
+Could you please provide an update on the status? If you need any additional information from my end, please let me know.
+
+Thank you for your time.
+
+Best regards,
+[Your Name]""",
+        
+        "custom": """Thank you for your email. I understand you're looking for [brief summary of their request].
+
+[Your response/information]
+
+Please let me know if you need any additional information.
+
+Best regards,
+[Your Name]"""
+    }
+
+    def __init__(self, tone_classifier=None, store=None, templates=None):
+        # Optional classifier (e.g. email_assistant.classifier.ToneClassifier) that replaces
+        # the formal/casual keyword vote; anything with predict(list of texts) -> list of labels
+        self.tone_classifier = tone_classifier
+        # Optional email_assistant.store.AnalysisStore consulted before analyzing
+        self.store = store
+        # A TemplateLibrary or a directory of template files, replacing the bundled templates
+        if templates is not None:
+            self.templates = templates if isinstance(templates, TemplateLibrary) else TemplateLibrary(templates)
+
+    @functools.cached_property
+    def _rules_version(self):
+        from email_assistant.store import fingerprint
+
+        return fingerprint(RULES_VERSION, sorted(self.lexicon.concepts.items()))
+
+    @property
+    def analysis_engine(self):
+        """Name analyses are stored under in an AnalysisStore"""
+        return 'free' if self.tone_classifier is None else 'free-classifier'
+
+    @property
+    def analysis_version(self):
+        """Changes whenever the rules or the tone classifier change what an analysis would be"""
+        from email_assistant.store import fingerprint
+
+        classifier = self.tone_classifier
+        if classifier is None:
+            return self._rules_version
+        return fingerprint(self._rules_version, getattr(classifier, 'version', type(classifier).__qualname__))
+
+    def analyze_email_tone(self, email_text):
+        """Analyze email using simple rules"""
+        if self.store is not None:
+            return self.analyze_many([email_text])[0]
+        # Score only what the sender wrote, not quoted replies, signatures or disclaimers
+        text = strip_email(email_text).text
+        tone = self.tone_classifier.predict([text])[0] if self.tone_classifier is not None else None
+        return self._analyze(text, tone)
+
+    def analyze_many(self, emails):
+        """Analyze several emails at once.
+
+        A tone classifier scores the whole list in one batch, and with a store
+        every analysis seen before comes from one bulk lookup.
+        """
+        texts = [strip_email(email_text).text for email_text in emails]
+        if self.store is None:
+            return self._analyze_texts(texts)
+
+        from email_assistant.store import content_key
+
+        keys = [content_key(text) for text in texts]
+        version = self.analysis_version
+        results = self.store.get_many(self.analysis_engine, version, keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in results:
+                missing.setdefault(key, text)
+        if missing:
+            fresh = dict(zip(missing, self._analyze_texts(list(missing.values()))))
+            self.store.put_many(self.analysis_engine, version, fresh.items())
+            results.update(fresh)
+        return [results[key] for key in keys]
+
+    def _analyze_texts(self, texts):
+        if self.tone_classifier is None:
+            return [self._analyze(text) for text in texts]
+        return [self._analyze(text, tone) for text, tone in zip(texts, self.tone_classifier.predict(texts))]
+
+    def _analyze(self, text, tone=None):
+        return self._analyze_scan(self.lexicon.scan(text), tone)
+    
+    def _analyze_scan(self, scan, tone=None):
+        """The analysis for a LexiconScan, e.g. one combined from cached paragraphs"""
+        analysis = {
+            'tone': 'Unknown',
+            'clarity_score': 5,
+            'politeness_score': 5,
+            'improvements': []
+        }
+        
+        # Determine tone
+        if tone is not None:
+            analysis['tone'] = tone
+        else:
+            formal_count = scan.count('formal')
+            casual_count = scan.count('casual')
+            
+            if formal_count > casual_count:
+                analysis['tone'] = 'Formal'
+            elif casual_count > formal_count:
+                analysis['tone'] = 'Casual'
+            else:
+                analysis['tone'] = 'Neutral'
+        
+        # Clarity score based on sentence length and structure
+        avg_sentence_length = scan.avg_sentence_length
+        
+        if avg_sentence_length < 15:
+            analysis['clarity_score'] = 8
+        elif avg_sentence_length < 25:
+            analysis['clarity_score'] = 6
+        else:
+            analysis['clarity_score'] = 4
+            analysis['improvements'].append("Consider shorter sentences for better clarity")
+        
+        # Politeness score
+        politeness_count = scan.count('polite')
+        analysis['politeness_score'] = min(10, 3 + politeness_count * 2)
+        
+        # Generate improvements
+        if not scan.has_any('greeting'):
+            analysis['improvements'].append("Add a proper greeting")
+        
+        if not scan.has_any('closing'):
+            analysis['improvements'].append("Include a professional closing")
+        
+        if scan.word_count < 20:
+            analysis['improvements'].append("Consider providing more context and details")
+        
+        return analysis
+    
+    def rewrite_email(self, email_text, style="professional"):
+        """Rewrite the new content of email_text for style; returns an email_assistant.rewrite.Rewrite"""
+        return self.rewriter.rewrite(strip_email(email_text).text, style)
+    
+    def improve_email(self, email_text, style="professional", rewrite=None):
+        """Rewrite the email and list what changed and what else to improve.
+        
+        rewrite is rewrite_email's result for the same email and style when
+        the caller already has it. Further suggestions come from analyzing
+        the rewritten text, so nothing the rewrite fixed is suggested again.
+        """
+        if rewrite is None:
+            rewrite = self.rewrite_email(email_text, style)
+        before = self.analyze_email_tone(email_text)
+        after = self.analyze_email_tone(rewrite.text) if rewrite.changed else before
+        suggestions = rewrite.suggestions() + after['improvements']
+        # Style-specific tips
+        suggestions.extend(self.improvement_tips.get(style.lower(), []))
+        
+        lines = [f"IMPROVED EMAIL ({style.title()} Style):", "", rewrite.text, "", "Changes Made:"]
+        lines.extend(f"- {change}" for change in rewrite.changes() or ["None; the draft already follows the rules"])
+        lines += ["", "Further Suggestions:"]
+        lines.extend(f"{i}. {suggestion}" for i, suggestion in enumerate(suggestions, 1))
+        lines += [
+            "",
+            "Tone Analysis (original → improved):",
+            f"- Tone: {before['tone']} → {after['tone']}",
+            f"- Clarity: {before['clarity_score']}/10 → {after['clarity_score']}/10",
+            f"- Politeness: {before['politeness_score']}/10 → {after['politeness_score']}/10",
+        ]
+        return '\n'.join(lines) + '\n'
+    
+    @staticmethod
+    def _template_values(purpose, recipient_type, key_points):
+        # Format key points as bullet points
+        formatted_points = '\n'.join(f"• {point.strip()}" for point in key_points.split('\n') if point.strip())
+        return {'purpose': purpose, 'recipient': recipient_type.lower(), 'key_points': formatted_points}
+    
+    def compose_email(self, purpose, recipient_type, key_points, tone="professional"):
+        """Compose email using templates"""
+        
+        # Trigger words in the purpose (or the tone) pick the template through the library's keyword index
+        template = self.templates.select(purpose, tone)
+        return template.message.render(**self._template_values(purpose, recipient_type, key_points))
+    
+    def compose_many(self, rows, template=None):
+        """Compose one email per row, in order.
+        
+        Each row is a mapping with compose_email's arguments as keys (tone
+        optional); its other keys are available to custom templates as extra
+        fields. Rows that get the same template, or all of them when template
+        names one, are rendered together with its render_many.
+        """
+        groups = {}
+        for i, row in enumerate(rows):
+            chosen = self.templates[template] if template else \
+                self.templates.select(row['purpose'], row.get('tone') or "professional")
+            values = dict(row)
+            values.update(self._template_values(row['purpose'], row['recipient_type'], row['key_points']))
+            group = groups.setdefault(chosen.name, (chosen, [], []))
+            group[1].append(i)
+            group[2].append(values)
+        
+        emails = [None] * len(rows)
+        for chosen, indices, values in groups.values():
+            for i, text in zip(indices, chosen.message.render_many(values)):
+                emails[i] = text
+        return emails
+    
+    def quick_responses(self, received_email="", response_type="acknowledge"):
+        """Generate quick response templates"""
+        return self.response_templates.get(response_type, self.response_templates["acknowledge"])
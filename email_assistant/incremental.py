@@ -0,0 +1,197 @@
+"""Incremental re-analysis of a draft while it is being edited.
+
+Scoring a draft on every edit from scratch repeats work on all the
+paragraphs that did not change. Both analyzers here split the draft (with
+quoted history and footers stripped) into paragraphs, keep a result per
+paragraph keyed by its text, and only compute the paragraphs that are new:
+
+- IncrementalAnalyzer caches each paragraph's Lexicon.scan_segment and
+  combines them into exactly the analysis FreeEmailAssistant gives for the
+  whole email.
+- IncrementalAIAnalyzer sends only new paragraphs, together in one
+  analyze_many call, and merges the per-paragraph analyses weighted by
+  length. update() debounces: the call goes out once edits have paused for
+  `debounce` seconds, so a long draft costs no round trip per keystroke.
+"""
+import contextvars
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from email_assistant.preprocess import strip_email
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+def split_paragraphs(text):
+    """The non-blank paragraphs of text, split on blank lines"""
+    return [paragraph for paragraph in _PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+
+
+class _SegmentCache:
+    """LRU map from paragraph text to its result"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, paragraph):
+        value = self._entries.get(paragraph)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(paragraph)
+        self.hits += 1
+        return value
+
+    def put(self, paragraph, value):
+        self._entries[paragraph] = value
+        self._entries.move_to_end(paragraph)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'reused': self.hits, 'computed': self.misses, 'entries': len(self._entries),
+                'reuse_rate': self.hits / lookups if lookups else 0.0}
+
+
+class IncrementalAnalyzer:
+    """FreeEmailAssistant.analyze_email_tone that rescans only edited paragraphs"""
+
+    def __init__(self, free, max_segments=4096):
+        self.free = free
+        self.segments = _SegmentCache(max_segments)
+
+    def analyze(self, email_text):
+        """Same result as free.analyze_email_tone(email_text)"""
+        text = strip_email(email_text).text
+        lexicon = self.free.lexicon
+        scans = []
+        for paragraph in split_paragraphs(text):
+            scan = self.segments.get(paragraph)
+            if scan is None:
+                scan = lexicon.scan_segment(paragraph)
+                self.segments.put(paragraph, scan)
+            scans.append(scan)
+        classifier = self.free.tone_classifier
+        # A classifier's features span paragraph boundaries, so it still scores the whole text
+        tone = classifier.predict([text])[0] if classifier is not None else None
+        return self.free._analyze_scan(lexicon.combine(scans), tone)
+
+
+def combine_analyses(analyses, weights, max_improvements=5):
+    """Merge per-paragraph analyses into one, weighting each by its paragraph's length.
+
+    Tone is the weighted majority, the scores are weighted means and the
+    improvements are deduplicated in order. Paragraphs whose analysis failed
+    are left out; if all failed, the first error is returned.
+    """
+    usable = [(analysis, weight) for analysis, weight in zip(analyses, weights) if 'error' not in analysis]
+    if not usable:
+        return next((analysis for analysis in analyses if 'error' in analysis), {"error": "Nothing to analyze"})
+
+    total = sum(weight for _, weight in usable) or 1
+    tones = Counter()
+    improvements = []
+    for analysis, weight in usable:
+        tones[analysis['tone']] += weight
+        for improvement in analysis['improvements']:
+            if improvement not in improvements:
+                improvements.append(improvement)
+    return {
+        'tone': tones.most_common(1)[0][0],
+        'clarity_score': round(sum(a['clarity_score'] * w for a, w in usable) / total),
+        'politeness_score': round(sum(a['politeness_score'] * w for a, w in usable) / total),
+        'improvements': improvements[:max_improvements],
+    }
+
+
+class IncrementalAIAnalyzer:
+    """EmailAssistant analysis that re-sends only changed paragraphs, with debounced updates"""
+
+    def __init__(self, assistant, debounce=1.0, use_cache=True, max_segments=1024):
+        self.assistant = assistant
+        # Seconds without an edit before update() sends anything
+        self.debounce = debounce
+        self.use_cache = use_cache
+        self.segments = _SegmentCache(max_segments)
+        self.sent = 0
+        self.latest_text = None
+        self.latest = None
+        self._pending = None
+        self._timer = None
+        self._lock = threading.Lock()
+        # Analyses run one at a time; a newer draft waits for the current one instead of racing it
+        self._running = threading.Lock()
+
+    def analyze(self, email_text):
+        """Analyze now, sending only paragraphs not analyzed before"""
+        paragraphs = split_paragraphs(strip_email(email_text).text)
+        results = {}
+        for paragraph in paragraphs:
+            if paragraph not in results:
+                cached = self.segments.get(paragraph)
+                if cached is not None:
+                    results[paragraph] = cached
+
+        missing = [paragraph for paragraph in dict.fromkeys(paragraphs) if paragraph not in results]
+        if missing:
+            analyses = self.assistant.analyze_many(missing, use_cache=self.use_cache)
+            self.sent += len(missing)
+            for paragraph, analysis in zip(missing, analyses):
+                results[paragraph] = analysis
+                if 'error' not in analysis:
+                    self.segments.put(paragraph, analysis)
+
+        analysis = combine_analyses([results[paragraph] for paragraph in paragraphs],
+                                    [len(paragraph.split()) for paragraph in paragraphs])
+        with self._lock:
+            self.latest_text, self.latest = email_text, analysis
+        return analysis
+
+    def update(self, email_text, callback=None):
+        """Analyze email_text once no newer update() has arrived for debounce seconds.
+
+        callback(email_text, analysis) runs on the timer thread afterwards;
+        result_for() polls instead. Drafts already analyzed are not resent.
+        """
+        with self._lock:
+            if email_text == self.latest_text or email_text == self._pending:
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+            self._pending = email_text
+            # Run in a copy of the caller's context so scoped metrics sinks see the calls
+            self._timer = threading.Timer(self.debounce, contextvars.copy_context().run,
+                                          (self._fire, email_text, callback))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self, email_text, callback):
+        with self._running:
+            with self._lock:
+                if self._pending != email_text:
+                    # Superseded while waiting for the previous analysis
+                    return
+                self._pending = None
+            analysis = self.analyze(email_text)
+        if callback is not None:
+            callback(email_text, analysis)
+
+    def result_for(self, email_text):
+        """The analysis of exactly email_text if it is done, else None"""
+        with self._lock:
+            return self.latest if self.latest_text == email_text else None
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._pending = None
+
+    def stats(self):
+        """Paragraphs reused from earlier drafts vs sent to the API"""
+        return dict(self.segments.stats(), sent=self.sent)
@@ -0,0 +1,145 @@
+"""Single-pass lexicon scanner for the rule-based analyzer.
+
+The text is lowercased and pushed once through a byte translation table that
+turns punctuation into whitespace, then split into tokens a single time. All
+lexicon terms live in one precompiled set, so matching every category is one
+C-level set intersection over those tokens and "hi" only ever matches the
+word "hi", never "this" or "which". The word count falls out of the same
+token list and sentences are counted from a second translation of the raw
+bytes that keeps only terminators, instead of re-splitting the email per
+sentence.
+"""
+import string
+from collections import namedtuple
+
+_TERMINATORS = b'.!?'
+
+# Punctuation and whitespace become spaces, except apostrophes which stay inside words
+_WORD_TABLE = bytearray(range(256))
+for _c in (string.punctuation + string.whitespace).encode():
+    if _c != ord("'"):
+        _WORD_TABLE[_c] = ord(' ')
+_WORD_TABLE = bytes(_WORD_TABLE)
+
+# Everything except sentence terminators becomes a space
+_SENTENCE_TABLE = bytearray(b' ' * 256)
+for _c in _TERMINATORS:
+    _SENTENCE_TABLE[_c] = _c
+_SENTENCE_TABLE = bytes(_SENTENCE_TABLE)
+
+_TRAILING = b' \t\r\n"\')]'
+
+
+def _normalize(text):
+    return text.lower().replace('\xa0', ' ').encode('utf-8')
+
+
+def word_bytes(text):
+    """text as lowercased UTF-8 with punctuation and whitespace turned into spaces.
+
+    Splitting the result on spaces gives exactly the tokens Lexicon.scan matches.
+    """
+    return _normalize(text).translate(_WORD_TABLE)
+
+
+class LexiconScan(namedtuple('LexiconScan', ['matches', 'word_count', 'sentence_count'])):
+    """Result of scanning one text: matched terms per category plus word/sentence counts"""
+    __slots__ = ()
+
+    def count(self, category):
+        """Number of distinct concepts from category present in the text"""
+        return len(self.matches[category])
+
+    def has_any(self, category):
+        """Whether any term from category is present in the text"""
+        return bool(self.matches[category])
+
+    @property
+    def avg_sentence_length(self):
+        return self.word_count / max(self.sentence_count, 1)
+
+
+class SegmentScan(namedtuple('SegmentScan', ['terms', 'word_count', 'terminators', 'tail'])):
+    """Additive scan of one piece of a text, for Lexicon.combine.
+
+    terms are the matched lexicon terms (bytes), terminators the runs of
+    sentence terminators, and tail whether the piece's last character is
+    one (None when the piece is only whitespace and closing punctuation).
+    """
+    __slots__ = ()
+
+
+class Lexicon:
+    """Word lists compiled once and matched on exact word boundaries.
+
+    Terms are single words. A tuple of words is one concept listing each
+    inflection that should match, e.g. ('thank', 'thanks', 'thankful'); it
+    counts once however many of them appear and is reported under its first
+    word. concepts maps (category, term) to that word.
+    """
+
+    def __init__(self, categories):
+        self.categories = {}
+        self.concepts = {}
+        for name, entries in categories.items():
+            terms = set()
+            for entry in entries:
+                forms = (entry,) if isinstance(entry, str) else tuple(entry)
+                for form in forms:
+                    term = form.lower().encode('utf-8')
+                    terms.add(term)
+                    self.concepts[name, term] = forms[0].lower()
+            self.categories[name] = frozenset(terms)
+        self.terms = frozenset().union(*self.categories.values())
+
+    def _matches(self, found):
+        return {
+            name: tuple(sorted({self.concepts[name, term] for term in terms & found}))
+            for name, terms in self.categories.items()
+        }
+
+    def scan(self, text):
+        """Scan text once and return a LexiconScan"""
+        raw = _normalize(text)
+        tokens = raw.translate(_WORD_TABLE).split()
+
+        matches = self._matches(self.terms.intersection(tokens))
+
+        word_count = len(tokens)
+        sentence_count = len(raw.translate(_SENTENCE_TABLE).split())
+        tail = raw.rstrip(_TRAILING)
+        if tail and tail[-1] not in _TERMINATORS:
+            sentence_count += 1
+
+        return LexiconScan(matches, word_count, sentence_count)
+
+    def scan_segment(self, text):
+        """Scan one paragraph of a longer text; combine() the results to get the text's LexiconScan"""
+        raw = _normalize(text)
+        tokens = raw.translate(_WORD_TABLE).split()
+        tail = raw.rstrip(_TRAILING)
+        return SegmentScan(
+            self.terms.intersection(tokens),
+            len(tokens),
+            len(raw.translate(_SENTENCE_TABLE).split()),
+            tail[-1] in _TERMINATORS if tail else None,
+        )
+
+    def combine(self, segments):
+        """The LexiconScan of whitespace-separated segments, equal to scanning their concatenation.
+
+        Only the last segment with content decides whether an unterminated
+        final sentence adds one to the count, as it does for the whole text.
+        """
+        found = set()
+        word_count = sentence_count = 0
+        tail = None
+        for segment in segments:
+            found.update(segment.terms)
+            word_count += segment.word_count
+            sentence_count += segment.terminators
+            if segment.tail is not None:
+                tail = segment.tail
+        if tail is False:
+            sentence_count += 1
+        return LexiconScan(self._matches(found), word_count, sentence_count)
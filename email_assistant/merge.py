@@ -0,0 +1,355 @@
+"""Mail merge: one composed email per CSV row, streamed to JSONL or .eml files.
+
+Rows are read from the CSV one at a time, composed and written in input
+order, so memory stays flat whatever the row count:
+
+    python -m email_assistant.merge recipients.csv -o campaign.jsonl
+    python -m email_assistant.merge recipients.csv -o outbox/ --sender me@example.com
+    python -m email_assistant.merge recipients.csv -o campaign.jsonl --engine ai --concurrency 8
+
+The CSV needs purpose, recipient_type and key_points columns (tone and to
+are optional); any other columns are passed to custom templates as fields.
+The free engine renders rows in chunks with the template engine; the ai
+engine sends up to --concurrency compose calls at a time.
+
+After every chunk the output is flushed and a checkpoint next to it records
+how many rows are done, so rerunning the same command after a crash resumes
+where it stopped instead of composing (or paying for) those rows again. A
+row that fails to compose (e.g. during an API outage) stops the run rather
+than using up the rest of the CSV: the checkpoint is left at that row, so
+rerunning the command once the API is back continues from it.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+MERGE_FIELDS = ('purpose', 'recipient_type', 'key_points')
+
+
+def read_rows(path):
+    """Yield each CSV row as a dict, one row in memory at a time"""
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        missing = [field for field in MERGE_FIELDS if field not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"{path} is missing the column(s) {', '.join(missing)}")
+        yield from reader
+
+
+def split_message(text):
+    """(subject, body) of a composed email that starts with a "Subject:" line"""
+    if text.startswith('Subject:'):
+        subject, _, body = text.partition('\n')
+        return subject[len('Subject:'):].strip(), body.lstrip('\n')
+    return '', text
+
+
+def compose_free(rows, assistant, chunk_size=500, template=None):
+    """Yield (row, email_text, error) for every row, rendering each chunk with FreeEmailAssistant.compose_many"""
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield from ((row, text, None) for row, text in zip(chunk, assistant.compose_many(chunk, template)))
+
+
+def compose_api(rows, assistant, concurrency=8):
+    """Yield (row, email_text, error) for every row in input order, with up to concurrency API calls in flight.
+
+    Results are handed over as soon as every earlier row is done, so at most
+    2 * concurrency rows are held in memory.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def compose(row):
+        stream = assistant.compose_email_stream(row['purpose'], row['recipient_type'], row['key_points'],
+                                                (row.get('tone') or "professional").lower())
+        text = "".join(stream).strip()
+        return row, text, stream.error
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='merge') as executor:
+        pending = deque()
+        try:
+            for row in rows:
+                pending.append(executor.submit(compose, row))
+                if len(pending) >= concurrency * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # Closed early (merge stopped at a failed row): rows not sent yet are never paid for
+            for future in pending:
+                future.cancel()
+
+
+class JsonlOutput:
+    """One JSON object per email: the row number, recipient, subject and body"""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+
+    def open(self, resume_at=None):
+        """Open for writing, resuming at byte resume_at if given; returns whether earlier output was kept"""
+        if resume_at is not None:
+            try:
+                # Drop anything written after the last checkpoint before appending
+                with open(self.path, 'r+b') as f:
+                    f.truncate(resume_at)
+            except FileNotFoundError:
+                pass
+            else:
+                self.f = open(self.path, 'a', encoding='utf-8', newline='')
+                return True
+        self.f = open(self.path, 'w', encoding='utf-8', newline='')
+        return False
+
+    def write(self, index, row, text):
+        record = {'row': index, 'to': row.get('to', '')}
+        record['subject'], record['body'] = split_message(text)
+        self.f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        """Flush and return the resume position for the checkpoint"""
+        self.f.flush()
+        return self.f.tell()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+
+
+def _header(value):
+    # CR/LF would start a new header (or the body); non-ASCII text needs RFC 2047 encoding
+    value = ' '.join(value.split())
+    if value.isascii():
+        return value
+    from email.header import Header
+
+    return Header(value, 'utf-8').encode()
+
+
+def _address(value):
+    # Only the display name may be encoded; the address itself has to stay readable
+    from email.utils import formataddr, parseaddr
+
+    return formataddr(parseaddr(' '.join(value.split())), charset='utf-8')
+
+
+def eml_bytes(sender, to, subject, body):
+    """A minimal text/plain message with an 8-bit UTF-8 body and CRLF line endings.
+
+    Built directly rather than through email.message.EmailMessage, whose
+    header parsing and folding cost about a millisecond per message.
+    """
+    headers = []
+    if sender:
+        headers.append(f"From: {_address(sender)}")
+    if to:
+        headers.append(f"To: {_address(to)}")
+    headers += [
+        f"Subject: {_header(subject)}",
+        "MIME-Version: 1.0",
+        'Content-Type: text/plain; charset="utf-8"',
+        "Content-Transfer-Encoding: 8bit",
+    ]
+    text = '\r\n'.join(headers) + '\r\n\r\n' + '\r\n'.join(body.splitlines()) + '\r\n'
+    return text.encode('utf-8')
+
+
+class EmlOutput:
+    """One .eml file per email, named by row number"""
+
+    def __init__(self, directory, sender=''):
+        self.directory = directory
+        self.sender = sender
+
+    def open(self, resume_at=None):
+        # Every email is its own file, so resuming only needs the directory
+        os.makedirs(self.directory, exist_ok=True)
+        return resume_at is not None
+
+    def write(self, index, row, text):
+        subject, body = split_message(text)
+        path = os.path.join(self.directory, f"{index:08d}.eml")
+        # Written under a temporary name so a crash never leaves a truncated .eml behind
+        with open(path + '.tmp', 'wb') as f:
+            f.write(eml_bytes(self.sender, row.get('to', ''), subject, body))
+        os.replace(path + '.tmp', path)
+
+    def flush(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class Checkpoint:
+    """Progress of one merge run, saved atomically as JSON next to its output"""
+
+    def __init__(self, path, run):
+        self.path = path
+        # What the run was started with; resuming a different run would mix two campaigns
+        self.run = run
+        self.rows = 0
+        self.position = None
+
+    def load(self):
+        """Restore saved progress; returns whether there was any"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return False
+        if saved['run'] != self.run:
+            raise ValueError(f"{self.path} belongs to a different merge ({saved['run']}); "
+                             "delete it or pass --restart")
+        self.rows, self.position = saved['rows'], saved['position']
+        return True
+
+    def save(self, rows, position):
+        self.rows, self.position = rows, position
+        state = {'run': self.run, 'rows': rows, 'position': position}
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(self.path + '.tmp', self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def merge(rows, output, composed, checkpoint=None, chunk_size=500, progress=None):
+    """Write every composed row to output in order, checkpointing after each chunk_size rows.
+
+    composed(rows) yields (row, email_text, error) in input order, like
+    compose_free and compose_api. When checkpoint holds saved progress, the
+    first checkpoint.rows rows are skipped without being composed and output
+    resumes from the saved position, or starts over if the output is gone.
+    The first row that fails stops the merge: composing stops, nothing
+    after it is written, and the checkpoint is left at that row (retry_from
+    and error in the result) for a rerun to continue from. Returns counts
+    and throughput like batch.analyze_messages.
+    """
+    resumed = checkpoint.rows if checkpoint is not None else 0
+    if not output.open(checkpoint.position if resumed else None):
+        resumed = 0
+    count = 0
+    failure = None
+    start = time.perf_counter()
+    results = composed(islice(rows, resumed, None))
+    try:
+        for row, text, error in results:
+            if error:
+                failure = error
+                break
+            output.write(resumed + count, row, text)
+            count += 1
+            if count % chunk_size == 0:
+                position = output.flush()
+                if checkpoint is not None:
+                    checkpoint.save(resumed + count, position)
+                if progress:
+                    progress(count, time.perf_counter() - start)
+        position = output.flush()
+    finally:
+        # Stop composing (and paying for) the rows after a failure
+        getattr(results, 'close', lambda: None)()
+        output.close()
+    if checkpoint is not None:
+        if failure is None:
+            checkpoint.remove()
+        else:
+            checkpoint.save(resumed + count, position)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': count,
+        'resumed_from': resumed,
+        'retry_from': resumed + count if failure is not None else None,
+        'error': failure,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(count / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _report(count, elapsed):
+    rate = count / elapsed if elapsed else 0.0
+    sys.stderr.write(f"\r{count} emails, {rate:,.0f} emails/s")
+    sys.stderr.flush()
+
+
+def _api_assistant(args):
+    from email_assistant.assistant import EmailAssistant
+    from email_assistant.scheduler import RequestScheduler
+
+    api_key = os.environ.get('OPENAI_API_KEY')
+    backends = None
+    if args.backends:
+        from email_assistant.backends import BackendRegistry
+
+        backends = BackendRegistry.load(args.backends, api_key)
+    elif not api_key:
+        raise SystemExit("OPENAI_API_KEY must be set to merge with --engine ai")
+    return EmailAssistant(api_key, scheduler=RequestScheduler(), base_url=args.base_url, backends=backends)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='merge', description="Compose one email per CSV row")
+    parser.add_argument('recipients', help="CSV with purpose, recipient_type and key_points columns")
+    parser.add_argument('-o', '--output', required=True, help="JSONL file, or a directory for .eml files")
+    parser.add_argument('--format', choices=('jsonl', 'eml'), help="output format (default: from --output)")
+    parser.add_argument('--engine', choices=('free', 'ai'), default='free')
+    parser.add_argument('--template', help="use this template for every row instead of choosing per purpose")
+    parser.add_argument('--templates', help="directory of template files (default: the bundled ones)")
+    parser.add_argument('--sender', default='', help="From address for .eml output")
+    parser.add_argument('--concurrency', type=int, default=8, help="API calls in flight with --engine ai")
+    parser.add_argument('--base-url', help="OpenAI-compatible endpoint for --engine ai")
+    parser.add_argument('--backends', help="TOML file of backends for --engine ai, instead of --base-url")
+    parser.add_argument('--chunk-size', type=int, default=500, help="rows between checkpoints")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing checkpoint and start over")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('jsonl' if args.output.lower().endswith('.jsonl') else 'eml')
+    if fmt == 'jsonl':
+        output = JsonlOutput(args.output)
+        checkpoint_path = args.output + '.checkpoint'
+    else:
+        output = EmlOutput(args.output, args.sender)
+        checkpoint_path = os.path.join(args.output, '.checkpoint')
+
+    if args.engine == 'free':
+        from email_assistant.free import FreeEmailAssistant
+
+        assistant = FreeEmailAssistant(templates=args.templates)
+        composed = lambda rows: compose_free(rows, assistant, args.chunk_size, args.template)
+    else:
+        assistant = _api_assistant(args)
+        composed = lambda rows: compose_api(rows, assistant, args.concurrency)
+
+    run = {'recipients': os.path.abspath(args.recipients), 'format': fmt, 'engine': args.engine,
+           'template': args.template}
+    checkpoint = Checkpoint(checkpoint_path, run)
+    if fmt == 'eml':
+        os.makedirs(args.output, exist_ok=True)
+    if not args.restart and checkpoint.load():
+        sys.stderr.write(f"Resuming after {checkpoint.rows} rows\n")
+
+    stats = merge(read_rows(args.recipients), output, composed, checkpoint, args.chunk_size, _report)
+    sys.stderr.write(
+        f"\nComposed {stats['rows']} emails in {stats['seconds']}s ({stats['rows_per_second']} emails/s)\n"
+    )
+    if stats['retry_from'] is not None:
+        sys.stderr.write(f"Stopped at row {stats['retry_from']}: {stats['error']}\n"
+                         "Rerun the same command to continue from it\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
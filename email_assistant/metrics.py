@@ -0,0 +1,199 @@
+"""Per-call latency, token and cost instrumentation.
+
+Every completion call produces a CallRecord that Metrics fans out to its
+sinks: an in-memory histogram for dashboards, a JSONL log for offline
+analysis and a Prometheus text exposition for scraping. Sinks registered
+with scoped_sink only receive the records produced in the current context,
+which is how the Streamlit app keeps per-session numbers on a shared
+assistant.
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+# USD per million tokens (input, output)
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-4': (30.00, 60.00),
+}
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+CallRecord = namedtuple('CallRecord', [
+    'timestamp', 'operation', 'model', 'wall_time', 'first_byte', 'prompt_tokens',
+    'completion_tokens', 'cost', 'cache_hit', 'error', 'cached_tokens', 'tokens_saved',
+])
+
+_scoped_sinks = contextvars.ContextVar('scoped_sinks', default=())
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Estimated USD cost of a call, matching dated model names by their longest known prefix"""
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            input_price, output_price = MODEL_PRICES[name]
+            return ((prompt_tokens or 0) * input_price + (completion_tokens or 0) * output_price) / 1e6
+    return 0.0
+
+
+def make_record(operation, model, started, first_byte=None, usage=None, cache_hit=False, error=None,
+                tokens_saved=0):
+    """Build a CallRecord for a call that started at time.perf_counter() value started.
+
+    cached_tokens is the part of the prompt the provider served from its
+    prompt-prefix cache; tokens_saved is what local trimming kept out of it.
+    """
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0
+    wall_time = time.perf_counter() - started
+    return CallRecord(
+        timestamp=time.time(),
+        operation=operation,
+        model=model,
+        wall_time=wall_time,
+        first_byte=wall_time if first_byte is None else first_byte,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cost=estimate_cost(model, prompt_tokens, completion_tokens),
+        cache_hit=cache_hit,
+        error=type(error).__name__ if error is not None else None,
+        cached_tokens=cached_tokens,
+        tokens_saved=tokens_saved,
+    )
+
+
+class Metrics:
+    """Fans call records out to the configured sinks and any scoped ones"""
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def record(self, record):
+        for sink in self.sinks:
+            sink.emit(record)
+        for sink in _scoped_sinks.get():
+            sink.emit(record)
+
+
+@contextmanager
+def scoped_sink(sink):
+    """Also send records produced inside this block (same thread/task) to sink"""
+    token = _scoped_sinks.set(_scoped_sinks.get() + (sink,))
+    try:
+        yield sink
+    finally:
+        _scoped_sinks.reset(token)
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+class InMemorySink:
+    """Keeps the most recent records for percentiles and totals"""
+
+    def __init__(self, max_records=10000):
+        self.records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        with self._lock:
+            records = list(self.records)
+        api_calls = [r for r in records if not r.cache_hit]
+        latencies = [r.wall_time for r in records]
+        return {
+            'calls': len(records),
+            'api_calls': len(api_calls),
+            'cache_hits': len(records) - len(api_calls),
+            'errors': sum(1 for r in records if r.error),
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'first_byte_p50': _percentile([r.first_byte for r in api_calls], 50),
+            'prompt_tokens': sum(r.prompt_tokens for r in records),
+            'completion_tokens': sum(r.completion_tokens for r in records),
+            'cached_tokens': sum(r.cached_tokens for r in records),
+            'tokens_saved': sum(r.tokens_saved for r in records),
+            'cost': sum(r.cost for r in records),
+        }
+
+
+class JsonlSink:
+    """Appends one JSON object per call to a file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record._asdict()) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class PrometheusSink:
+    """Aggregates counters and a latency histogram, rendered in Prometheus text format"""
+
+    def __init__(self, prefix='email_assistant'):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.tokens = {}
+        self.cost = {}
+        self.latency = {}
+
+    def emit(self, record):
+        outcome = 'cache_hit' if record.cache_hit else ('error' if record.error else 'ok')
+        labels = (record.operation, record.model)
+        with self._lock:
+            key = labels + (outcome,)
+            self.calls[key] = self.calls.get(key, 0) + 1
+            # cached is the part of prompt served from the provider's prefix cache; trimmed was never sent
+            for kind, count in (('prompt', record.prompt_tokens), ('completion', record.completion_tokens),
+                                ('cached', record.cached_tokens), ('trimmed', record.tokens_saved)):
+                self.tokens[labels + (kind,)] = self.tokens.get(labels + (kind,), 0) + count
+            self.cost[labels] = self.cost.get(labels, 0.0) + record.cost
+            buckets, total, count = self.latency.get(labels, ([0] * len(LATENCY_BUCKETS), 0.0, 0))
+            buckets = [n + (record.wall_time <= bound) for n, bound in zip(buckets, LATENCY_BUCKETS)]
+            self.latency[labels] = (buckets, total + record.wall_time, count + 1)
+
+    def render(self):
+        p = self.prefix
+        lines = [
+            f'# TYPE {p}_calls_total counter',
+            f'# TYPE {p}_tokens_total counter',
+            f'# TYPE {p}_cost_usd_total counter',
+            f'# TYPE {p}_call_seconds histogram',
+        ]
+        with self._lock:
+            for (operation, model, outcome), n in sorted(self.calls.items()):
+                lines.append(f'{p}_calls_total{{operation="{operation}",model="{model}",outcome="{outcome}"}} {n}')
+            for (operation, model, kind), n in sorted(self.tokens.items()):
+                lines.append(f'{p}_tokens_total{{operation="{operation}",model="{model}",kind="{kind}"}} {n}')
+            for (operation, model), cost in sorted(self.cost.items()):
+                lines.append(f'{p}_cost_usd_total{{operation="{operation}",model="{model}"}} {cost:.6f}')
+            for (operation, model), (buckets, total, count) in sorted(self.latency.items()):
+                labels = f'operation="{operation}",model="{model}"'
+                for bound, n in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'{p}_call_seconds_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'{p}_call_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{p}_call_seconds_sum{{{labels}}} {total:.6f}')
+                lines.append(f'{p}_call_seconds_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,175 @@
+"""Parsing and validation of model replies that should contain JSON.
+
+Models asked for JSON often wrap it in markdown fences or a sentence of
+chatter. extract_json pulls out the first balanced JSON value that actually
+parses, and parse_analysis validates an analysis object and coerces its
+scores, so a slightly chatty reply no longer costs the user another click.
+"""
+import json
+import re
+import threading
+
+# Models that accept response_format={"type": "json_object"}
+JSON_MODE_MODELS = ('gpt-4o', 'gpt-4-turbo', 'gpt-4.1', 'gpt-4-1106', 'gpt-4-0125', 'gpt-3.5-turbo')
+_NO_JSON_MODE = ('gpt-3.5-turbo-0301', 'gpt-3.5-turbo-0613', 'gpt-3.5-turbo-16k-0613')
+
+_SCORE_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+class ReplyParseError(ValueError):
+    """A reply did not contain the expected JSON; keeps the raw text for a repair attempt"""
+
+    def __init__(self, message, text):
+        super().__init__(message)
+        self.text = text
+
+
+class IncompleteReplyError(ReplyParseError):
+    """A batch reply that parsed but lacks some of its items.
+
+    items holds the well-formed ones, so they can be used while the reply
+    itself is never cached; EmailAssistant sets backend to the backend that
+    sent it.
+    """
+
+    backend = None
+
+    def __init__(self, message, text, items):
+        super().__init__(message, text)
+        self.items = items
+
+
+def supports_json_mode(model):
+    """Whether the chat completions API can force JSON output for model"""
+    return model.startswith(JSON_MODE_MODELS) and not model.startswith(_NO_JSON_MODE)
+
+
+def _balanced_spans(text, opener):
+    """Yield (start, end) of every balanced opener...closer span, string-aware"""
+    closer = '}' if opener == '{' else ']'
+    start = text.find(opener)
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(text)):
+            c = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif c == '\\':
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c == opener:
+                depth += 1
+            elif c == closer:
+                depth -= 1
+                if depth == 0:
+                    yield start, i + 1
+                    break
+        start = text.find(opener, start + 1)
+
+
+def extract_json(text, kind=dict):
+    """Return the first JSON value of type kind (dict or list) found in text.
+
+    The whole text is tried first; after that every balanced {...} or [...]
+    span, so fenced blocks and replies with leading or trailing prose still
+    parse. Returns (value, extracted) where extracted says whether the JSON
+    had to be dug out of surrounding text. Raises ReplyParseError if nothing
+    usable is found.
+    """
+    if text is None:
+        raise ReplyParseError("Empty reply", "")
+    try:
+        value = json.loads(text)
+        if isinstance(value, kind):
+            return value, False
+    except ValueError:
+        pass
+
+    opener = '{' if kind is dict else '['
+    for start, end in _balanced_spans(text, opener):
+        try:
+            value = json.loads(text[start:end])
+        except ValueError:
+            continue
+        if isinstance(value, kind):
+            return value, True
+    raise ReplyParseError(f"No JSON {'object' if kind is dict else 'array'} found in reply", text)
+
+
+def coerce_score(value, low=1, high=10):
+    """Turn 8, 8.4, "8", "8/10" or "Score: 8" into an int clamped to [low, high]"""
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid score: {value!r}")
+    if isinstance(value, (int, float)):
+        number = value
+    else:
+        match = _SCORE_RE.search(str(value))
+        if not match:
+            raise ValueError(f"Invalid score: {value!r}")
+        number = float(match.group())
+    return max(low, min(high, int(round(number))))
+
+
+def normalize_analysis(data):
+    """Validate an analysis dict and coerce it to the shape the UI expects"""
+    missing = {'tone', 'clarity_score', 'politeness_score'} - data.keys()
+    if missing:
+        raise ValueError(f"Missing keys: {', '.join(sorted(missing))}")
+    improvements = data.get('improvements', [])
+    if isinstance(improvements, str):
+        improvements = [improvements] if improvements.strip() else []
+    elif not isinstance(improvements, list):
+        improvements = [str(improvements)]
+    return dict(
+        data,
+        tone=str(data['tone']),
+        clarity_score=coerce_score(data['clarity_score']),
+        politeness_score=coerce_score(data['politeness_score']),
+        improvements=improvements,
+    )
+
+
+class ParseStats:
+    """Counts how analysis replies were parsed, for failure and repair rates"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replies = 0
+        self.direct = 0
+        self.extracted = 0
+        self.repaired = 0
+        self.failed = 0
+
+    def record(self, outcome):
+        """outcome is one of 'direct', 'extracted', 'repaired' or 'failed'"""
+        with self._lock:
+            self.replies += 1
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def snapshot(self):
+        replies = self.replies or 1
+        return {
+            'replies': self.replies,
+            'direct': self.direct,
+            'extracted': self.extracted,
+            'repaired': self.repaired,
+            'failed': self.failed,
+            'parse_failure_rate': (self.repaired + self.failed) / replies,
+            'repair_rate': self.repaired / replies,
+        }
+
+
+def parse_analysis(text):
+    """Parse an analysis reply; returns (analysis, outcome) or raises ReplyParseError"""
+    data, extracted = extract_json(text, dict)
+    try:
+        analysis = normalize_analysis(data)
+    except ValueError as e:
+        raise ReplyParseError(str(e), text)
+    return analysis, 'extracted' if extracted else 'direct'
@@ -0,0 +1,207 @@
+"""Speculative prefetch of the completions a user is likely to ask for next.
+
+After an analysis, users almost always click Improve on the same text, and
+in Quick Reply they try several response types in a row. Prefetcher starts
+those completions on a thread pool while the user is still reading, keeps
+the replies in a per-session table keyed by (operation, text, option), and
+hands one over when the matching click arrives; a click for a completion
+that is still running waits for it rather than sending the request twice.
+
+Speculation costs money, so each Prefetcher has a spend cap: a prefetch is
+only started while the actual cost of finished prefetches plus the estimated
+cost of running ones stays within max_cost. Predictions that went stale
+(the user moved on to another email) are cancelled; queued ones never start
+and streaming ones stop downloading at the next chunk. stats() reports the
+hit rate and the tokens spent on prefetches that were never used.
+"""
+import contextvars
+import threading
+
+from email_assistant.metrics import InMemorySink, estimate_cost, scoped_sink
+from email_assistant.prompts import prompt_text
+from email_assistant.tokens import count_tokens
+
+
+class _Prefetch:
+    """One speculative completion and what it cost"""
+
+    def __init__(self, key, tokens, cost):
+        self.key = key
+        self.estimated_tokens = tokens
+        self.estimated_cost = cost
+        self.cancelled = threading.Event()
+        self.future = None
+        self.tokens = 0
+        self.cost = 0.0
+        self.finished = False
+
+
+class Prefetcher:
+    """Per-session table of speculative completions run on a shared thread pool"""
+
+    def __init__(self, assistant, executor=None, max_cost=0.05, use_cache=True):
+        self.assistant = assistant
+        if executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='prefetch')
+        self.executor = executor
+        # USD this prefetcher may spend on completions nobody has asked for yet
+        self.max_cost = max_cost
+        self.use_cache = use_cache
+        self.issued = 0
+        self.hits = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.spent = 0.0
+        self.wasted_tokens = 0
+        self.wasted_cost = 0.0
+        self._reserved = 0.0
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def _estimate(self, prompt, operation):
+        """(tokens, USD) a completion of prompt is expected to use, reply included, on the model and
+        settings of the backend operation is sent to first"""
+        settings = self.assistant.task_settings(operation)
+        prompt_tokens = count_tokens(prompt_text(prompt), settings.model)
+        reply_tokens = settings.max_tokens or self.assistant.reply_token_estimate
+        return prompt_tokens + reply_tokens, estimate_cost(settings.model, prompt_tokens, reply_tokens)
+
+    def _submit(self, key, prompt, produce):
+        """Start produce(cancelled_event) for key unless it is already known or would break the spend cap;
+        key[0] is the operation"""
+        tokens, cost = self._estimate(prompt, key[0])
+        with self._lock:
+            if key in self._tasks:
+                return False
+            if self.spent + self._reserved + cost > self.max_cost:
+                self.skipped += 1
+                return False
+            task = _Prefetch(key, tokens, cost)
+            self._tasks[key] = task
+            self._reserved += cost
+            self.issued += 1
+        # Run in a copy of the caller's context so scoped metrics sinks (the session's) see the calls too
+        task.future = self.executor.submit(contextvars.copy_context().run, self._run, task, produce)
+        return True
+
+    def _run(self, task, produce):
+        sink = InMemorySink()
+        result = None
+        try:
+            with scoped_sink(sink):
+                result = produce(task.cancelled)
+        finally:
+            summary = sink.summary()
+            tokens = summary['prompt_tokens'] + summary['completion_tokens']
+            cost = summary['cost']
+            if summary['api_calls'] and not tokens:
+                # A stream stopped before its usage chunk arrived; charge the estimate
+                tokens, cost = task.estimated_tokens, task.estimated_cost
+            with self._lock:
+                self._reserved -= task.estimated_cost
+                self.spent += cost
+                task.tokens, task.cost, task.finished = tokens, cost, True
+                if task.cancelled.is_set():
+                    self._waste(task)
+        # A reply the foreground call would have replaced with a fallback is not worth serving
+        return None if summary['errors'] else result
+
+    def _waste(self, task):
+        self.wasted_tokens += task.tokens
+        self.wasted_cost += task.cost
+
+    def _take(self, key, timeout):
+        with self._lock:
+            task = self._tasks.pop(key, None)
+        if task is None:
+            return None
+        try:
+            result = task.future.result(timeout)
+        except Exception:
+            # Still running after timeout, cancelled or failed: the caller makes the request itself
+            self._discard(task)
+            return None
+        with self._lock:
+            if result is None:
+                self._waste(task)
+            else:
+                self.hits += 1
+        return result
+
+    def _discard(self, task):
+        with self._lock:
+            task.cancelled.set()
+            if task.future.cancel():
+                # Never started, so nothing was spent
+                self._reserved -= task.estimated_cost
+            elif task.finished:
+                self._waste(task)
+            self.cancelled += 1
+
+    def prefetch_improve(self, email_text, style="professional"):
+        """Start improving email_text in style; returns whether a prefetch was started"""
+        if not email_text.strip():
+            return False
+        fitted, _ = self.assistant._fit_email(email_text)
+
+        def produce(cancelled):
+            stream = self.assistant.improve_email_stream(email_text, style, use_cache=self.use_cache)
+            parts = []
+            try:
+                for chunk in stream:
+                    if cancelled.is_set():
+                        return None
+                    parts.append(chunk)
+            finally:
+                stream.close()
+            return None if stream.error else "".join(parts).strip()
+
+        return self._submit(('improve', email_text, style), self.assistant._improve_prompt(fitted, style), produce)
+
+    def prefetch_quick_reply(self, received_email, response_type="custom"):
+        """Start a quick reply; canned response types are instant and never prefetched"""
+        if response_type in self.assistant.canned_responses:
+            return False
+        fitted, _ = self.assistant._fit_email(received_email)
+
+        def produce(cancelled):
+            if cancelled.is_set():
+                return None
+            return self.assistant.quick_responses(received_email, response_type, use_cache=self.use_cache)
+
+        return self._submit(('quick_reply', received_email, response_type),
+                            self.assistant._quick_prompt(fitted, response_type), produce)
+
+    def improve(self, email_text, style="professional", timeout=None):
+        """The prefetched improvement of email_text in style, or None if there is none"""
+        return self._take(('improve', email_text, style), timeout)
+
+    def quick_reply(self, received_email, response_type="custom", timeout=None):
+        """The prefetched quick reply, or None if there is none"""
+        return self._take(('quick_reply', received_email, response_type), timeout)
+
+    def cancel(self, keep_text=None):
+        """Drop every prefetch except those for keep_text, e.g. when the user moves on to another email"""
+        with self._lock:
+            stale = [task for key, task in self._tasks.items() if key[1] != keep_text]
+            for task in stale:
+                del self._tasks[task.key]
+        for task in stale:
+            self._discard(task)
+
+    def stats(self):
+        """Hit rate, spend and waste counters for display"""
+        with self._lock:
+            return {
+                'issued': self.issued,
+                'hits': self.hits,
+                'skipped': self.skipped,
+                'cancelled': self.cancelled,
+                'pending': len(self._tasks),
+                'spent': self.spent,
+                'wasted_tokens': self.wasted_tokens,
+                'wasted_cost': self.wasted_cost,
+                'hit_rate': self.hits / self.issued if self.issued else 0.0,
+            }
@@ -0,0 +1,152 @@
+"""Separate the new content of a pasted email from quoted history and footers.
+
+Users paste whole reply chains: the new message on top, then "On ... wrote:"
+blocks, "> " quoted lines, forwarded or Outlook-style header blocks, and
+signatures and legal disclaimers along the way. iter_segments classifies the
+text line by line in one pass and yields (kind, start, end) spans with
+offsets into the original. strip_email keeps only the "body" spans, so tone
+analysis scores what the user actually wrote and API requests carry far
+fewer tokens.
+
+Inline replies keep working: "> " lines are dropped one by one, and only a
+reply header or forwarded header drops everything after it.
+"""
+import re
+from collections import namedtuple
+
+Segment = namedtuple('Segment', ['kind', 'start', 'end'])
+
+BODY = 'body'
+QUOTE = 'quote'
+HISTORY = 'history'
+SIGNATURE = 'signature'
+DISCLAIMER = 'disclaimer'
+
+# Anything that could start a non-body segment; emails without a match skip line classification.
+# Anchored on a literal newline rather than ^ with MULTILINE, which lets re jump from newline to newline.
+_MARKER = (r'[ \t]*(?:>|--|_{5,}|(?:On|Le|Am|El)\s|From:|Begin forwarded|Sent from my|Get Outlook'
+           r'|CONFIDENTIAL|DISCLAIMER|This (?:e-?mail|message|communication)|The information)')
+_FIRST_LINE_MARKER = re.compile(_MARKER, re.IGNORECASE)
+_LINE_MARKER = re.compile('\n' + _MARKER, re.IGNORECASE)
+# Reply headers: "On <date>, <name> wrote:", "Le ... a écrit :", "Am ... schrieb ...:", "El ... escribió:"
+_REPLY_HEADER = re.compile(r'^(?:On|Le|Am|El)\s.*(?:wrote|writes|a écrit|schrieb|escribió)\s*:?\s*$', re.IGNORECASE)
+_REPLY_HEADER_START = re.compile(r'^(?:On|Le|Am|El)\s', re.IGNORECASE)
+_REPLY_HEADER_END = re.compile(r'(?:wrote|writes|a écrit|schrieb|escribió)\s*:\s*$', re.IGNORECASE)
+_FORWARD_HEADER = re.compile(
+    r'^(?:-{2,}\s*(?:Original Message|Forwarded message)\s*-{2,}|Begin forwarded message:|_{5,}\s*)$',
+    re.IGNORECASE,
+)
+_OUTLOOK_FROM = re.compile(r'^From:\s+\S', re.IGNORECASE)
+_OUTLOOK_NEXT = re.compile(r'^(?:Sent|Date|To|Subject):\s', re.IGNORECASE)
+_SIGNATURE_SEPARATOR = re.compile(r'^--\s?$')
+_MOBILE_SIGNATURE = re.compile(r'^(?:Sent from my \w+|Get Outlook for \w+)', re.IGNORECASE)
+# Legal footers; phrased narrowly so ordinary sentences like "This email is to confirm..." stay body
+_DISCLAIMER = re.compile(
+    r'^(?:CONFIDENTIALITY NOTICE\b|CONFIDENTIAL:|DISCLAIMER:'
+    r'|This (?:e-?mail|message|communication)(?: and any (?:files|attachments)[^.]*?)?'
+    r' (?:is|are|may contain|contains) (?:strictly )?(?:confidential|privileged|intended)'
+    r'|The information (?:contained )?in this (?:e-?mail|message|communication))',
+    re.IGNORECASE,
+)
+
+
+class StrippedEmail(namedtuple('StrippedEmail', ['text', 'original', 'segments'])):
+    """The new content of an email plus the segments it was cut from"""
+
+    __slots__ = ()
+
+    @property
+    def spans(self):
+        """(start, end) offsets in original of every kept span, in order"""
+        return [(s.start, s.end) for s in self.segments if s.kind == BODY]
+
+    @property
+    def removed(self):
+        """Segments that were left out of text"""
+        return [s for s in self.segments if s.kind != BODY]
+
+    def to_original(self, offset):
+        """Map an offset in text back to the matching offset in original"""
+        consumed = 0
+        last = 0
+        for start, end in self.spans:
+            if offset < consumed + (end - start):
+                return start + offset - consumed
+            consumed += end - start
+            last = end
+        # The end of text maps to the end of the last kept span
+        return last
+
+
+def _lines(text):
+    start = 0
+    for line in text.splitlines(keepends=True):
+        yield start, line
+        start += len(line)
+
+
+def iter_segments(text):
+    """Yield Segments covering text, merging consecutive lines of the same kind"""
+    if not (_FIRST_LINE_MARKER.match(text) or _LINE_MARKER.search(text)):
+        if text:
+            yield Segment(BODY, 0, len(text))
+        return
+
+    kind = None
+    span_start = 0
+    mode = BODY  # SIGNATURE or DISCLAIMER until a blank line or history; HISTORY until the end
+    pending = None  # "On ..." line that may be the first half of a wrapped reply header
+    seen_body = False
+    lines = list(_lines(text))
+    for index, (offset, line) in enumerate(lines):
+        stripped = line.strip()
+        if mode == HISTORY:
+            line_kind = HISTORY
+        elif pending is not None and _REPLY_HEADER_END.search(stripped):
+            # Wrapped "On ...\n... wrote:" header; move its first line into the history too
+            mode = line_kind = HISTORY
+            if span_start < pending:
+                yield Segment(kind, span_start, pending)
+            kind, span_start = HISTORY, pending
+        elif _FORWARD_HEADER.match(stripped) and not seen_body:
+            # A forward with nothing written above it: the forwarded message is the content
+            line_kind = HISTORY
+        elif _REPLY_HEADER.match(stripped) or _FORWARD_HEADER.match(stripped):
+            mode = line_kind = HISTORY
+        elif (_OUTLOOK_FROM.match(stripped) and seen_body and index + 1 < len(lines)
+              and _OUTLOOK_NEXT.match(lines[index + 1][1].strip())):
+            mode = line_kind = HISTORY
+        elif stripped.startswith('>'):
+            line_kind = QUOTE
+        elif _SIGNATURE_SEPARATOR.match(line.rstrip('\r\n')) or _MOBILE_SIGNATURE.match(stripped):
+            mode = line_kind = SIGNATURE
+        elif _DISCLAIMER.match(stripped):
+            mode = line_kind = DISCLAIMER
+        elif mode == DISCLAIMER and not stripped:
+            mode = BODY
+            line_kind = DISCLAIMER
+        else:
+            line_kind = mode
+
+        pending = offset if mode != HISTORY and _REPLY_HEADER_START.match(stripped) else None
+        seen_body = seen_body or (line_kind == BODY and bool(stripped))
+        if line_kind != kind:
+            if kind is not None:
+                yield Segment(kind, span_start, offset)
+            kind, span_start = line_kind, offset
+    if kind is not None:
+        yield Segment(kind, span_start, len(text))
+
+
+def strip_email(text):
+    """Return a StrippedEmail holding only the new content of text.
+
+    If nothing would be left (e.g. a bare forward), the whole text is kept
+    so callers never end up analyzing an empty string.
+    """
+    segments = list(iter_segments(text))
+    # Only trailing whitespace is dropped, so offsets in text still line up with the spans
+    body = ''.join(text[s.start:s.end] for s in segments if s.kind == BODY).rstrip()
+    if not body.strip():
+        return StrippedEmail(text, text, [Segment(BODY, 0, len(text))] if text else [])
+    return StrippedEmail(body, text, segments)
@@ -0,0 +1,254 @@
+"""Opt-in timing of named stages, for finding where an app rerun spends its time.
+
+A Profiler records spans: named, nested stages such as a Streamlit rerun,
+one tab, a button's action, building a prompt or an API call. Code marks a
+stage with the module-level span(), which records into the profiler active
+in the current context (see Profiler.activate) and costs one context
+variable lookup when there is none, so the library can be instrumented
+without slowing the apps down when nobody is profiling.
+
+Spans accumulate across reruns and can be read as:
+
+- summary(): count, total, mean, p95 and max per stage, keyed by its path
+  (rerun > tab:Improve > button:Improve Email > api_call)
+- collapsed(): "a;b;c self-microseconds" lines for flamegraph.pl, speedscope
+  or inferno
+- chrome_trace(): Trace Event JSON for chrome://tracing or Perfetto
+
+capture() additionally runs one action under cProfile and tracemalloc and
+keeps the top functions and allocation sites.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager, nullcontext
+
+Span = namedtuple('Span', ['name', 'path', 'start', 'duration', 'self_time', 'thread', 'args'])
+Span.__doc__ = """One finished stage.
+
+path is the names of the enclosing spans and this one, outermost first;
+start is a time.perf_counter() value; self_time is duration minus the
+spans nested in it on the same thread.
+"""
+
+Capture = namedtuple('Capture', ['name', 'timestamp', 'duration', 'functions', 'allocations', 'peak_memory'])
+Capture.__doc__ = """cProfile and tracemalloc results of one action.
+
+functions is the pstats listing of the slowest functions by cumulative
+time, or None when another profiler was already running; allocations is
+[(file:line, bytes, count)] of the largest allocation sites. tracemalloc
+traces the whole process, so allocations and peak_memory include other
+threads', and when captures overlap peak_memory counts from the start of
+the earliest one.
+"""
+
+# Path separator in summaries; collapsed stacks use ";"
+PATH_SEPARATOR = ' > '
+
+_active = contextvars.ContextVar('active_profiler', default=None)
+_stack = contextvars.ContextVar('profiler_stack', default=())
+_NO_SPAN = nullcontext()
+
+# tracemalloc is process-wide: captures in different sessions share it, and the last one out stops it
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+def _acquire_tracing():
+    global _tracing_users, _started_tracing
+    import tracemalloc
+
+    with _tracing_lock:
+        if _tracing_users == 0:
+            # Tracing someone else started (e.g. PYTHONTRACEMALLOC) is left running afterwards
+            _started_tracing = not tracemalloc.is_tracing()
+            if _started_tracing:
+                tracemalloc.start()
+            # Only the first of overlapping captures resets the peak, which would clear the others'
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users
+    import tracemalloc
+
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+
+
+class _Frame:
+    __slots__ = ('name', 'path', 'thread', 'children')
+
+    def __init__(self, name, path, thread):
+        self.name = name
+        self.path = path
+        self.thread = thread
+        self.children = 0.0
+
+
+def span(name, **args):
+    """Time the block as a stage called name in the active profiler, if any; args are kept with the span"""
+    profiler = _active.get()
+    if profiler is None:
+        return _NO_SPAN
+    return profiler.span(name, **args)
+
+
+def active_profiler():
+    """The Profiler recording in this context, or None"""
+    return _active.get()
+
+
+class Profiler:
+    """Collects spans across reruns; one per Streamlit session"""
+
+    def __init__(self, max_spans=20000, max_captures=5):
+        self.spans = deque(maxlen=max_spans)
+        self.captures = deque(maxlen=max_captures)
+        # Trace timestamps are relative to this
+        self.origin = time.perf_counter()
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """Make span() record into this profiler for the rest of the block (same thread/task, and copied contexts)"""
+        token = _active.set(self)
+        try:
+            yield self
+        finally:
+            _active.reset(token)
+
+    @contextmanager
+    def run(self, name='rerun'):
+        """activate() and time the whole block as one span, counting it as a run"""
+        with self._lock:
+            self.runs += 1
+            run = self.runs
+        with self.activate(), self.span(name, run=run):
+            yield self
+
+    @contextmanager
+    def span(self, name, **args):
+        stack = _stack.get()
+        thread = threading.get_ident()
+        parent = stack[-1] if stack else None
+        frame = _Frame(name, (parent.path if parent else ()) + (name,), thread)
+        token = _stack.set(stack + (frame,))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            _stack.reset(token)
+            # A span in a worker thread (e.g. a prefetch) keeps its place in the path,
+            # but overlaps its parent rather than taking time out of it
+            if parent is not None and parent.thread == thread:
+                parent.children += duration
+            record = Span(name, frame.path, start, duration, max(0.0, duration - frame.children), thread, args)
+            with self._lock:
+                self.spans.append(record)
+
+    @contextmanager
+    def capture(self, name, functions=25, allocations=10):
+        """Time the block as span name, also under cProfile and tracemalloc, keeping a Capture of it"""
+        import cProfile
+        import tracemalloc
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Only one profiler may run per interpreter, e.g. another session is capturing
+            profile = None
+        _acquire_tracing()
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        try:
+            with self.span(name):
+                yield
+        finally:
+            duration = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            try:
+                after = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                _release_tracing()
+            top = after.compare_to(before, 'lineno')[:allocations]
+            sites = [(f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat.size_diff, stat.count_diff)
+                     for stat in top]
+            listing = _pstats_listing(profile, functions) if profile is not None else None
+            with self._lock:
+                self.captures.append(Capture(name, time.time(), duration, listing, sites, peak))
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+            self.captures.clear()
+            self.runs = 0
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self.spans)
+
+    def summary(self):
+        """[{'stage', 'count', 'total', 'mean', 'p95', 'max'}] per span path, slowest total first"""
+        durations = {}
+        for record in self._snapshot():
+            durations.setdefault(record.path, []).append(record.duration)
+        rows = []
+        for path, values in durations.items():
+            values.sort()
+            total = sum(values)
+            rows.append({
+                'stage': PATH_SEPARATOR.join(path),
+                'count': len(values),
+                'total': total,
+                'mean': total / len(values),
+                'p95': values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+                'max': values[-1],
+            })
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def collapsed(self):
+        """Collapsed stacks, one "outer;inner self-microseconds" line per distinct path"""
+        totals = {}
+        for record in self._snapshot():
+            # Semicolons separate frames, and the count follows the last space
+            key = ';'.join(name.replace(';', ',').replace(' ', '_') for name in record.path)
+            totals[key] = totals.get(key, 0.0) + record.self_time
+        return ''.join(f"{stack} {round(seconds * 1e6)}\n" for stack, seconds in sorted(totals.items()))
+
+    def chrome_trace(self):
+        """The spans as a Trace Event Format object (json.dumps it for chrome://tracing or Perfetto)"""
+        pid = os.getpid()
+        events = [{
+            'name': record.name,
+            'cat': record.path[0],
+            'ph': 'X',
+            'ts': round((record.start - self.origin) * 1e6, 1),
+            'dur': round(record.duration * 1e6, 1),
+            'pid': pid,
+            'tid': record.thread,
+            'args': {key: str(value) for key, value in record.args.items()},
+        } for record in self._snapshot()]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def _pstats_listing(profile, limit):
+    import io
+    import pstats
+
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
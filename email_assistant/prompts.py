@@ -0,0 +1,121 @@
+"""Prompt templates for the API-backed assistant.
+
+Every prompt is a fixed system message holding the instructions followed by
+a user message holding only the per-call values, with the email text last.
+Identical leading tokens across calls let providers that cache prompt
+prefixes reuse them, and keep each request's variable part easy to measure
+and trim.
+"""
+import textwrap
+
+from email_assistant.profiling import span
+from email_assistant.templating import CompiledTemplate
+
+
+class PromptTemplate:
+    """Fixed instructions plus a template for the variable content"""
+
+    def __init__(self, instructions, content):
+        self.instructions = textwrap.dedent(instructions).strip()
+        self.content = CompiledTemplate(textwrap.dedent(content).strip())
+
+    def render(self, **values):
+        """Chat messages for one call: the shared system prefix, then the user content"""
+        with span('prompt'):
+            return [
+                {"role": "system", "content": self.instructions},
+                {"role": "user", "content": self.content.render(**values)},
+            ]
+
+
+PROMPTS = {
+    'analyze': PromptTemplate(
+        """
+        Analyze the email in the user message for:
+        1. Tone (professional, casual, friendly, formal, etc.)
+        2. Clarity score (1-10)
+        3. Politeness level (1-10)
+        4. Potential improvements
+
+        Respond in JSON format with keys: tone, clarity_score, politeness_score, improvements
+        """,
+        "Email: {email}",
+    ),
+    'repair': PromptTemplate(
+        """
+        The text in the user message was supposed to be a JSON object with keys
+        tone (string), clarity_score (integer 1-10), politeness_score (integer 1-10)
+        and improvements (list of strings), but it could not be parsed.
+
+        Return only the corrected JSON object.
+        """,
+        "Text: {reply}",
+    ),
+    'improve': PromptTemplate(
+        """
+        Improve the email in the user message to match the requested style. Keep
+        the core message but enhance:
+        - Clarity and structure
+        - Appropriate tone
+        - Grammar and flow
+        - Politeness
+
+        Return only the improved email text.
+        """,
+        """
+        Style: {style}
+
+        Original email: {email}
+        """,
+    ),
+    'compose': PromptTemplate(
+        """
+        Compose an email from the details in the user message.
+
+        Create a complete email with subject line and body.
+        Format as:
+        Subject: [subject line]
+
+        [email body]
+        """,
+        """
+        - Tone: {tone}
+        - Recipient: {recipient_type}
+        - Purpose: {purpose}
+        - Key points to include: {key_points}
+        """,
+    ),
+    'quick_reply': PromptTemplate(
+        """
+        Generate a brief, polite response to the email in the user message, of
+        the given response type. Keep it short and professional.
+        """,
+        """
+        Response type: {response_type}
+
+        Email: {email}
+        """,
+    ),
+    'analyze_many': PromptTemplate(
+        """
+        Analyze each email in the user message for:
+        1. Tone (professional, casual, friendly, formal, etc.)
+        2. Clarity score (1-10)
+        3. Politeness level (1-10)
+        4. Potential improvements
+
+        Respond with only a JSON array holding one object per email, with keys:
+        index (the index attribute of the email), tone, clarity_score, politeness_score, improvements
+        """,
+        """
+        {count} emails:
+
+        {emails}
+        """,
+    ),
+}
+
+
+def prompt_text(messages):
+    """All message contents of a prompt, e.g. for token counting"""
+    return "\n".join(message["content"] for message in messages)
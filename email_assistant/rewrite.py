@@ -0,0 +1,357 @@
+"""Offline rewriting of email drafts with grammar and style rules.
+
+A RuleSet is a registry of Rules, each a regex plus a replacement: a fixed
+string, a function of the matched text, or None for rules that only flag a
+span (e.g. passive voice, which needs a human to rewrite). Rewriting a draft
+is a single pass over its words, whatever the number of rules:
+
+- rules keyed on words (phrase tables, fillers, "i") are only tried, with
+  pattern.match, where one of their trigger words starts
+- the few rules that are not about a word (spacing) are compiled per style
+  into the same regex that finds the words
+- the pass counts the words of each sentence and splits one that is over
+  the style's limit at a ", and" / ", but" / ";" near its middle
+
+A missing greeting or closing is added at the ends. The result is a Rewrite:
+the original, the edited text and every Edit with offsets into the
+original, which renders as a unified diff and as a list of the changes made.
+"""
+import re
+from collections import Counter, namedtuple
+
+Rule = namedtuple('Rule', ['name', 'pattern', 'replace', 'description', 'styles', 'triggers'],
+                  defaults=(None, None))
+Rule.__doc__ = """A rewrite rule.
+
+pattern is a regex without numbered groups; replace is a string, a function
+of the matched text returning one, or None to only flag the match.
+description is formatted with before and after for the list of changes.
+styles limits the rule to those improvement styles; None applies it to all.
+triggers are the lowercase words a match can start with, and pattern is
+then only tried at those words; ANY_WORD tries it at every word, and None
+searches the whole text for it.
+"""
+
+# triggers of a rule tried at every word
+ANY_WORD = '*'
+
+# A span of the original text and what replaced it; after is None for spans only flagged
+Edit = namedtuple('Edit', ['rule', 'start', 'end', 'before', 'after'])
+
+STYLES = ('professional', 'friendly', 'concise')
+
+# Words per sentence above which a sentence is split, per style
+SENTENCE_LIMITS = {'professional': 30, 'friendly': 35, 'concise': 20}
+
+GREETINGS = {'professional': "Hello,", 'friendly': "Hi there,", 'concise': "Hi,"}
+CLOSINGS = {'professional': "Best regards,\n[Your Name]", 'friendly': "Cheers,\n[Your Name]",
+            'concise': "Thanks,\n[Your Name]"}
+
+_GREETING = re.compile(r'\s*(?:hi|hello|hey|dear|greetings|good\s+(?:morning|afternoon|evening))\b', re.IGNORECASE)
+_SIGN_OFF = (r'(?:(?:best|kind|warm|warmest)(?:\s+regards|\s+wishes)?|regards|sincerely|thanks|thank\s+you'
+             r'|many\s+thanks|cheers|yours|respectfully|talk\s+soon|thx|thnx|ty|tia)')
+# A closing line, or a sign-off ending the last line ("the meeting is moved, thx")
+_CLOSING = re.compile(rf'^[ \t]*{_SIGN_OFF}\b|[,;.!-][ \t]*{_SIGN_OFF}[ \t]*[.!]*\Z', re.IGNORECASE | re.MULTILINE)
+# How far from the end a closing may start, in characters
+_CLOSING_WINDOW = 120
+
+# A word, with at most one apostrophe inside ("don't", "I’m")
+_WORD = r"[^\W\d_]+(?:['’][^\W\d_]+)?"
+# Places an overlong sentence can be split, and what starts the second sentence
+_SPLITS = {', and ': '', ', but ': 'However, ', ', so ': 'So ', '; ': ''}
+_SENTENCE_END = r'[.!?]+(?=\s|$)|\n[ \t]*\n'
+
+
+def _match_case(before, after):
+    """after, capitalized if before was"""
+    if after and before[:1].isupper() and not after[:1].isupper():
+        return after[0].upper() + after[1:]
+    return after
+
+
+def _normalize(words):
+    return ' '.join(words.lower().replace('’', "'").split())
+
+
+def _phrase_pattern(phrase):
+    words = (re.escape(word).replace("'", "['’]") for word in phrase.split())
+    return r'\s+'.join(words)
+
+
+def phrase_rule(name, table, description, styles=None):
+    """A Rule replacing any phrase in table with its value, case-insensitively and keeping initial capitals"""
+    lookup = {_normalize(phrase): value for phrase, value in table.items()}
+    alternatives = '|'.join(_phrase_pattern(phrase) for phrase in sorted(lookup, key=len, reverse=True))
+
+    def replace(matched):
+        return _match_case(matched, lookup[_normalize(matched)])
+
+    return Rule(name, rf"(?i:(?<![\w'’])(?:{alternatives})(?![\w'’]))", replace, description, styles,
+                triggers=frozenset(phrase.split()[0] for phrase in lookup))
+
+
+class Rewrite(namedtuple('Rewrite', ['original', 'text', 'edits'])):
+    """The outcome of RuleSet.rewrite"""
+    __slots__ = ()
+
+    @property
+    def changed(self):
+        return self.text != self.original
+
+    def diff(self, context=2):
+        """Unified diff from the original to the rewritten text"""
+        import difflib
+
+        return '\n'.join(difflib.unified_diff(self.original.splitlines(), self.text.splitlines(),
+                                              'original', 'improved', n=context, lineterm=''))
+
+    def _described(self, flagged):
+        counts = Counter()
+        for edit in self.edits:
+            if (edit.after is None) == flagged:
+                before = ' '.join(edit.before.split())
+                after = ' '.join((edit.after or '').split())
+                counts[edit.rule.description.format(before=before, after=after)] += 1
+        return [f"{text} ({n}x)" if n > 1 else text for text, n in counts.items()]
+
+    def changes(self):
+        """What was edited, one line per distinct change, in order of appearance"""
+        return self._described(flagged=False)
+
+    def suggestions(self):
+        """Spans flagged but left alone, e.g. passive voice"""
+        return self._described(flagged=True)
+
+
+_Compiled = namedtuple('_Compiled', ['scanner', 'groups', 'by_word', 'any_word'])
+
+
+class RuleSet:
+    """Registry of rewrite rules, compiled per style into one word scanner"""
+
+    def __init__(self, rules=(), sentence_limits=SENTENCE_LIMITS, greetings=GREETINGS, closings=CLOSINGS):
+        self.rules = {}
+        self.sentence_limits = dict(sentence_limits)
+        self.greetings = dict(greetings)
+        self.closings = dict(closings)
+        self._compiled = {}
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        """Register rule, replacing any rule of the same name"""
+        self.rules[rule.name] = rule
+        self._compiled.clear()
+        return rule
+
+    def remove(self, name):
+        del self.rules[name]
+        self._compiled.clear()
+
+    def compile(self, style):
+        """The scanner regex for style and the rules to try at each word.
+
+        The scanner's groups are one per text rule, _word, _split and _end;
+        by_word maps a trigger word to its rules (with the ANY_WORD rules
+        after them) in registration order, and any_word is the list for
+        every other word.
+        """
+        compiled = self._compiled.get(style)
+        if compiled is None:
+            rules = [rule for rule in self.rules.values() if rule.styles is None or style in rule.styles]
+            groups = {f'r{i}': rule for i, rule in enumerate(rules) if rule.triggers is None}
+            alternatives = [f'(?P<{name}>{rule.pattern})' for name, rule in groups.items()]
+            alternatives.append(f'(?P<_word>{_WORD})')
+            if style in self.sentence_limits:
+                splits = '|'.join(re.escape(split) for split in _SPLITS)
+                alternatives += [f'(?P<_split>{splits})', f'(?P<_end>{_SENTENCE_END})']
+            keyed = [(rule, re.compile(rule.pattern)) for rule in rules if rule.triggers is not None]
+            any_word = [(rule, pattern) for rule, pattern in keyed if rule.triggers == ANY_WORD]
+            by_word = {}
+            for rule, pattern in keyed:
+                if rule.triggers != ANY_WORD:
+                    for word in rule.triggers:
+                        by_word.setdefault(word, []).append((rule, pattern))
+            by_word = {word: tried + any_word for word, tried in by_word.items()}
+            compiled = self._compiled[style] = _Compiled(re.compile('|'.join(alternatives)), groups, by_word,
+                                                         any_word)
+        return compiled
+
+    @staticmethod
+    def _edit(rule, match):
+        before = match.group()
+        after = rule.replace(before) if callable(rule.replace) else rule.replace
+        if after != before:
+            return Edit(rule, match.start(), match.end(), before, after)
+        return None
+
+    def _scan(self, text, style):
+        """Every rule edit plus the sentence splits, from one pass over text"""
+        scanner, groups, by_word, any_word = self.compile(style)
+        limit = self.sentence_limits.get(style)
+        edits = []
+        # Where the last replacement ended; nothing else may start inside it
+        replaced = 0
+        # Words in the current sentence so far, and where it could be split
+        words, splits = 0, []
+        for match in scanner.finditer(text):
+            name = match.lastgroup
+            start = match.start()
+            if name == '_word':
+                words += 1
+                if start < replaced:
+                    continue
+                word = match.group().lower()
+                if '’' in word:
+                    word = word.replace('’', "'")
+                for rule, pattern in by_word.get(word, any_word):
+                    found = pattern.match(text, start)
+                    if found:
+                        edit = self._edit(rule, found)
+                        if edit is not None:
+                            edits.append(edit)
+                            if edit.after is not None:
+                                replaced = edit.end
+                                break
+            elif name == '_split':
+                splits.append((start, match.end(), words))
+            elif name == '_end':
+                if words > limit and splits:
+                    edits.extend(self._split_sentence(text, splits, 0, words, limit))
+                words, splits = 0, []
+            elif start >= replaced:
+                edit = self._edit(groups[name], match)
+                if edit is not None:
+                    edits.append(edit)
+                    if edit.after is not None:
+                        replaced = edit.end
+        if limit is not None and words > limit and splits:
+            edits.extend(self._split_sentence(text, splits, 0, words, limit))
+        return edits
+
+    def _split_sentence(self, text, splits, first, last, limit):
+        """Edits splitting the words first..last of a sentence at the split point nearest their middle,
+        and the halves again while they are over limit"""
+        candidates = [split for split in splits if first < split[2] < last]
+        if not candidates:
+            return []
+        start, end, at = min(candidates, key=lambda split: abs(2 * split[2] - first - last))
+        if min(at - first, last - at) < 5:
+            # A sentence of four words or fewer reads as a fragment
+            return []
+        separator = text[start:end]
+        edits = [Edit(_SENTENCE_RULE, start, end, separator, '. ' + _SPLITS[separator])]
+        if not _SPLITS[separator] and end < len(text) and text[end].islower():
+            edits.append(Edit(_SENTENCE_RULE, end, end + 1, text[end], text[end].upper()))
+        if at - first > limit:
+            edits += self._split_sentence(text, splits, first, at, limit)
+        if last - at > limit:
+            edits += self._split_sentence(text, splits, at, last, limit)
+        return edits
+
+    def _frame(self, text, style):
+        """Edits adding a greeting and a closing where the draft has none"""
+        edits = []
+        if style in self.greetings and not _GREETING.match(text):
+            edits.append(Edit(_GREETING_RULE, 0, 0, '', self.greetings[style] + '\n\n'))
+        body = text.rstrip()
+        if style in self.closings and not _CLOSING.search(body, max(0, len(body) - _CLOSING_WINDOW)):
+            edits.append(Edit(_CLOSING_RULE, len(body), len(text), text[len(body):],
+                              '\n\n' + self.closings[style]))
+        return edits
+
+    def rewrite(self, text, style='professional'):
+        """Rewrite text in one pass; returns a Rewrite with every edit"""
+        style = style.lower()
+        # Insertions sort before a replacement starting at the same offset
+        edits = sorted(self._scan(text, style) + self._frame(text, style), key=lambda edit: (edit.start, edit.end))
+        parts, kept, position = [], [], 0
+        for edit in edits:
+            if edit.start < position:
+                # Overlaps an edit already applied
+                continue
+            kept.append(edit)
+            if edit.after is not None:
+                parts.append(text[position:edit.start])
+                parts.append(edit.after)
+                position = edit.end
+        parts.append(text[position:])
+        return Rewrite(text, ''.join(parts), kept)
+
+
+_SENTENCE_RULE = Rule('long_sentence', '', None, "Split a sentence of more than the style's word limit")
+_GREETING_RULE = Rule('greeting', '', None, 'Added the greeting "{after}"')
+_CLOSING_RULE = Rule('closing', '', None, 'Added a closing')
+
+COMMON_MISTAKES = {
+    'alot': 'a lot', 'could of': 'could have', 'should of': 'should have', 'would of': 'would have',
+    'irregardless': 'regardless', 'untill': 'until', 'recieve': 'receive', 'recieved': 'received',
+    'seperate': 'separate', 'seperately': 'separately', 'definately': 'definitely', 'occured': 'occurred',
+    'accomodate': 'accommodate', 'tommorow': 'tomorrow', 'tommorrow': 'tomorrow', 'wich': 'which',
+    'thier': 'their', 'begining': 'beginning', 'calender': 'calendar', 'adress': 'address',
+}
+
+WORDY_PHRASES = {
+    'in order to': 'to', 'due to the fact that': 'because', 'at this point in time': 'now',
+    'at the present time': 'now', 'in the event that': 'if', 'for the purpose of': 'for',
+    'with regard to': 'about', 'with regards to': 'about', 'in regards to': 'about',
+    'with reference to': 'about', 'in spite of the fact that': 'although', 'a large number of': 'many',
+    'in the near future': 'soon', 'prior to': 'before', 'is able to': 'can', 'are able to': 'can',
+    'has the ability to': 'can', 'make a decision': 'decide', 'take into consideration': 'consider',
+    'please do not hesitate to': 'please', "please don't hesitate to": 'please', 'each and every': 'every',
+    'first and foremost': 'first', 'until such time as': 'until',
+}
+
+PASSIVE_PHRASES = {
+    'it is recommended that': 'we recommend that', 'it was decided that': 'we decided that',
+    'it has been decided that': 'we have decided that', 'it is requested that you': 'please',
+    'it would be appreciated if you could': 'please', 'it is expected that': 'we expect that',
+    'attached please find': 'attached is', 'please find attached': 'attached is',
+    'enclosed please find': 'enclosed is', 'please find enclosed': 'enclosed is',
+}
+
+INFORMAL_WORDS = {
+    'gonna': 'going to', 'wanna': 'want to', 'gotta': 'have to', 'yeah': 'yes', 'thx': 'thanks',
+    'pls': 'please', 'plz': 'please', 'btw': 'by the way', 'fyi': 'for your information',
+}
+
+CONTRACTIONS = {
+    "don't": 'do not', "doesn't": 'does not', "didn't": 'did not', "can't": 'cannot', "won't": 'will not',
+    "isn't": 'is not', "aren't": 'are not', "wasn't": 'was not', "weren't": 'were not',
+    "haven't": 'have not', "hasn't": 'has not', "couldn't": 'could not', "wouldn't": 'would not',
+    "shouldn't": 'should not', "I'm": 'I am', "I'll": 'I will', "I've": 'I have', "I'd": 'I would',
+    "we're": 'we are', "we'll": 'we will', "we've": 'we have', "you're": 'you are', "you'll": 'you will',
+    "they're": 'they are', "that's": 'that is',
+}
+
+EXPANSIONS = {
+    'do not': "don't", 'does not': "doesn't", 'did not': "didn't", 'cannot': "can't", 'will not': "won't",
+    'is not': "isn't", 'are not': "aren't", 'I am': "I'm", 'I will': "I'll", 'I have': "I've",
+    'we are': "we're", 'we will': "we'll", 'you are': "you're", 'they are': "they're", 'let us': "let's",
+}
+
+PASSIVE_AUXILIARIES = ('is', 'are', 'was', 'were', 'been', 'being')
+
+FILLERS = ('just', 'really', 'basically', 'actually', 'literally', 'totally', 'simply', 'very')
+
+DEFAULT_RULES = (
+    phrase_rule('common_mistakes', COMMON_MISTAKES, 'Corrected "{before}" to "{after}"'),
+    Rule('repeated_word', rf"(?i:(?!that\b|had\b)(?P<repeated>{_WORD})\s+(?P=repeated)(?![\w'’]))",
+         lambda matched: matched.split()[0], 'Removed the repeated word "{after}"', triggers=ANY_WORD),
+    Rule('double_space', r' (?<=\S ) +(?=\S)', ' ', 'Collapsed repeated spaces'),
+    Rule('space_before_punctuation', r' (?<=\w ) *(?=[,.!?;:](?:\s|$))', '', 'Removed a space before punctuation'),
+    phrase_rule('passive_phrases', PASSIVE_PHRASES, 'Made "{before}" active: "{after}"',
+                styles=('professional', 'concise')),
+    phrase_rule('wordy_phrases', WORDY_PHRASES, 'Shortened "{before}" to "{after}"',
+                styles=('professional', 'concise')),
+    phrase_rule('informal_words', INFORMAL_WORDS, 'Replaced "{before}" with "{after}"', styles=('professional',)),
+    phrase_rule('contractions', CONTRACTIONS, 'Expanded "{before}" to "{after}"', styles=('professional',)),
+    phrase_rule('expansions', EXPANSIONS, 'Contracted "{before}" to "{after}"', styles=('friendly',)),
+    # After the phrase tables, so that "i am" is contracted rather than only capitalized
+    Rule('lowercase_i', r"(?<![\w.'’-])i(?=[\s,!?;:'’]|$)", 'I', 'Capitalized "i"',
+         triggers=frozenset({'i', "i'm", "i'll", "i've", "i'd"})),
+    Rule('fillers', rf"(?<=[a-z,] )(?:{'|'.join(FILLERS)}) (?=[a-z])(?!much\b)", '',
+         'Removed the filler word "{before}"', styles=('professional', 'concise'), triggers=frozenset(FILLERS)),
+    Rule('passive_voice', r"(?i:(?:is|are|was|were|been|being)\s+\w+ed\s+by\b)", None,
+         'Consider the active voice instead of "{before}"', triggers=frozenset(PASSIVE_AUXILIARIES)),
+)
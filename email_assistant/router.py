@@ -0,0 +1,234 @@
+"""Offline-first routing between the rule engine and the API.
+
+Most requests don't need a model: a three-line "thanks, see you Friday"
+scores the same with the keyword rules, and a meeting request fills the
+meeting template just fine. HybridAssistant answers every request with
+FreeEmailAssistant first, scores how much that answer can be trusted and
+only calls EmailAssistant when the confidence is below a threshold, when
+the caller forces it, or falls back to the local answer when the API fails.
+
+Routes are 'local', 'api', 'fallback' (the API failed, the local answer
+was served) and 'error' (a failed API stream). Every decision is counted in
+RoutingStats (API calls avoided, estimated
+latency saved) and sent as a RouteDecision to any configured sinks, e.g.
+metrics.JsonlSink for offline analysis of where the threshold should be.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from email_assistant.preprocess import strip_email
+from email_assistant.streaming import TimedStream
+
+RouteDecision = namedtuple('RouteDecision', [
+    'timestamp', 'operation', 'route', 'confidence', 'threshold', 'forced', 'local_time', 'api_time',
+])
+
+# Emails up to this many words are fully covered by the greeting, closing and politeness rules
+SHORT_EMAIL_WORDS = 60
+# ...and from this many words on they are not trusted whatever the tone evidence
+LONG_EMAIL_WORDS = 300
+
+
+def analysis_confidence(free, email_text):
+    """How far FreeEmailAssistant's analysis of email_text can be trusted, from 0 to 1.
+
+    The tone evidence (the classifier's probability, or how one-sided the
+    formal/casual keyword vote was) scaled down by length: short emails are
+    judged well by the rules, so their evidence counts in full, and it fades
+    to nothing at LONG_EMAIL_WORDS. Length only ever lowers the confidence;
+    a short email with no tone evidence scores 0 and goes to the API.
+    """
+    text = strip_email(email_text).text
+    scan = free.lexicon.scan(text)
+    if free.tone_classifier is not None and hasattr(free.tone_classifier, 'predict_proba'):
+        evidence = float(free.tone_classifier.predict_proba([text]).max())
+    else:
+        formal, casual = scan.count('formal'), scan.count('casual')
+        evidence = abs(formal - casual) / (formal + casual) if formal + casual else 0.0
+    excess = max(0, scan.word_count - SHORT_EMAIL_WORDS) / (LONG_EMAIL_WORDS - SHORT_EMAIL_WORDS)
+    return evidence * max(0.0, 1.0 - excess)
+
+
+def compose_confidence(free, purpose, tone="professional"):
+    """How well a FreeEmailAssistant template fits purpose and tone, from 0 to 1"""
+    if not free.templates.select(purpose, '').default:
+        # A trigger word in the purpose picked a template written for exactly this kind of email
+        return 0.9
+    if not free.templates.select(purpose, tone).default:
+        return 0.7
+    # The catch-all template reads as professional; anything more casual needs rewriting
+    return 0.5 if tone.lower() in ("professional", "formal") else 0.3
+
+
+def quick_reply_confidence(received_email):
+    """A custom reply to nothing in particular is the template; replying to an actual email needs the model"""
+    return 0.9 if not received_email.strip() else 0.2
+
+
+class RoutingStats:
+    """Counts routing decisions and the time spent on each route, per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = {}
+        self.api = {}
+        self.fallbacks = 0
+        self.errors = 0
+        self.forced = 0
+
+    def record(self, decision):
+        with self._lock:
+            self.forced += decision.forced
+            if decision.route in ('fallback', 'error'):
+                # A failed API call says nothing about how long a successful one takes
+                self.fallbacks += decision.route == 'fallback'
+                self.errors += decision.route == 'error'
+                return
+            totals = self.local if decision.route == 'local' else self.api
+            count, seconds = totals.get(decision.operation, (0, 0.0))
+            elapsed = decision.local_time if decision.route == 'local' else decision.api_time
+            totals[decision.operation] = (count + 1, seconds + elapsed)
+
+    def snapshot(self):
+        """Totals plus latency saved, estimated per operation from the API calls that did happen"""
+        with self._lock:
+            local, api = dict(self.local), dict(self.api)
+        saved = 0.0
+        for operation, (count, seconds) in local.items():
+            api_count, api_seconds = api.get(operation, (0, 0.0))
+            if api_count:
+                saved += count * api_seconds / api_count - seconds
+        local_calls = sum(count for count, _ in local.values())
+        api_calls = sum(count for count, _ in api.values())
+        requests = local_calls + api_calls + self.fallbacks + self.errors
+        return {
+            'requests': requests,
+            'local': local_calls,
+            'api': api_calls,
+            'fallbacks': self.fallbacks,
+            'errors': self.errors,
+            'forced': self.forced,
+            'api_calls_avoided': local_calls,
+            'local_rate': local_calls / requests if requests else 0.0,
+            'latency_saved': max(0.0, saved),
+        }
+
+
+class HybridAssistant:
+    """FreeEmailAssistant first, EmailAssistant when the local answer is not confident enough.
+
+    Offers the same methods as EmailAssistant; each routed one also takes
+    force_api=True for when the user explicitly asks for the model.
+    """
+
+    def __init__(self, free, ai, threshold=0.5, sinks=()):
+        self.free = free
+        self.ai = ai
+        # Local answers scoring below this go to the API
+        self.threshold = threshold
+        self.sinks = list(sinks)
+        self.stats = RoutingStats()
+        self.last_decision = None
+
+    def _record(self, operation, route, confidence, forced, local_time, api_time=0.0):
+        decision = RouteDecision(time.time(), operation, route, round(confidence, 3), self.threshold, forced,
+                                 local_time, api_time)
+        self.last_decision = decision
+        self.stats.record(decision)
+        for sink in self.sinks:
+            sink.emit(decision)
+
+    def _local(self, confidence_fn, answer_fn, force_api):
+        """(confidence, local answer or None when it won't be used, seconds both took)"""
+        started = time.perf_counter()
+        confidence = confidence_fn()
+        answer = answer_fn() if confidence >= self.threshold and not force_api else None
+        return confidence, answer, time.perf_counter() - started
+
+    def analyze_email_tone(self, email_text, use_cache=True, force_api=False):
+        """Analyze with the rules when they are confident, otherwise with the API"""
+        confidence, analysis, local_time = self._local(
+            lambda: analysis_confidence(self.free, email_text),
+            lambda: self.free.analyze_email_tone(email_text),
+            force_api,
+        )
+        if analysis is not None:
+            self._record('analyze', 'local', confidence, False, local_time)
+            return analysis
+
+        started = time.perf_counter()
+        result = self.ai.analyze_email_tone(email_text, use_cache=use_cache)
+        api_time = time.perf_counter() - started
+        if 'error' in result:
+            # The rules' answer beats an error message
+            self._record('analyze', 'fallback', confidence, force_api, local_time, api_time)
+            return self.free.analyze_email_tone(email_text)
+        self._record('analyze', 'api', confidence, force_api, local_time, api_time)
+        return result
+
+    def _routed_stream(self, operation, confidence, forced, local_time, stream):
+        """Yield an API stream's deltas and record the decision once it has finished or been closed"""
+        started = time.perf_counter()
+        try:
+            yield from stream
+        finally:
+            # Also when the caller stops reading early: the API call was made either way
+            stream.close()
+            self._record(operation, 'error' if stream.error else 'api', confidence, forced, local_time,
+                         time.perf_counter() - started)
+        if stream.error:
+            # stream swallowed the exception into .error; raise it again for the outer TimedStream
+            raise RuntimeError(stream.error)
+
+    def compose_email_stream(self, purpose, recipient_type, key_points, tone="professional", use_cache=True,
+                             force_api=False):
+        """Compose from a template when one fits, otherwise stream from the API; a TimedStream either way"""
+        confidence, text, local_time = self._local(
+            lambda: compose_confidence(self.free, purpose, tone),
+            lambda: self.free.compose_email(purpose, recipient_type, key_points, tone),
+            force_api,
+        )
+        if text is not None:
+            self._record('compose', 'local', confidence, False, local_time)
+            return TimedStream(iter([text]))
+        stream = self.ai.compose_email_stream(purpose, recipient_type, key_points, tone, use_cache=use_cache)
+        return TimedStream(self._routed_stream('compose', confidence, force_api, local_time, stream),
+                           error_format="{}")
+
+    def compose_email(self, purpose, recipient_type, key_points, tone="professional", use_cache=True,
+                      force_api=False):
+        """Compose a new email, from a template when one fits"""
+        stream = self.compose_email_stream(purpose, recipient_type, key_points, tone, use_cache=use_cache,
+                                           force_api=force_api)
+        text = "".join(stream)
+        return stream.error or text.strip()
+
+    def quick_responses(self, received_email, response_type="acknowledge", use_cache=True, force_api=False):
+        """Canned replies never need the API; a custom one does unless there is nothing to reply to"""
+        if response_type in self.ai.canned_responses:
+            return self.ai.canned_responses[response_type]
+        confidence, reply, local_time = self._local(
+            lambda: quick_reply_confidence(received_email),
+            lambda: self.free.quick_responses(received_email, response_type),
+            force_api,
+        )
+        if reply is not None:
+            self._record('quick_reply', 'local', confidence, False, local_time)
+            return reply
+        started = time.perf_counter()
+        reply = self.ai.quick_responses(received_email, response_type, use_cache=use_cache, fallback=None)
+        api_time = time.perf_counter() - started
+        if reply is None:
+            # The API failed; a reply from the rules beats the generic acknowledgement
+            self._record('quick_reply', 'fallback', confidence, force_api, local_time, api_time)
+            return self.free.quick_responses(received_email, response_type)
+        self._record('quick_reply', 'api', confidence, force_api, local_time, api_time)
+        return reply
+
+    def improve_email_stream(self, email_text, style="professional", use_cache=True):
+        """Rewriting an email always needs the model; the rule engine only lists tips"""
+        return self.ai.improve_email_stream(email_text, style, use_cache=use_cache)
+
+    def improve_email(self, email_text, style="professional", use_cache=True):
+        return self.ai.improve_email(email_text, style, use_cache=use_cache)
@@ -0,0 +1,243 @@
+"""Rate limiting, retries and circuit breaking around API calls.
+
+RequestScheduler admits each call through two token buckets (requests per
+minute and tokens per minute), retries 429s, 5xx responses and connection
+errors with exponential backoff and jitter while honoring Retry-After, and
+stops calling an API that keeps failing via a circuit breaker. Every call
+can carry a deadline that bounds queueing, retries and the request itself.
+asyncio and email.utils are only imported on the paths that need them.
+"""
+import random
+import threading
+import time
+
+RETRYABLE_STATUS = {408, 409, 429}
+RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError')
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call could not finish before its deadline"""
+
+
+class CircuitOpenError(RuntimeError):
+    """The circuit breaker is open and calls are being rejected"""
+
+
+def is_retryable(error):
+    """Whether an API error is worth retrying: rate limits, server errors and connection failures"""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError)) or any(
+        cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__
+    )
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from Retry-After(-Ms) headers, or None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at per_minute / 60 tokens per second"""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take amount tokens now and return how many seconds the caller must wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount):
+        """Return unused tokens, e.g. when a reservation was over-estimated or abandoned"""
+        if amount > 0:
+            with self._lock:
+                self.level = min(self.capacity, self.level + amount)
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures and lets one trial call through after reset_timeout"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = 'closed'
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a trial call that ended without an outcome (cancelled, or never sent), so another may try"""
+        with self._lock:
+            if self.state == 'half-open':
+                # opened_at is unchanged, so the next allow() starts a new trial straight away
+                self.state = 'open'
+
+
+class RequestScheduler:
+    """Shared admission control and retry policy for API calls"""
+
+    def __init__(self, requests_per_minute=500, tokens_per_minute=200000, max_retries=4,
+                 base_delay=0.5, max_delay=30, breaker=None, retryable=is_retryable):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def _admit(self, tokens, deadline_at):
+        """Reserve capacity and return the wait before the call may start"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("API calls are paused after repeated failures; try again shortly")
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if deadline_at is not None and time.monotonic() + wait >= deadline_at:
+            self._abandon(tokens, sent=False)
+            raise DeadlineExceeded("Rate limit wait would exceed the call deadline")
+        self.throttled_seconds += wait
+        return wait
+
+    def _abandon(self, tokens, sent):
+        """Undo an admission whose call ended without an outcome: free the breaker's trial slot and
+        refund the tokens, and the request too if it was never sent"""
+        self.breaker.release()
+        self.tokens.refund(tokens)
+        if not sent:
+            self.requests.refund(1)
+
+    def _backoff(self, attempt, error, tokens, deadline_at):
+        """Delay before the next attempt, or raise error if retrying is pointless"""
+        # A failed call produced no reply, so its tokens were never used; a retry reserves them again
+        self.tokens.refund(tokens)
+        if not self.retryable(error):
+            # The API answered, so it is up; don't leave the breaker half-open
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        delay = retry_after(error)
+        if delay is None:
+            cap = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay = cap / 2 + random.uniform(0, cap / 2)
+        if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+            raise error
+        self.retries += 1
+        return delay
+
+    @staticmethod
+    def _remaining(deadline_at):
+        return None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+
+    def call(self, fn, tokens=1, deadline=None):
+        """Run fn(timeout=seconds_left) under the rate limits, retrying transient failures.
+
+        deadline is the total number of seconds the call may take, including
+        time spent waiting for capacity and between retries.
+        """
+        deadline_at = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        while True:
+            wait = self._admit(tokens, deadline_at)
+            sent = False
+            try:
+                if wait:
+                    time.sleep(wait)
+                sent = True
+                result = fn(timeout=self._remaining(deadline_at))
+            except Exception as e:
+                delay = self._backoff(attempt, e, tokens, deadline_at)
+            except BaseException:
+                # e.g. KeyboardInterrupt: no outcome to record, but the breaker must not stay half-open
+                self._abandon(tokens, sent)
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, fn, tokens=1, deadline=None):
+        """Async counterpart of call; fn(timeout=...) must return an awaitable"""
+        import asyncio
+
+        deadline_at = None if deadline is None else time.monotonic() + deadline
+        attempt = 0
+        while True:
+            wait = self._admit(tokens, deadline_at)
+            sent = False
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                sent = True
+                result = await fn(timeout=self._remaining(deadline_at))
+            except Exception as e:
+                delay = self._backoff(attempt, e, tokens, deadline_at)
+            except BaseException:
+                # Cancelled, e.g. by wait_for or a gather timeout
+                self._abandon(tokens, sent)
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def settle(self, reserved, used):
+        """Give back tokens reserved for a call beyond what it actually used"""
+        if used is not None:
+            self.tokens.refund(reserved - used)
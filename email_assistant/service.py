@@ -0,0 +1,333 @@
+"""Headless HTTP API for the assistant engines.
+
+An ASGI app (Starlette) exposing /analyze, /improve, /compose and
+/quick-reply, each with a /batch variant, on top of the same
+FreeEmailAssistant and AsyncEmailAssistant classes the Streamlit apps use.
+The engines are built once at startup, so the OpenAI client and its
+connection pool stay alive between requests. API calls share one
+concurrency limit across all requests and rule-engine work runs on a small
+thread pool, so one process can serve many callers.
+
+Requests are JSON objects. "engine" picks "ai" or "free" (default: "ai"
+when OPENAI_API_KEY is set, otherwise "free"). Responses are JSON, or
+NDJSON when the body has "stream": true or the Accept header asks for
+application/x-ndjson: batch endpoints then emit one line per item as it
+finishes and /improve and /compose emit text deltas followed by a summary.
+
+    uvicorn email_assistant.service:app --port 8000
+
+Settings come from the environment: OPENAI_API_KEY, COMPLETION_CACHE_DB,
+EMAIL_ASSISTANT_CONCURRENCY (default 16), EMAIL_ASSISTANT_FREE_WORKERS
+(default 4), EMAIL_ASSISTANT_MAX_BATCH (default 1000),
+EMAIL_ASSISTANT_TONE_MODEL (ToneClassifier weights for the free engine),
+ANALYSIS_STORE_DB (SQLite file of stored analyses, shared by both engines)
+and EMAIL_ASSISTANT_BACKENDS (a TOML file of OpenAI-compatible backends, see
+email_assistant.backends; with only local backends the ai engine needs no
+OPENAI_API_KEY).
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from email_assistant.assistant import AsyncEmailAssistant
+from email_assistant.cache import CompletionCache
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.metrics import InMemorySink, Metrics, PrometheusSink
+from email_assistant.store import AnalysisStore
+
+NDJSON = 'application/x-ndjson'
+
+# endpoint -> (method name, required fields, optional keyword fields)
+ENDPOINTS = {
+    'analyze': ('analyze_email_tone', ('email',), ()),
+    'improve': ('improve_email', ('email',), ('style',)),
+    'compose': ('compose_email', ('purpose', 'recipient_type', 'key_points'), ('tone',)),
+    'quick-reply': ('quick_responses', ('email',), ('response_type',)),
+}
+STREAMING_METHODS = {'improve_email': 'improve_email_stream', 'compose_email': 'compose_email_stream'}
+
+
+class RequestError(ValueError):
+    """A request the service cannot act on; reported to the caller with status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _arguments(payload, required, optional):
+    missing = [field for field in required if not isinstance(payload.get(field), str)]
+    if missing:
+        raise RequestError(f"Missing or non-string field(s): {', '.join(missing)}")
+    args = [payload[field] for field in required]
+    kwargs = {field: payload[field] for field in optional if isinstance(payload.get(field), str)}
+    return args, kwargs
+
+
+def _line(obj):
+    return json.dumps(obj) + '\n'
+
+
+class AssistantService:
+    """Engines plus the limits that keep many concurrent callers from overloading them"""
+
+    # Rule-engine calls take microseconds, so batches go to the thread pool in chunks of this many
+    free_chunk_size = 64
+
+    def __init__(self, ai=None, free=None, max_concurrency=16, free_workers=4, max_batch=1000, batch_size=8):
+        self.ai = ai
+        self.free = free
+        self.api_slots = asyncio.Semaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=free_workers, thread_name_prefix='free-engine')
+        self.max_batch = max_batch
+        # Emails per analyze_many call for AI batch analysis
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_env(cls):
+        api_key = os.environ.get('OPENAI_API_KEY')
+        store = None
+        if os.environ.get('ANALYSIS_STORE_DB'):
+            store = AnalysisStore(os.environ['ANALYSIS_STORE_DB'])
+        backends = None
+        if os.environ.get('EMAIL_ASSISTANT_BACKENDS'):
+            from email_assistant.backends import BackendRegistry
+
+            backends = BackendRegistry.load(os.environ['EMAIL_ASSISTANT_BACKENDS'], api_key)
+        ai = None
+        if api_key or backends is not None:
+            ai = AsyncEmailAssistant(
+                api_key,
+                cache=CompletionCache(db_path=os.environ.get('COMPLETION_CACHE_DB')),
+                max_concurrency=int(os.environ.get('EMAIL_ASSISTANT_CONCURRENCY', 16)),
+                metrics=Metrics([InMemorySink(), PrometheusSink()]),
+                store=store,
+                backends=backends,
+            )
+        tone_classifier = None
+        if os.environ.get('EMAIL_ASSISTANT_TONE_MODEL'):
+            from email_assistant.classifier import ToneClassifier
+
+            tone_classifier = ToneClassifier.load(os.environ['EMAIL_ASSISTANT_TONE_MODEL'])
+        return cls(ai, FreeEmailAssistant(tone_classifier, store=store),
+                   max_concurrency=int(os.environ.get('EMAIL_ASSISTANT_CONCURRENCY', 16)),
+                   free_workers=int(os.environ.get('EMAIL_ASSISTANT_FREE_WORKERS', 4)),
+                   max_batch=int(os.environ.get('EMAIL_ASSISTANT_MAX_BATCH', 1000)))
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+        if self.free is not None and self.free.store is not None:
+            self.free.store.close()
+        if self.ai is not None:
+            await self.ai.backends.aclose()
+
+    def engine(self, payload):
+        """Return (name, engine) for the engine a request asked for"""
+        name = payload.get('engine') or ('ai' if self.ai is not None else 'free')
+        engine = {'ai': self.ai, 'free': self.free}.get(name)
+        if engine is None:
+            raise RequestError(f"Engine '{name}' is not available", status=503 if name == 'ai' else 400)
+        return name, engine
+
+    async def call(self, name, engine, method, args, kwargs):
+        """Run one engine method under the matching concurrency limit"""
+        if name == 'free':
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(getattr(engine, method), *args, **kwargs))
+        async with self.api_slots:
+            return await getattr(engine, method)(*args, **kwargs)
+
+    async def call_many(self, name, engine, method, calls):
+        """Yield (index, result) for every (args, kwargs) in calls as each one finishes"""
+        if name == 'free':
+            fn = getattr(engine, method)
+
+            def run_chunk(start):
+                chunk = calls[start:start + self.free_chunk_size]
+                if method == 'analyze_email_tone':
+                    # One classifier batch per chunk
+                    return list(enumerate(engine.analyze_many([args[0] for args, _ in chunk]), start))
+                return [(i, fn(*args, **kwargs)) for i, (args, kwargs) in enumerate(chunk, start)]
+
+            loop = asyncio.get_running_loop()
+            tasks = [loop.run_in_executor(self.executor, run_chunk, start)
+                     for start in range(0, len(calls), self.free_chunk_size)]
+        elif method == 'analyze_email_tone':
+            # Several emails per API call via analyze_many
+            async def run_batch(start):
+                emails = [args[0] for args, _ in calls[start:start + self.batch_size]]
+                async with self.api_slots:
+                    results = await engine.analyze_many(emails, batch_size=self.batch_size)
+                return list(enumerate(results, start))
+
+            tasks = [asyncio.ensure_future(run_batch(start)) for start in range(0, len(calls), self.batch_size)]
+        else:
+            async def run_one(i, args, kwargs):
+                return [(i, await self.call(name, engine, method, args, kwargs))]
+
+            tasks = [asyncio.ensure_future(run_one(i, *call)) for i, call in enumerate(calls)]
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for item in await next_done:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def _wants_stream(request, payload):
+    return bool(payload.get('stream')) or NDJSON in request.headers.get('accept', '')
+
+
+async def _payload(request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise RequestError("Request body must be a JSON object")
+    if not isinstance(payload, dict):
+        raise RequestError("Request body must be a JSON object")
+    return payload
+
+
+def _handles_errors(handler):
+    @functools.wraps(handler)
+    async def wrapper(request):
+        try:
+            return await handler(request)
+        except RequestError as e:
+            return JSONResponse({'error': str(e)}, status_code=e.status)
+    return wrapper
+
+
+def single_endpoint(endpoint):
+    method, required, optional = ENDPOINTS[endpoint]
+
+    @_handles_errors
+    async def handler(request):
+        service = request.app.state.service
+        payload = await _payload(request)
+        name, engine = service.engine(payload)
+        args, kwargs = _arguments(payload, required, optional)
+
+        if not _wants_stream(request, payload):
+            result = await service.call(name, engine, method, args, kwargs)
+            return JSONResponse({'engine': name, 'result': result})
+
+        if name == 'free' or method not in STREAMING_METHODS:
+            async def whole():
+                result = await service.call(name, engine, method, args, kwargs)
+                if isinstance(result, str):
+                    yield _line({'delta': result})
+                yield _line({'done': True, 'engine': name, 'result': result})
+            return StreamingResponse(whole(), media_type=NDJSON)
+
+        async def deltas():
+            async with service.api_slots:
+                stream = getattr(engine, STREAMING_METHODS[method])(*args, **kwargs)
+                parts = []
+                async for delta in stream:
+                    parts.append(delta)
+                    yield _line({'delta': delta})
+            yield _line({'done': True, 'engine': name, 'result': stream.error or ''.join(parts).strip(),
+                         'error': stream.error, 'first_token': stream.first_token, 'total': stream.total})
+        return StreamingResponse(deltas(), media_type=NDJSON)
+
+    return handler
+
+
+def batch_endpoint(endpoint):
+    method, required, optional = ENDPOINTS[endpoint]
+
+    @_handles_errors
+    async def handler(request):
+        service = request.app.state.service
+        payload = await _payload(request)
+        name, engine = service.engine(payload)
+        items = payload.get('items')
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise RequestError("'items' must be a list of objects")
+        if len(items) > service.max_batch:
+            raise RequestError(f"At most {service.max_batch} items per batch", status=413)
+        calls = []
+        for position, item in enumerate(items):
+            try:
+                calls.append(_arguments(item, required, optional))
+            except RequestError as e:
+                raise RequestError(f"Item {position}: {e}")
+
+        if _wants_stream(request, payload):
+            async def lines():
+                async for i, result in service.call_many(name, engine, method, calls):
+                    yield _line({'index': i, 'result': result})
+            return StreamingResponse(lines(), media_type=NDJSON)
+
+        results = [None] * len(calls)
+        async for i, result in service.call_many(name, engine, method, calls):
+            results[i] = result
+        return JSONResponse({'engine': name, 'results': results})
+
+    return handler
+
+
+async def health(request):
+    service = request.app.state.service
+    engines = ['free'] + (['ai'] if service.ai is not None else [])
+    body = {'status': 'ok', 'engines': engines}
+    if service.ai is not None:
+        body['parse_stats'] = service.ai.parse_stats.snapshot()
+        if service.ai.cache is not None:
+            body['cache'] = service.ai.cache.stats()
+    return JSONResponse(body)
+
+
+async def metrics(request):
+    service = request.app.state.service
+    sinks = service.ai.metrics.sinks if service.ai is not None else []
+    return PlainTextResponse(''.join(s.render() for s in sinks if isinstance(s, PrometheusSink)),
+                             media_type='text/plain; version=0.0.4')
+
+
+def create_app(service_factory=AssistantService.from_env):
+    """Build the ASGI app; service_factory is called once at startup"""
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        app.state.service = service_factory()
+        try:
+            yield
+        finally:
+            await app.state.service.close()
+
+    routes = [Route('/health', health, methods=['GET']), Route('/metrics', metrics, methods=['GET'])]
+    for endpoint in ENDPOINTS:
+        routes.append(Route(f'/{endpoint}', single_endpoint(endpoint), methods=['POST']))
+        routes.append(Route(f'/{endpoint}/batch', batch_endpoint(endpoint), methods=['POST']))
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+app = create_app()
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the email assistant engines over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+    # One process and one event loop; concurrency comes from async API calls, not extra workers
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Content-addressed store of finished email analyses.
+
+The same emails (templates, newsletters, auto-replies) get analyzed over and
+over. AnalysisStore keeps every analysis in SQLite under a hash of the
+email's normalized text (quoted history and footers stripped, whitespace
+collapsed), together with the engine that produced it and that engine's
+analysis_version. A repeat analysis is then one primary-key lookup, or a
+dict lookup when it is still in the in-memory tier, and never an API call.
+
+Each engine derives analysis_version from everything its result depends on
+(word lists and rules version for FreeEmailAssistant, backend, model and
+prompts for EmailAssistant), and rows are keyed by version too, so changing
+any of them makes old entries unreachable without touching them; several
+versions can be in use at once (e.g. failover backends) and switching back
+finds the old rows again. Warm the store from a mail archive ahead of time,
+and drop versions no longer written to, with:
+
+    python -m email_assistant.store warm archive.mbox --db analyses.db
+    python -m email_assistant.store prune --db analyses.db --keep 1
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# SQLite's default limit on host parameters is 999 in older builds
+_MAX_PARAMS = 900
+
+
+_WHITESPACE = bytes.maketrans(b'\t\n\r\x0b\x0c', b'     ')
+
+
+def normalize_text(text):
+    """text as NFC-normalized UTF-8 with runs of whitespace collapsed, which no analysis depends on"""
+    if not text.isascii():
+        text = unicodedata.normalize('NFC', text)
+    data = text.encode('utf-8').translate(_WHITESPACE).strip()
+    # Each pass halves every run of spaces; far cheaper than splitting into words and joining them
+    while b'  ' in data:
+        data = data.replace(b'  ', b' ')
+    return data
+
+
+def content_key(text):
+    """The key an analysis of text is stored under.
+
+    Engines pass the email with quoted history and footers already stripped
+    (preprocess.strip_email), so replies that differ only in what they quote
+    share one entry.
+    """
+    return hashlib.blake2b(normalize_text(text), digest_size=16).hexdigest()
+
+
+def fingerprint(*parts):
+    """Short stable hash of parts, for building an engine's analysis_version"""
+    digest = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS analyses ("
+    "engine TEXT NOT NULL, content_hash TEXT NOT NULL, version TEXT NOT NULL, "
+    "analysis TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (engine, version, content_hash))"
+)
+
+
+class AnalysisStore:
+    """SQLite table of analyses keyed by (engine, version, content hash), with an in-memory LRU in front"""
+
+    def __init__(self, db_path=':memory:', max_memory_entries=4096):
+        # The engines import this module for content_key, so sqlite3 waits until a store is opened
+        import sqlite3
+
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(_SCHEMA)
+        self._db.commit()
+
+    def get_many(self, engine, version, keys):
+        """Return {key: analysis} for every key with a stored analysis from this engine version"""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                value = self._memory.get((engine, version, key))
+                if value is not None:
+                    self._memory.move_to_end((engine, version, key))
+                    found[key] = json.loads(value)
+                else:
+                    missing.append(key)
+
+            for start in range(0, len(missing), _MAX_PARAMS):
+                chunk = missing[start:start + _MAX_PARAMS]
+                rows = self._db.execute(
+                    f"SELECT content_hash, analysis FROM analyses WHERE engine = ? AND version = ? "
+                    f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                    (engine, version, *chunk),
+                ).fetchall()
+                for key, value in rows:
+                    self._remember(engine, version, key, value)
+                    found[key] = json.loads(value)
+                self.disk_hits += len(rows)
+
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def get(self, engine, version, key):
+        """Return the stored analysis for key, or None"""
+        return self.get_many(engine, version, [key]).get(key)
+
+    def put_many(self, engine, version, items):
+        """Store (key, analysis) pairs in one transaction; error results are skipped"""
+        now = time.time()
+        rows = [(engine, key, version, json.dumps(analysis), now)
+                for key, analysis in items if 'error' not in analysis]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO analyses (engine, content_hash, version, analysis, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+            for _, key, _, value, _ in rows:
+                self._remember(engine, version, key, value)
+
+    def put(self, engine, version, key, analysis):
+        """Store one analysis"""
+        self.put_many(engine, version, [(key, analysis)])
+
+    def _remember(self, engine, version, key, value):
+        self._memory[(engine, version, key)] = value
+        self._memory.move_to_end((engine, version, key))
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def prune(self, keep=1):
+        """Delete all but each engine's keep most recently written versions; returns the rows deleted"""
+        with self._lock:
+            latest = self._db.execute(
+                "SELECT engine, version FROM analyses GROUP BY engine, version ORDER BY engine, MAX(created_at) DESC"
+            ).fetchall()
+            seen = {}
+            stale = set()
+            for engine, version in latest:
+                seen[engine] = seen.get(engine, 0) + 1
+                if seen[engine] > keep:
+                    stale.add((engine, version))
+            deleted = 0
+            for engine, version in stale:
+                deleted += self._db.execute("DELETE FROM analyses WHERE engine = ? AND version = ?",
+                                            (engine, version)).rowcount
+            self._db.commit()
+            for key in [key for key in self._memory if key[:2] in stale]:
+                del self._memory[key]
+            return deleted
+
+    def counts(self):
+        """{(engine, version): stored analyses}"""
+        with self._lock:
+            rows = self._db.execute("SELECT engine, version, COUNT(*) FROM analyses GROUP BY engine, version")
+            return {(engine, version): count for engine, version, count in rows}
+
+    def stats(self):
+        """Hit/miss counters for display"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'entries': len(self._memory),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _warm_engine(args, store):
+    if args.engine == 'free':
+        from email_assistant.free import FreeEmailAssistant
+
+        tone_classifier = None
+        if args.tone_model:
+            from email_assistant.classifier import ToneClassifier
+
+            tone_classifier = ToneClassifier.load(args.tone_model)
+        return FreeEmailAssistant(tone_classifier, store=store)
+
+    from email_assistant.assistant import EmailAssistant
+
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if not api_key:
+        raise SystemExit("OPENAI_API_KEY must be set to warm the store with --engine ai")
+    return EmailAssistant(api_key, store=store)
+
+
+def warm(texts, engine, chunk_size=500, progress=None):
+    """Analyze texts with engine in chunks of chunk_size so every analysis lands in its store.
+
+    Analyses already stored are bulk-looked-up rather than recomputed.
+    Returns {'messages', 'seconds', 'messages_per_second'} like batch.analyze_messages.
+    """
+    count = 0
+    start = time.perf_counter()
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) == chunk_size:
+            engine.analyze_many(chunk)
+            count += len(chunk)
+            chunk = []
+            if progress:
+                progress(count, time.perf_counter() - start)
+    if chunk:
+        engine.analyze_many(chunk)
+        count += len(chunk)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'messages': count,
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(count / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _report(count, elapsed):
+    rate = count / elapsed if elapsed else 0.0
+    sys.stderr.write(f"\r{count} messages, {rate:,.0f} msg/s")
+    sys.stderr.flush()
+
+
+def main(argv=None):
+    import argparse
+    from email import policy
+    from email.parser import BytesParser
+
+    from email_assistant.batch import iter_messages, message_text
+
+    parser = argparse.ArgumentParser(prog='store', description="Manage the content-addressed analysis store")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    warm_parser = commands.add_parser('warm', help="Pre-index every message in a mail archive")
+    warm_parser.add_argument('archive', help="mbox file, Maildir or directory of .eml files")
+    warm_parser.add_argument('--db', required=True, help="SQLite file of the store")
+    warm_parser.add_argument('--engine', choices=('free', 'ai'), default='free')
+    warm_parser.add_argument('--tone-model', help="ToneClassifier weights for the free engine")
+    warm_parser.add_argument('--chunk-size', type=int, default=500, help="messages per analyze_many call")
+
+    stats_parser = commands.add_parser('stats', help="Show stored analyses per engine version")
+    stats_parser.add_argument('--db', required=True, help="SQLite file of the store")
+
+    prune_parser = commands.add_parser('prune', help="Delete the analyses of versions no longer written to")
+    prune_parser.add_argument('--db', required=True, help="SQLite file of the store")
+    prune_parser.add_argument('--keep', type=int, default=1, help="most recently written versions kept per engine")
+    args = parser.parse_args(argv)
+
+    store = AnalysisStore(args.db)
+    try:
+        if args.command == 'stats':
+            for (engine, version), count in sorted(store.counts().items()):
+                print(f"{engine:<24} {version:<18} {count:>10}")
+            return 0
+        if args.command == 'prune':
+            print(f"Deleted {store.prune(args.keep)} analyses")
+            return 0
+
+        engine = _warm_engine(args, store)
+        mail_parser = BytesParser(policy=policy.default)
+        texts = (message_text(mail_parser.parsebytes(raw)) for _, raw in iter_messages(args.archive))
+        stats = warm(texts, engine, chunk_size=args.chunk_size, progress=_report)
+        sys.stderr.write(
+            f"\nIndexed {stats['messages']} messages in {stats['seconds']}s "
+            f"({stats['messages_per_second']} msg/s); {store.stats()['hits']} were already stored\n"
+        )
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
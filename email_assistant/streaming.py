@@ -0,0 +1,64 @@
+"""Timing wrapper for streamed completions"""
+import time
+
+
+class TimedStream:
+    """Iterate over text deltas while recording time-to-first-token and total time.
+
+    An exception raised by the underlying stream ends iteration and is kept
+    as `error` (formatted with error_format) instead of propagating, so a
+    half-rendered reply can still be shown next to the error message.
+    Async chunk sources are consumed with `async for` instead.
+    """
+
+    def __init__(self, chunks, error_format="{}"):
+        self._chunks = chunks
+        self._error_format = error_format
+        self.started = None
+        self.first_token = None
+        self.total = None
+        self.error = None
+
+    def __iter__(self):
+        self.started = time.perf_counter()
+        try:
+            for chunk in self._chunks:
+                if self.first_token is None:
+                    self.first_token = time.perf_counter() - self.started
+                yield chunk
+        except Exception as e:
+            self.error = self._error_format.format(str(e))
+        finally:
+            self.total = time.perf_counter() - self.started
+
+    async def __aiter__(self):
+        self.started = time.perf_counter()
+        try:
+            async for chunk in self._chunks:
+                if self.first_token is None:
+                    self.first_token = time.perf_counter() - self.started
+                yield chunk
+        except Exception as e:
+            self.error = self._error_format.format(str(e))
+        finally:
+            self.total = time.perf_counter() - self.started
+
+    def close(self):
+        """Stop early, closing the underlying chunk source (and with it the HTTP stream)"""
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+
+    async def aclose(self):
+        """close() for an async chunk source"""
+        aclose = getattr(self._chunks, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+
+    def timing_summary(self):
+        """Human readable timing line for display under the streamed text"""
+        if self.total is None:
+            return ""
+        if self.first_token is None:
+            return f"Total {self.total:.2f}s"
+        return f"First token {self.first_token:.2f}s · total {self.total:.2f}s"
@@ -0,0 +1,255 @@
+"""Templates compiled once into render functions, and a reloadable library of them.
+
+CompiledTemplate turns a str.format template into generated Python code:
+the literal text and fields become a single f-string expression, so a
+render is one function call with no parsing or per-segment loop, and
+render_many fills it in for a whole list of rows (e.g. a mail merge) in one
+comprehension.
+
+TemplateLibrary loads email templates from a directory of TOML (or, with
+PyYAML installed, YAML) files. Each file holds the subject and body plus
+the trigger terms that select it; the library keeps an inverted index from
+those terms to templates so choosing one for a purpose is a few dict
+lookups. reload() recompiles only files whose mtime or size changed.
+"""
+import keyword
+import os
+import re
+import string
+import threading
+from collections import namedtuple
+from operator import itemgetter
+
+_formatter = string.Formatter()
+
+# Format specs are copied into the generated f-string, so they may not contain quotes, braces or escapes
+_SPEC_RE = re.compile(r'[^{}\'"\\\n]*')
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def _fstring_literal(text):
+    # repr() escapes quotes, backslashes and newlines; braces only need doubling inside an f-string
+    return 'f' + repr(text).replace('{', '{{').replace('}', '}}')
+
+
+class CompiledTemplate:
+    """A str.format template compiled to a generated render function.
+
+    Fields must be plain names (no attribute or index lookups, no nested
+    fields in format specs); anything else raises ValueError at compile time
+    instead of at render time.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        pieces, fields = [], []
+        for literal, field, spec, conversion in _formatter.parse(source):
+            if literal:
+                pieces.append(_fstring_literal(literal))
+            if field is None:
+                continue
+            if not field.isidentifier() or keyword.iskeyword(field) or field.startswith('_'):
+                raise ValueError(f"unsupported template field {{{field}}} in {source[:40]!r}")
+            if not _SPEC_RE.fullmatch(spec or ''):
+                raise ValueError(f"unsupported format spec {spec!r} for field {{{field}}}")
+            if conversion not in (None, 'r', 's', 'a'):
+                raise ValueError(f"unsupported conversion !{conversion} for field {{{field}}}")
+            pieces.append("f'{" + field + (f"!{conversion}" if conversion else '') +
+                          (f":{spec}" if spec else '') + "}'")
+            if field not in fields:
+                fields.append(field)
+        self.fields = frozenset(fields)
+
+        expression = ' '.join(pieces) or "''"
+        if fields:
+            names = ', '.join(fields)
+            code = (f"def render(*, {names}, **_unused):\n    return {expression}\n"
+                    f"def render_many(_rows, _get=_get, _map=map):\n"
+                    f"    return [{expression} for {names} in _map(_get, _rows)]\n")
+        else:
+            code = (f"def render(**_unused):\n    return {expression}\n"
+                    f"def render_many(_rows, _text={expression}):\n    return [_text for _ in _rows]\n")
+        namespace = {'_get': itemgetter(*fields) if fields else None}
+        try:
+            code = compile(code, f"<template {source[:30]!r}>", 'exec')
+        except SyntaxError as e:
+            # Anything the checks above missed; report it like them rather than as broken generated code
+            raise ValueError(f"template does not compile ({e.msg}): {source[:40]!r}") from None
+        exec(code, namespace)
+        # render(**values) fills in the template like source.format(**values); render_many(rows)
+        # does the same for every mapping in rows and returns a list of strings
+        self.render = namespace['render']
+        self.render_many = namespace['render_many']
+
+
+def compile_templates(templates):
+    """Compile a {name: {part: source}} mapping into CompiledTemplates"""
+    return {
+        name: {part: CompiledTemplate(source) for part, source in parts.items()}
+        for name, parts in templates.items()
+    }
+
+
+EmailTemplate = namedtuple('EmailTemplate', [
+    'name', 'subject', 'body', 'message', 'triggers', 'tones', 'priority', 'default', 'path',
+])
+EmailTemplate.__doc__ = """One email template file, compiled.
+
+message renders the finished "Subject: ...\\n\\nbody" text in one call.
+"""
+
+
+def _read_template_file(path):
+    if path.endswith('.toml'):
+        import tomllib
+
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError(f"PyYAML is required to load {path}; install it or use TOML") from None
+    with open(path, encoding='utf-8') as f:
+        try:
+            return yaml.safe_load(f) or {}
+        except yaml.YAMLError as e:
+            raise ValueError(f"{path}: {e}") from None
+
+
+def load_template(path):
+    """Read and compile one template file into an EmailTemplate"""
+    data = _read_template_file(path)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a table of template settings")
+    name = data.get('name') or os.path.splitext(os.path.basename(path))[0]
+    try:
+        subject, body = data['subject'], data['body']
+    except KeyError as e:
+        raise ValueError(f"{path}: template is missing {e.args[0]!r}") from None
+    try:
+        compiled = [CompiledTemplate(source) for source in (subject, body, f"Subject: {subject}\n\n{body}")]
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+    return EmailTemplate(
+        name=name,
+        subject=compiled[0],
+        body=compiled[1],
+        message=compiled[2],
+        triggers=tuple(term.lower() for term in data.get('triggers', ())),
+        tones=tuple(tone.lower() for tone in data.get('tones', ())),
+        priority=int(data.get('priority', 0)),
+        default=bool(data.get('default', False)),
+        path=path,
+    )
+
+
+class TemplateLibrary:
+    """Email templates loaded from a directory, selected through a keyword index.
+
+    A template is chosen for (purpose, tone) by finding the trigger terms
+    that start a word of the purpose ("follow" matches "following", "ask"
+    does not match "task"), looking each up in an inverted index from terms
+    to templates, and the tone in a second index; the highest-priority match
+    wins, otherwise the template marked default. The directory is read on
+    first use.
+    """
+
+    extensions = ('.toml', '.yaml', '.yml')
+
+    def __init__(self, directory=TEMPLATE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._files = {}
+        self._templates = None
+        self._term_index = {}
+        self._tone_index = {}
+        self._term_re = None
+        self._default = None
+
+    def reload(self):
+        """Recompile templates whose files were added or changed and drop removed ones; returns changed names"""
+        with self._lock:
+            return self._reload()
+
+    def _reload(self):
+        found = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.extensions):
+                stat = entry.stat()
+                found[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+        files = {path: known for path, known in self._files.items() if path in found}
+        changed = [self._files[path][1].name for path in self._files if path not in found]
+        for path, signature in sorted(found.items()):
+            known = files.get(path)
+            if known is None or known[0] != signature:
+                files[path] = (signature, load_template(path))
+                changed.append(files[path][1].name)
+
+        if changed or self._templates is None:
+            # Index first: a broken file leaves the previously loaded templates in place
+            self._index([template for _, template in files.values()])
+            self._files = files
+        return changed
+
+    def _index(self, templates):
+        by_name, terms, tones, defaults = {}, {}, {}, []
+        for template in templates:
+            if template.name in by_name:
+                raise ValueError(f"template {template.name!r} is defined in both "
+                                 f"{by_name[template.name].path} and {template.path}")
+            by_name[template.name] = template
+            for term in template.triggers:
+                terms.setdefault(term, []).append(template)
+            for tone in template.tones:
+                tones.setdefault(tone, []).append(template)
+            if template.default:
+                defaults.append(template)
+        if not defaults and by_name:
+            raise ValueError(f"no template in {self.directory} is marked default")
+        # The best candidate for a term comes first, so a lookup needs only the head of each list
+        rank = lambda template: (-template.priority, template.name)
+        self._term_index = {term: sorted(found, key=rank) for term, found in terms.items()}
+        self._tone_index = {tone: sorted(found, key=rank) for tone, found in tones.items()}
+        # One pass of a compiled alternation finds every trigger starting a word; longest terms first
+        alternation = '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+        self._term_re = re.compile(rf'\b(?:{alternation})') if terms else None
+        self._default = min(defaults, key=rank) if defaults else None
+        self._templates = by_name
+
+    @property
+    def templates(self):
+        """{name: EmailTemplate}"""
+        if self._templates is None:
+            self.reload()
+        return self._templates
+
+    def __getitem__(self, name):
+        return self.templates[name]
+
+    def __iter__(self):
+        return iter(self.templates)
+
+    def __len__(self):
+        return len(self.templates)
+
+    def select(self, purpose, tone=''):
+        """The template for an email about purpose in tone"""
+        if self._templates is None:
+            self.reload()
+        best = None
+        if self._term_re is not None:
+            index = self._term_index
+            for term in self._term_re.findall(purpose.lower()):
+                candidate = index[term][0]
+                if best is None or candidate.priority > best.priority:
+                    best = candidate
+        found = self._tone_index.get(tone.lower())
+        if found and (best is None or found[0].priority > best.priority):
+            best = found[0]
+        if best is None:
+            if self._default is None:
+                raise LookupError(f"no templates in {self.directory}")
+            return self._default
+        return best
@@ -0,0 +1,60 @@
+"""Local token counting for prompt budgeting.
+
+Uses tiktoken when it is installed and falls back to a characters-per-token
+estimate otherwise, which is close enough for sizing batches and staying
+clear of the context window. tiktoken is imported on the first count.
+
+fit_tokens cuts text that would still blow the budget after quoted history
+and footers were stripped (see email_assistant.preprocess).
+"""
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = "[... {} tokens omitted ...]"
+
+_encodings = {}
+
+
+def _encoding(model):
+    if model not in _encodings:
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # tiktoken is missing or its BPE files could not be loaded (e.g. offline); estimate instead
+            encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """Number of tokens text takes up in a prompt for model"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def fit_tokens(text, max_tokens, model="gpt-3.5-turbo"):
+    """Shrink text to at most max_tokens; returns (text, tokens_saved).
+
+    Text within budget is returned unchanged. Otherwise the middle is cut,
+    keeping the opening (which usually carries the request) and the last
+    lines, with a marker saying how much was left out.
+    """
+    original, total = text, count_tokens(text, model)
+    tokens, keep = total, len(text)
+    while tokens > max_tokens and keep:
+        # Scale the kept length by the overshoot; a couple of rounds converge on any tokenizer
+        keep = max(0, int(keep * max_tokens / tokens) - len(TRUNCATION_MARKER) - 16)
+        # Every round cuts the original, so the marker counts everything left out of it
+        head = original[:keep * 3 // 4].rstrip()
+        tail = original[len(original) - keep // 4:].lstrip() if keep // 4 else ""
+        marker = TRUNCATION_MARKER.format(total - count_tokens(head, model) - count_tokens(tail, model))
+        text = f"{head}\n{marker}\n{tail}".strip()
+        tokens = count_tokens(text, model)
+    return text, max(0, total - tokens)
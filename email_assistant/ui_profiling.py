@@ -0,0 +1,72 @@
+"""Streamlit side of email_assistant.profiling, shared by both apps.
+
+Profiling is opt-in per session from a sidebar checkbox; run_profiled()
+times each rerun while it is on, action buttons wrap their work in
+profiled_action(), and render_profiling_panel() draws the timings,
+captures and trace downloads. Only the apps import this module, so the
+engines never pull in Streamlit.
+"""
+import json
+from contextlib import nullcontext
+
+import streamlit as st
+
+from email_assistant.profiling import Profiler, active_profiler, span
+
+
+def get_profiler():
+    """This session's Profiler, which keeps its spans across reruns"""
+    return st.session_state.setdefault("profiler", Profiler())
+
+
+def profiled_action(name):
+    """Span for a button's action; also run under cProfile and tracemalloc when chosen in the sidebar"""
+    profiler = active_profiler()
+    if profiler is not None and st.session_state.get("profile_capture") == name:
+        return profiler.capture(f"button:{name}")
+    return span(f"button:{name}")
+
+
+def run_profiled(render, actions):
+    """Run render() as one profiled rerun when profiling is on, then draw the profiling panel"""
+    # The checkbox is drawn at the end of the sidebar, but its value is needed before anything runs
+    profiler = get_profiler() if st.session_state.get("profiling") else None
+    with profiler.run() if profiler is not None else nullcontext():
+        render()
+    render_profiling_panel(actions)
+
+
+def render_profiling_panel(actions):
+    """Opt-in stage timings, captures and trace downloads in the sidebar"""
+    with st.sidebar:
+        st.markdown("---")
+        if not st.checkbox("Profile reruns", key="profiling",
+                           help="Time each stage of every rerun: tabs, button actions and rendering"):
+            return
+        profiler = get_profiler()
+        st.selectbox("cProfile + tracemalloc for", ["Nothing"] + actions, key="profile_capture",
+                     help="Profile the next runs of this action function by function and allocation by allocation")
+        rows = profiler.summary()
+        if not rows:
+            st.caption("Interact with the app to record timings")
+            return
+        st.caption(f"{profiler.runs} reruns profiled")
+        st.dataframe([{"stage": row["stage"], "count": row["count"], "total ms": round(row["total"] * 1000, 1),
+                       "mean ms": round(row["mean"] * 1000, 2), "p95 ms": round(row["p95"] * 1000, 2)}
+                      for row in rows], hide_index=True)
+        col1, col2 = st.columns(2)
+        col1.download_button("Chrome trace", json.dumps(profiler.chrome_trace()), "trace.json", "application/json",
+                             help="Open in chrome://tracing or ui.perfetto.dev")
+        col2.download_button("Flame graph", profiler.collapsed(), "stacks.txt", "text/plain",
+                             help="Collapsed stacks for flamegraph.pl or speedscope")
+        for capture in reversed(profiler.captures):
+            with st.expander(f"{capture.name} · {capture.duration * 1000:.0f} ms · "
+                             f"peak {capture.peak_memory / 1e6:.1f} MB"):
+                if capture.functions:
+                    st.code(capture.functions)
+                else:
+                    st.caption("cProfile was busy with another capture")
+                st.dataframe([{"allocated at": site, "KiB": round(size / 1024, 1), "blocks": count}
+                              for site, size, count in capture.allocations], hide_index=True)
+        if st.button("Reset profile"):
+            profiler.clear()
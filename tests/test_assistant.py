@@ -0,0 +1,143 @@
+"""EmailAssistant and AsyncEmailAssistant against the mock endpoint: batch replies, caching, retries, fallbacks"""
+import asyncio
+
+import pytest
+
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import AsyncEmailAssistant, EmailAssistant
+from email_assistant.cache import CompletionCache
+from email_assistant.parsing import IncompleteReplyError
+
+EMAILS = [f"Hello team, update number {i} on the project is attached." for i in range(4)]
+
+
+@pytest.fixture
+def server():
+    server = MockOpenAIServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_split_many_rejects_short_replies():
+    with pytest.raises(IncompleteReplyError) as raised:
+        EmailAssistant._split_many('[{"index": 0, "tone": "x", "clarity_score": 5, "politeness_score": 5}]', 2)
+    assert list(raised.value.items) == [0]
+    with pytest.raises(IncompleteReplyError):
+        EmailAssistant._split_many('[]', 1)
+
+
+def test_short_batch_reply_is_retried_not_cached(server):
+    server.missing_items = 1
+    cache = CompletionCache()
+    assistant = EmailAssistant('sk-test', cache=cache, base_url=server.base_url)
+    results = assistant.analyze_many(EMAILS, batch_size=4, max_attempts=3)
+    # One batch of four, then the missing email alone in each retry round
+    assert server.requests == 3
+    assert [('error' in result) for result in results] == [False, False, False, True]
+    assert cache.stats()['entries'] == 0
+
+    # Nothing bad was cached: a repeat call asks the API again, and succeeds once the replies are whole
+    server.missing_items = 0
+    results = assistant.analyze_many(EMAILS, batch_size=4)
+    assert server.requests == 4
+    assert not any('error' in result for result in results)
+    assistant.analyze_many(EMAILS, batch_size=4)
+    assert server.requests == 4
+
+
+def test_async_short_batch_reply_is_retried_not_cached(server):
+    server.missing_items = 1
+    cache = CompletionCache()
+    assistant = AsyncEmailAssistant('sk-test', cache=cache, base_url=server.base_url)
+    results = asyncio.run(assistant.analyze_many(EMAILS, batch_size=4, max_attempts=2))
+    assert server.requests == 2
+    assert sum('error' in result for result in results) == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_async_matches_sync(server):
+    cache = CompletionCache()
+    sync = EmailAssistant('sk-test', cache=cache, base_url=server.base_url)
+    expected = [sync.analyze_email_tone(EMAILS[0]), sync.quick_responses(EMAILS[1], 'custom'),
+                sync.improve_email(EMAILS[2])]
+    assert server.requests == 3
+
+    async def run():
+        assistant = AsyncEmailAssistant('sk-test', cache=cache, base_url=server.base_url)
+        return [await assistant.analyze_email_tone(EMAILS[0]), await assistant.quick_responses(EMAILS[1], 'custom'),
+                await assistant.improve_email(EMAILS[2])]
+    # Same requests, cache keys and reply parsing: every call is a cache hit
+    assert asyncio.run(run()) == expected
+    assert server.requests == 3
+
+
+def test_failed_calls_fall_back(server):
+    server.error_rate, server.error_status = 1.0, 400
+    sync = EmailAssistant('sk-test', base_url=server.base_url)
+    assistant = AsyncEmailAssistant('sk-test', base_url=server.base_url)
+    for result in (sync.analyze_email_tone(EMAILS[0]), asyncio.run(assistant.analyze_email_tone(EMAILS[0]))):
+        assert result['error'].startswith('Failed to analyze email')
+    assert sync.quick_responses(EMAILS[0], 'custom', fallback=None) is None
+    assert asyncio.run(assistant.quick_responses(EMAILS[0], 'custom')) == EmailAssistant.canned_responses['acknowledge']
+
+
+def records(assistant):
+    return list(assistant.metrics.sinks[0].records)
+
+
+def test_stream_is_cached_once_finished(server):
+    assistant = EmailAssistant('sk-test', cache=CompletionCache(), base_url=server.base_url)
+    stream = assistant.improve_email_stream(EMAILS[0])
+    text = ''.join(stream)
+    assert text and stream.error is None and stream.first_token is not None
+    # A repeat is served whole from the cache
+    assert list(assistant.improve_email_stream(EMAILS[0])) == [text]
+    assert server.requests == 1
+    assert [record.cache_hit for record in records(assistant)] == [False, True]
+
+
+def test_stream_closed_early_is_recorded_not_cached(server):
+    server.token_delay = 0.01
+    cache = CompletionCache()
+    assistant = EmailAssistant('sk-test', cache=cache, base_url=server.base_url)
+    stream = assistant.improve_email_stream(EMAILS[0])
+    next(iter(stream))
+    stream.close()
+    [record] = records(assistant)
+    assert not record.cache_hit and record.error is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_async_stream_closed_early_is_recorded_not_cached(server):
+    server.token_delay = 0.01
+    cache = CompletionCache()
+    assistant = AsyncEmailAssistant('sk-test', cache=cache, base_url=server.base_url)
+
+    async def read_one():
+        stream = assistant.improve_email_stream(EMAILS[0])
+        async for _ in stream:
+            break
+        await stream.aclose()
+    asyncio.run(read_one())
+    [record] = records(assistant)
+    assert not record.cache_hit and record.error is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_async_stream_cancelled_is_recorded(server):
+    server.token_delay = 0.05
+    assistant = AsyncEmailAssistant('sk-test', base_url=server.base_url)
+
+    async def cancel_mid_reply():
+        async def read():
+            async for _ in assistant.compose_email_stream('a chat', 'colleague', 'nothing much'):
+                pass
+        task = asyncio.create_task(read())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(cancel_mid_reply())
+    [record] = records(assistant)
+    assert record.operation == 'compose' and record.error is None
@@ -0,0 +1,40 @@
+"""Backend latency records and LatencySelector ordering"""
+from email_assistant.backends import Backend, BackendRegistry, LatencySelector
+
+
+def registry(*names):
+    return BackendRegistry([Backend(name) for name in names])
+
+
+def test_fast_operations_prefer_lowest_latency():
+    backends = registry('primary', 'local')
+    backends['primary'].observe(0.5)
+    backends['local'].observe(0.05)
+    selector = LatencySelector(backends)
+    assert [b.name for b in selector.candidates('quick_reply')] == ['local', 'primary']
+    # Other operations keep registry order
+    assert [b.name for b in selector.candidates('analyze')] == ['primary', 'local']
+
+
+def test_failed_backend_does_not_rank_as_fastest():
+    backends = registry('broken', 'working')
+    backends['broken'].observe(None)
+    backends['working'].observe(2.0)
+    selector = LatencySelector(backends)
+    # One failure is still well short of opening the breaker, so both stay healthy
+    assert backends['broken'].healthy
+    assert [b.name for b in selector.candidates('quick_reply')] == ['working', 'broken']
+    assert backends['broken'].failures == 1
+
+
+def test_failures_raise_a_measured_latency():
+    backend = Backend('b', smoothing=0.5, failure_latency=10.0)
+    backend.observe(1.0)
+    backend.observe(None)
+    assert backend.latency == 5.5
+
+
+def test_unmeasured_backend_is_tried_first():
+    backends = registry('measured', 'new')
+    backends['measured'].observe(0.01)
+    assert LatencySelector(backends).candidates('quick_reply')[0].name == 'new'
@@ -0,0 +1,121 @@
+"""Archives read back message for message, and JSONL/CSV results match analyzing each message directly"""
+import csv
+import json
+import mailbox
+from email.message import EmailMessage
+
+import pytest
+
+from email_assistant import batch
+from email_assistant.free import FreeEmailAssistant
+
+BODIES = [
+    "Hi team,\n\nCould you please send the report by Friday? Thanks!\n",
+    "From now on, the meeting moves to 3pm.\nFrom the desk of Sam.\n",
+    "URGENT: this is unacceptable. Fix it immediately.\n",
+]
+
+
+def make_message(index, body):
+    msg = EmailMessage()
+    msg['Subject'] = f"Message {index}"
+    msg['Message-ID'] = f"<{index}@example.com>"
+    msg.set_content(body)
+    return msg
+
+
+@pytest.fixture
+def messages():
+    return [make_message(index, body) for index, body in enumerate(BODIES)]
+
+
+def read_back(path):
+    parsed = [batch._parser.parsebytes(raw) for _, raw in batch.iter_messages(str(path))]
+    return [(str(msg['Message-ID']), batch.message_text(msg)) for msg in parsed]
+
+
+def expected(messages):
+    return [(msg['Message-ID'], msg.get_content()) for msg in messages]
+
+
+def test_mbox_round_trip(tmp_path, messages):
+    path = tmp_path / 'archive.mbox'
+    box = mailbox.mbox(str(path))
+    for msg in messages:
+        box.add(msg)
+    box.close()
+
+    sources = [source for source, _ in batch.iter_mbox(str(path))]
+    assert sources == [f"{path}:{index}" for index in range(len(messages))]
+    # Body lines starting with "From " are quoted on write and unquoted on read
+    assert read_back(path) == expected(messages)
+
+
+def test_maildir_and_eml_directory(tmp_path, messages):
+    box = mailbox.Maildir(str(tmp_path / 'maildir'))
+    for msg in messages:
+        box.add(msg)
+    box.close()
+    assert sorted(read_back(tmp_path / 'maildir')) == expected(messages)
+
+    (tmp_path / 'eml' / 'nested').mkdir(parents=True)
+    for index, msg in enumerate(messages):
+        folder = tmp_path / 'eml' / ('nested' if index % 2 else '')
+        (folder / f"{index}.eml").write_bytes(msg.as_bytes())
+    (tmp_path / 'eml' / 'notes.txt').write_text("not a message")
+    assert sorted(read_back(tmp_path / 'eml')) == expected(messages)
+    assert read_back(tmp_path / 'eml' / '0.eml') == expected(messages)[:1]
+
+    with pytest.raises(FileNotFoundError):
+        list(batch.iter_messages(str(tmp_path / 'missing')))
+
+
+@pytest.fixture
+def archive(tmp_path, messages):
+    path = tmp_path / 'archive.mbox'
+    box = mailbox.mbox(str(path))
+    for msg in messages:
+        box.add(msg)
+    box.close()
+    return path
+
+
+def direct_rows(archive, messages):
+    assistant = FreeEmailAssistant()
+    rows = []
+    for index, msg in enumerate(messages):
+        analysis = assistant.analyze_email_tone(msg.get_content())
+        rows.append({
+            'source': f"{archive}:{index}",
+            'message_id': msg['Message-ID'],
+            'subject': msg['Subject'],
+            'tone': analysis['tone'],
+            'clarity_score': analysis['clarity_score'],
+            'politeness_score': analysis['politeness_score'],
+            'improvements': analysis['improvements'],
+        })
+    return rows
+
+
+def test_jsonl_output(tmp_path, archive, messages):
+    output = tmp_path / 'results.jsonl'
+    assert batch.main([str(archive), '-o', str(output), '--workers', '2', '--chunk-size', '1']) == 0
+
+    with open(output, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == direct_rows(archive, messages)
+
+
+def test_csv_output(tmp_path, archive, messages):
+    output = tmp_path / 'results.csv'
+    assert batch.main([str(archive), '-o', str(output), '--workers', '1', '--chunk-size', '2']) == 0
+
+    with open(output, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == batch.RESULT_FIELDS
+        rows = list(reader)
+    assert rows == [
+        dict(row, clarity_score=str(row['clarity_score']), politeness_score=str(row['politeness_score']),
+             improvements='; '.join(row['improvements']))
+        for row in direct_rows(archive, messages)
+    ]
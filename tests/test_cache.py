@@ -0,0 +1,96 @@
+"""CompletionCache: TTL expiry and LRU eviction in both tiers, and keys that stay stable"""
+import pytest
+
+from email_assistant import cache as cache_module
+from email_assistant.assistant import EmailAssistant
+from email_assistant.backends import Backend, BackendRegistry
+from email_assistant.cache import CompletionCache
+
+PROMPT = [{'role': 'user', 'content': 'Hi'}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+@pytest.mark.parametrize('on_disk', [False, True])
+def test_entries_expire_after_ttl(clock, tmp_path, on_disk):
+    cache = CompletionCache(ttl=60, db_path=str(tmp_path / 'cache.db') if on_disk else None)
+    cache.set('k', 'v')
+    clock.now += 59
+    assert cache.get('k') == 'v'
+    clock.now += 2
+    assert cache.get('k') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_memory_evicts_least_recently_used(clock):
+    cache = CompletionCache(max_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1' and cache.get('c') == '3'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_evicts_least_recently_used(clock, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = CompletionCache(max_entries=1, db_path=path, max_db_entries=2)
+    cache.set('a', '1')
+    clock.now += 1
+    cache.set('b', '2')
+    clock.now += 1
+    # Read from disk (memory only holds 'b'), which refreshes 'a'
+    assert cache.get('a') == '1'
+    clock.now += 1
+    cache.set('c', '3')
+    other = CompletionCache(db_path=path)
+    assert other.get('b') is None
+    assert other.get('a') == '1' and other.get('c') == '3'
+    assert other.stats()['disk_hits'] == 2
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    CompletionCache(db_path=path).set('k', 'v')
+    other = CompletionCache(db_path=path)
+    assert other.get('k') == 'v'
+    other.clear()
+    assert CompletionCache(db_path=path).get('k') is None
+
+
+def test_make_key_is_stable():
+    # The disk tier outlives processes, so a key must not depend on anything but its inputs
+    assert CompletionCache.make_key('gpt-3.5-turbo', 0.3, PROMPT) == \
+        '673ae8d4cf3bb3d023379b269fdd150a451790b0583a1ae4810eda2ff374cf9e'
+    keys = {CompletionCache.make_key(*inputs) for inputs in [
+        ('gpt-3.5-turbo', 0.3, PROMPT),
+        ('gpt-4o-mini', 0.3, PROMPT),
+        ('gpt-3.5-turbo', 0.4, PROMPT),
+        ('gpt-3.5-turbo', 0.3, [{'role': 'user', 'content': 'Hi!'}]),
+    ]}
+    assert len(keys) == 4
+
+
+def test_assistant_keys_follow_the_backend():
+    def key(model, base_url=None):
+        backend = Backend('openai', base_url, 'sk-test', model)
+        assistant = EmailAssistant('sk-test', cache=CompletionCache(), backends=BackendRegistry([backend]))
+        return assistant._cache_key(backend, 'analyze', assistant._request(PROMPT, 0.3, json_mode=True))
+
+    assert key('gpt-3.5-turbo') == key('gpt-3.5-turbo')
+    assert key('gpt-3.5-turbo') != key('gpt-4o-mini')
+    assert key('gpt-3.5-turbo') != key('gpt-3.5-turbo', 'http://localhost:8080/v1')
@@ -0,0 +1,72 @@
+"""ToneClassifier: learns separable tones, round-trips through save/load, scores a batch like single emails"""
+import csv
+
+import numpy as np
+import pytest
+
+from email_assistant.classifier import ToneClassifier, hashed_features, main
+
+FORMAL = ["Dear Ms. Patel, please find attached the quarterly report. Sincerely, John",
+          "Dear Sir, I respectfully request a meeting at your convenience. Regards, Anna",
+          "Dear team, kindly review the enclosed proposal before Friday. Best regards, Omar",
+          "Dear Mr. Lee, thank you for your prompt reply. Sincerely yours, Maria"]
+CASUAL = ["Hey! Wanna grab lunch later? Cheers",
+          "hi mate, cool stuff, see ya tomorrow lol",
+          "Hey guys, pizza's here, come grab some!",
+          "yo, thanks heaps for the help, cheers"]
+TEXTS, LABELS = FORMAL + CASUAL, ['formal'] * len(FORMAL) + ['casual'] * len(CASUAL)
+
+
+@pytest.fixture(scope='module')
+def model():
+    return ToneClassifier.train(TEXTS, LABELS, n_features=2 ** 10, steps=100)
+
+
+def test_training_fits_the_labels(model):
+    assert model.labels == ['casual', 'formal']
+    assert model.predict(TEXTS) == LABELS
+    assert model.predict(["Dear Professor, I respectfully submit my thesis. Sincerely"]) == ['formal']
+    assert model.predict(["hey, cheers for lunch lol"]) == ['casual']
+
+
+def test_save_load_round_trip(model, tmp_path):
+    path = str(tmp_path / 'models' / 'tone.npy')
+    model.save(path)
+    loaded = ToneClassifier.load(path)
+    assert loaded.labels == model.labels
+    assert np.array_equal(loaded.weights, model.weights)
+    assert loaded.version == model.version
+    assert np.array_equal(loaded.predict_proba(TEXTS), model.predict_proba(TEXTS))
+
+
+def test_batch_matches_single_predictions(model):
+    texts = TEXTS + ["", "one", "Dear", "a b c d e f g h"]
+    batch = model.predict_proba(texts)
+    singles = np.vstack([model.predict_proba([text]) for text in texts])
+    np.testing.assert_allclose(batch, singles, rtol=1e-5, atol=1e-6)
+    assert model.predict(texts) == [model.predict([text])[0] for text in texts]
+    assert model.predict([]) == []
+
+
+def test_bigrams_do_not_cross_texts():
+    # Two one-word texts have no bigrams; one two-word text has one
+    assert len(hashed_features(["hello", "world"], 2 ** 10).columns) == 2
+    assert len(hashed_features(["hello world"], 2 ** 10).columns) == 3
+
+
+def test_rejects_mismatched_weights():
+    with pytest.raises(ValueError):
+        ToneClassifier(np.zeros((1025, 3)), ['a', 'b'])
+    with pytest.raises(ValueError):
+        ToneClassifier(np.zeros((1000, 2)), ['a', 'b'])
+
+
+def test_train_command(tmp_path):
+    data = tmp_path / 'labeled.csv'
+    with open(data, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['text', 'label'])
+        writer.writerows(zip(TEXTS, LABELS))
+    output = str(tmp_path / 'tone.npy')
+    assert main(['train', str(data), '-o', output, '--features', '1024', '--steps', '50']) == 0
+    assert ToneClassifier.load(output).n_features == 1024
@@ -0,0 +1,43 @@
+"""FreeEmailAssistant: scores against the substring word counts of the original single-file app, improve reports"""
+import pytest
+
+from email_assistant.free import FreeEmailAssistant
+
+# The politeness rule as the original app wrote it
+BASELINE_POLITE_WORDS = ['please', 'thank', 'appreciate', 'kindly']
+
+
+def baseline_politeness(text):
+    email_lower = text.lower()
+    politeness_count = sum(1 for word in BASELINE_POLITE_WORDS if word in email_lower)
+    return min(10, 3 + politeness_count * 2)
+
+
+@pytest.mark.parametrize('text', [
+    "Thanks for the update. Thank you, I am thankful and appreciated your help, I appreciate it.",
+    "Please send the report. Thanks!",
+    "Could you kindly review this? I appreciate it, please and thank you.",
+    "Thank you. Thanks again, thankful as always.",
+    "Appreciated. Appreciate it.",
+    "Send the report by Friday.",
+])
+def test_politeness_matches_baseline(text):
+    analysis = FreeEmailAssistant().analyze_email_tone(text)
+    assert analysis['politeness_score'] == baseline_politeness(text)
+
+
+def test_inflections_count_once():
+    scan = FreeEmailAssistant.lexicon.scan("Thanks, thank you, I'm thankful.")
+    assert scan.matches['polite'] == ('thank',)
+    assert scan.count('polite') == 1
+
+
+def test_improve_email_does_not_suggest_what_the_rewrite_fixed():
+    assistant = FreeEmailAssistant()
+    draft = "can you send the report by friday"
+    assert 'Include a professional closing' in assistant.analyze_email_tone(draft)['improvements']
+    rewrite = assistant.rewrite_email(draft)
+    report = assistant.improve_email(draft, rewrite=rewrite)
+    assert rewrite.text in report
+    assert 'Include a professional closing' not in report
+    assert report == assistant.improve_email(draft)
@@ -0,0 +1,101 @@
+"""Incremental analysis gives the full analysis of every draft while recomputing only edited paragraphs"""
+import threading
+
+import pytest
+
+from benchmarks.corpus import generate_corpus, generate_threads
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.classifier import ToneClassifier
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.incremental import (IncrementalAIAnalyzer, IncrementalAnalyzer, combine_analyses,
+                                         split_paragraphs)
+
+CORPUS = [text for _, text in generate_corpus(200, 7)]
+
+
+def drafts(text):
+    """Every stage of writing text paragraph by paragraph, then editing, reordering and deleting paragraphs"""
+    paragraphs = text.split('\n\n')
+    stages = ['\n\n'.join(paragraphs[:n]) for n in range(1, len(paragraphs) + 1)]
+    if len(paragraphs) > 1:
+        stages.append('\n\n'.join(paragraphs[:-1] + [paragraphs[-1] + ' Thanks so much, cheers!']))
+        stages.append('\n\n'.join(reversed(paragraphs)))
+        stages.append('\n\n'.join(paragraphs[1:]))
+    return stages
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    labels = ['formal' if 'Dear' in text or 'regards' in text else 'casual' for text in CORPUS]
+    return ToneClassifier.train(CORPUS, labels, n_features=2 ** 10, steps=30)
+
+
+@pytest.mark.parametrize('with_classifier', [False, True])
+def test_matches_full_analysis_at_every_edit(with_classifier, request):
+    free = FreeEmailAssistant(request.getfixturevalue('classifier') if with_classifier else None)
+    incremental = IncrementalAnalyzer(free)
+    threads = generate_threads(20, 7)
+    for text in CORPUS[:60] + threads:
+        for draft in drafts(text):
+            assert incremental.analyze(draft) == free.analyze_email_tone(draft)
+
+
+def test_only_edited_paragraphs_are_rescanned():
+    incremental = IncrementalAnalyzer(FreeEmailAssistant())
+    first = "Dear team,\n\nThe report is attached.\n\nPlease review it by Friday.\n\nBest regards,\nSam"
+    incremental.analyze(first)
+    assert incremental.segments.stats()['computed'] == 4
+    incremental.analyze(first.replace("by Friday", "by Monday"))
+    stats = incremental.segments.stats()
+    assert stats['computed'] == 5 and stats['reused'] == 3
+
+
+def test_split_paragraphs_skips_blank_ones():
+    assert split_paragraphs("One\n\n \n\nTwo\n  \nThree") == ["One", "Two", "Three"]
+    assert split_paragraphs("   ") == []
+
+
+def test_combine_analyses_weights_by_length():
+    analyses = [{'tone': 'Formal', 'clarity_score': 9, 'politeness_score': 8, 'improvements': ['a', 'b']},
+                {'tone': 'Casual', 'clarity_score': 3, 'politeness_score': 2, 'improvements': ['b', 'c']},
+                {'error': 'failed'}]
+    combined = combine_analyses(analyses, [3, 1, 100])
+    assert combined == {'tone': 'Formal', 'clarity_score': 8, 'politeness_score': 6, 'improvements': ['a', 'b', 'c']}
+    assert combine_analyses([{'error': 'failed'}], [1]) == {'error': 'failed'}
+
+
+@pytest.fixture
+def server():
+    server = MockOpenAIServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_ai_analyzer_sends_only_new_paragraphs(server):
+    analyzer = IncrementalAIAnalyzer(EmailAssistant('sk-test', base_url=server.base_url), use_cache=False)
+    draft = "Hi all,\n\nThe launch moves to May.\n\nThanks, Sam"
+    first = analyzer.analyze(draft)
+    assert 'error' not in first and analyzer.sent == 3
+    analyzer.analyze(draft + "\n\nPS: slides attached.")
+    # One batch call carrying just the new paragraph
+    assert analyzer.sent == 4 and server.requests == 2
+    assert analyzer.analyze(draft) == first and server.requests == 2
+
+
+def test_ai_analyzer_debounces_updates(server):
+    analyzer = IncrementalAIAnalyzer(EmailAssistant('sk-test', base_url=server.base_url), debounce=0.1)
+    done = threading.Event()
+    seen = []
+
+    def callback(text, analysis):
+        seen.append(text)
+        done.set()
+    for length in range(1, 6):
+        analyzer.update("Hello team, " + "more words " * length, callback)
+    assert done.wait(10)
+    final = "Hello team, " + "more words " * 5
+    assert seen == [final] and server.requests == 1
+    assert analyzer.result_for(final) is not None
+    assert analyzer.result_for("Hello team, ") is None
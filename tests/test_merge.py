@@ -0,0 +1,90 @@
+"""Mail merge checkpoints: resuming after a crash and stopping at rows that failed to compose"""
+import json
+
+from email_assistant.merge import Checkpoint, JsonlOutput, merge
+
+ROWS = [{'purpose': f"purpose {i}", 'recipient_type': 'client', 'key_points': '', 'to': f"r{i}@example.com"}
+        for i in range(10)]
+
+
+def composing(fail=()):
+    """composed() that fails the rows whose 'to' is in fail and records every row it is asked for"""
+    seen = []
+
+    def composed(rows):
+        for row in rows:
+            seen.append(row['to'])
+            if row['to'] in fail:
+                yield row, '', "Failed to compose email. Error: outage"
+            else:
+                yield row, f"Subject: {row['purpose']}\n\nBody", None
+
+    composed.seen = seen
+    return composed
+
+
+def records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_complete_run_removes_checkpoint(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    checkpoint = Checkpoint(str(path) + '.checkpoint', {'run': 1})
+    stats = merge(ROWS, JsonlOutput(str(path)), composing(), checkpoint, chunk_size=3)
+    assert stats['retry_from'] is None
+    assert [record['row'] for record in records(path)] == list(range(10))
+    assert not Checkpoint(checkpoint.path, {'run': 1}).load()
+
+
+def test_stops_at_first_failure_and_resumes_there(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    checkpoint = Checkpoint(str(path) + '.checkpoint', {'run': 1})
+    failing = composing(fail={'r4@example.com'})
+    stats = merge(ROWS, JsonlOutput(str(path)), failing, checkpoint, chunk_size=3)
+    assert stats['retry_from'] == 4 and 'outage' in stats['error']
+    # Nothing after the failed row was composed or written
+    assert failing.seen == [row['to'] for row in ROWS[:5]]
+    assert [record['row'] for record in records(path)] == [0, 1, 2, 3]
+
+    saved = Checkpoint(checkpoint.path, {'run': 1})
+    assert saved.load() and saved.rows == 4
+
+    retry = composing()
+    stats = merge(ROWS, JsonlOutput(str(path)), retry, saved, chunk_size=3)
+    assert retry.seen == [row['to'] for row in ROWS[4:]]
+    assert stats['retry_from'] is None
+    assert [record['row'] for record in records(path)] == list(range(10))
+
+
+def test_missing_output_starts_over(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    checkpoint = Checkpoint(str(path) + '.checkpoint', {'run': 1})
+    merge(ROWS, JsonlOutput(str(path)), composing(fail={'r6@example.com'}), checkpoint, chunk_size=3)
+    path.unlink()
+
+    saved = Checkpoint(checkpoint.path, {'run': 1})
+    assert saved.load()
+    retry = composing()
+    stats = merge(ROWS, JsonlOutput(str(path)), retry, saved, chunk_size=3)
+    assert stats['resumed_from'] == 0
+    assert len(retry.seen) == 10
+    assert [record['row'] for record in records(path)] == list(range(10))
+
+
+def test_compose_api_stops_sending_after_close():
+    from email_assistant.merge import compose_api
+
+    class Assistant:
+        calls = 0
+
+        def compose_email_stream(self, purpose, recipient_type, key_points, tone):
+            Assistant.calls += 1
+            stream = iter(["Subject: x\n\nBody"])
+            return type('Stream', (), {'__iter__': lambda self: stream, 'error': None})()
+
+    results = compose_api(iter(ROWS * 10), Assistant(), concurrency=2)
+    next(results)
+    results.close()
+    # At most the rows already queued were composed, not all hundred
+    assert Assistant.calls <= 2 * 2 + 1
@@ -0,0 +1,91 @@
+"""Reply parsing: JSON dug out of fences and prose, scores coerced, broken replies kept for repair"""
+import pytest
+
+from email_assistant.parsing import (ParseStats, ReplyParseError, coerce_score, extract_json, normalize_analysis,
+                                     parse_analysis, supports_json_mode)
+
+ANALYSIS = '{"tone": "Friendly", "clarity_score": 8, "politeness_score": "9/10", "improvements": ["Add a subject"]}'
+
+
+def test_plain_json_parses_directly():
+    analysis, outcome = parse_analysis(ANALYSIS)
+    assert outcome == 'direct'
+    assert analysis == {'tone': 'Friendly', 'clarity_score': 8, 'politeness_score': 9,
+                        'improvements': ['Add a subject']}
+
+
+@pytest.mark.parametrize('reply', [
+    f"```json\n{ANALYSIS}\n```",
+    f"Sure! Here is the analysis:\n{ANALYSIS}\nLet me know if you need more.",
+    # A brace inside a string, and an earlier span that is not valid JSON
+    '{not json} then {"tone": "Formal {really}", "clarity_score": 7, "politeness_score": 6}',
+])
+def test_json_is_extracted_from_surrounding_text(reply):
+    analysis, outcome = parse_analysis(reply)
+    assert outcome == 'extracted'
+    assert analysis['clarity_score'] in (7, 8)
+
+
+def test_escaped_quotes_do_not_end_a_string():
+    value, extracted = extract_json('Result: {"tone": "say \\"hi}\\"", "n": 1} done', dict)
+    assert extracted and value == {'tone': 'say "hi}"', 'n': 1}
+
+
+def test_lists_and_objects_are_told_apart():
+    assert extract_json('[{"index": 0}]', list) == ([{'index': 0}], False)
+    # The whole reply is an array, so the object inside it has to be dug out
+    assert extract_json('[{"index": 0}]', dict) == ({'index': 0}, True)
+    with pytest.raises(ReplyParseError):
+        extract_json('{"index": 0}', list)
+
+
+@pytest.mark.parametrize('reply', [None, '', 'No JSON here', '{"tone": "x", "clarity_score": 5', '{"tone": "x"}',
+                                   '{"tone": "x", "clarity_score": "high", "politeness_score": 5}'])
+def test_unusable_replies_raise_with_the_text(reply):
+    with pytest.raises(ReplyParseError) as raised:
+        parse_analysis(reply)
+    # The raw reply is kept for the repair prompt
+    assert raised.value.text == (reply or '')
+
+
+@pytest.mark.parametrize('value, expected', [
+    (8, 8), (8.4, 8), (8.6, 9), ('8', 8), ('8/10', 8), ('Score: 7.5', 8), (0, 1), (15, 10), ('-3', 1),
+])
+def test_coerce_score(value, expected):
+    assert coerce_score(value) == expected
+
+
+@pytest.mark.parametrize('value', [True, None, 'high', ''])
+def test_coerce_score_rejects_non_numbers(value):
+    with pytest.raises(ValueError):
+        coerce_score(value)
+
+
+@pytest.mark.parametrize('improvements, expected', [
+    ('Be brief', ['Be brief']), ('  ', []), (['a', 'b'], ['a', 'b']), (3, ['3']),
+])
+def test_improvements_become_a_list(improvements, expected):
+    data = {'tone': 'x', 'clarity_score': 5, 'politeness_score': 5, 'improvements': improvements}
+    assert normalize_analysis(data)['improvements'] == expected
+
+
+def test_missing_improvements_and_odd_tones_are_filled_in():
+    assert normalize_analysis({'tone': 1, 'clarity_score': 5, 'politeness_score': 5}) == \
+        {'tone': '1', 'clarity_score': 5, 'politeness_score': 5, 'improvements': []}
+
+
+def test_parse_stats_rates():
+    stats = ParseStats()
+    for outcome in ('direct', 'direct', 'extracted', 'repaired'):
+        stats.record(outcome)
+    snapshot = stats.snapshot()
+    assert snapshot['replies'] == 4 and snapshot['extracted'] == 1
+    assert snapshot['parse_failure_rate'] == 0.25 and snapshot['repair_rate'] == 0.25
+    assert ParseStats().snapshot()['parse_failure_rate'] == 0.0
+
+
+@pytest.mark.parametrize('model, expected', [
+    ('gpt-4o-mini', True), ('gpt-3.5-turbo', True), ('gpt-3.5-turbo-0613', False), ('llama3', False),
+])
+def test_supports_json_mode(model, expected):
+    assert supports_json_mode(model) is expected
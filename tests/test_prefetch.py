@@ -0,0 +1,97 @@
+"""Prefetcher: hits hand over the reply, stale prefetches are cancelled and charged as waste, the cap holds"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.prefetch import Prefetcher
+
+EMAIL = "Hi Sam, could we move Thursday's review to Friday? Thanks, Alex"
+OTHER = "Hello team, the release is delayed by a week."
+
+
+@pytest.fixture
+def server():
+    server = MockOpenAIServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def assistant(server):
+    return EmailAssistant('sk-test', base_url=server.base_url)
+
+
+def futures(prefetcher):
+    """{email text: future} of the prefetches in flight"""
+    return {key[1]: task.future for key, task in prefetcher._tasks.items()}
+
+
+def test_prefetched_reply_is_handed_over(server, assistant):
+    prefetcher = Prefetcher(assistant, use_cache=False)
+    assert prefetcher.prefetch_improve(EMAIL, 'friendly')
+    assert prefetcher.prefetch_quick_reply(EMAIL)
+    # Already running: not sent twice
+    assert not prefetcher.prefetch_improve(EMAIL, 'friendly')
+    # Canned replies are instant and never prefetched
+    assert not prefetcher.prefetch_quick_reply(EMAIL, 'meeting')
+
+    assert prefetcher.improve(EMAIL, 'friendly', timeout=10) == assistant.improve_email(EMAIL, 'friendly',
+                                                                                          use_cache=False)
+    assert prefetcher.quick_reply(EMAIL, timeout=10)
+    # Taken replies are gone; another click makes its own request
+    assert prefetcher.improve(EMAIL, 'friendly') is None
+    stats = prefetcher.stats()
+    assert (stats['issued'], stats['hits'], stats['pending'], stats['wasted_tokens']) == (2, 2, 0, 0)
+    assert stats['spent'] > 0
+
+
+def test_cancelled_stream_stops_and_counts_as_waste(server, assistant):
+    server.token_delay = 0.05
+    prefetcher = Prefetcher(assistant, use_cache=False)
+    prefetcher.prefetch_improve(EMAIL)
+    prefetcher.prefetch_improve(OTHER)
+    running = futures(prefetcher)
+    time.sleep(0.3)
+    started = time.perf_counter()
+    prefetcher.cancel(keep_text=OTHER)
+    running[EMAIL].result()
+    # The mock sends dozens of chunks 50 ms apart; a cancelled stream stops at the next one
+    assert time.perf_counter() - started < 1.0
+    stats = prefetcher.stats()
+    assert stats['cancelled'] == 1 and stats['pending'] == 1
+    assert stats['wasted_tokens'] > 0 and stats['wasted_cost'] > 0
+    assert prefetcher.improve(EMAIL) is None
+    assert prefetcher.improve(OTHER, timeout=10)
+
+
+def test_queued_prefetch_is_cancelled_before_it_costs_anything(server, assistant):
+    server.latency = 0.3
+    prefetcher = Prefetcher(assistant, executor=ThreadPoolExecutor(max_workers=1), use_cache=False)
+    prefetcher.prefetch_quick_reply(EMAIL)
+    prefetcher.prefetch_quick_reply(OTHER)
+    running = futures(prefetcher)
+    prefetcher.cancel(keep_text=EMAIL)
+    wait(running.values())
+    assert server.requests == 1
+    assert prefetcher.stats()['cancelled'] == 1
+    assert prefetcher._reserved == pytest.approx(0.0)
+    assert prefetcher.quick_reply(EMAIL)
+
+
+def test_spend_cap_skips_prefetches(assistant):
+    prefetcher = Prefetcher(assistant, max_cost=0.0)
+    assert not prefetcher.prefetch_improve(EMAIL)
+    assert prefetcher.stats()['skipped'] == 1 and prefetcher.stats()['issued'] == 0
+
+
+def test_failed_prefetch_is_not_served(server, assistant):
+    server.error_rate, server.error_status = 1.0, 400
+    prefetcher = Prefetcher(assistant, use_cache=False)
+    prefetcher.prefetch_quick_reply(EMAIL)
+    # The foreground call would have fallen back, so the click makes its own request instead
+    assert prefetcher.quick_reply(EMAIL, timeout=10) is None
+    assert prefetcher.stats()['hits'] == 0
@@ -0,0 +1,75 @@
+"""strip_email keeps what the sender wrote and drops quoted history, signatures and disclaimers"""
+import pytest
+
+from email_assistant.preprocess import BODY, HISTORY, QUOTE, SIGNATURE, iter_segments, strip_email
+
+NEW = "Hi Sam,\n\nFriday works for me. Thanks!"
+
+
+@pytest.mark.parametrize('history', [
+    "On Mon, Jan 6, 2025 at 9:00 AM Sam <sam@example.com> wrote:\n> Does Friday work?\n> Sam",
+    # Header wrapped over two lines by the mail client
+    "On Mon, Jan 6, 2025 at 9:00 AM Sam Jones\n<sam@example.com> wrote:\n> Does Friday work?",
+    "Le lun. 6 janv. 2025 à 09:00, Sam <sam@example.com> a écrit :\n> Ça marche vendredi ?",
+    "-----Original Message-----\nFrom: Sam\nSent: Monday\nSubject: Friday\n\nDoes Friday work?",
+    "From: Sam Jones <sam@example.com>\nSent: Monday, January 6, 2025 9:00 AM\nTo: Alex\nSubject: Friday\n\nDoes "
+    "Friday work?",
+    "________________________________\nFrom: Sam\nDoes Friday work?",
+])
+def test_reply_history_is_dropped(history):
+    stripped = strip_email(f"{NEW}\n\n{history}\n")
+    assert stripped.text == NEW
+    assert HISTORY in {segment.kind for segment in stripped.removed}
+
+
+@pytest.mark.parametrize('footer', [
+    "--\nAlex Smith\nHead of Sales | +1 555 0100",
+    "-- \nAlex",
+    "Sent from my iPhone",
+    "Get Outlook for iOS",
+    "CONFIDENTIALITY NOTICE: This email and any attachments are for the sole use of the recipient.",
+    "This email and any files transmitted with it are confidential and intended solely for the addressee.",
+])
+def test_signatures_and_disclaimers_are_dropped(footer):
+    assert strip_email(f"{NEW}\n\n{footer}\n").text == NEW
+
+
+def test_inline_replies_keep_the_answers():
+    text = "> Can you make Friday?\nYes, after 2pm.\n> And bring the slides?\nWill do.\n"
+    stripped = strip_email(text)
+    assert stripped.text == "Yes, after 2pm.\nWill do."
+    assert [segment.kind for segment in stripped.segments] == [QUOTE, BODY, QUOTE, BODY]
+
+
+@pytest.mark.parametrize('text', [
+    "This email is to confirm our meeting on Friday.",
+    "On Friday we ship the release.\nFrom: the release notes, nothing changed.",
+    "The information you asked for is attached.",
+])
+def test_ordinary_sentences_stay(text):
+    assert strip_email(text).text == text
+
+
+def test_a_bare_forward_keeps_the_forwarded_message():
+    text = "---------- Forwarded message ---------\nFrom: Sam\nDate: Monday\n\nDoes Friday work?"
+    assert strip_email(text).text.endswith("Does Friday work?")
+
+
+def test_nothing_but_history_keeps_the_whole_text():
+    text = "> only a quote\n> and more"
+    stripped = strip_email(text)
+    assert stripped.text == text
+    assert strip_email('').text == ''
+
+
+def test_segments_cover_the_text_and_map_back():
+    text = f"{NEW}\n> quoted line\nMore news.\n--\nAlex\n"
+    segments = list(iter_segments(text))
+    assert segments[0].start == 0 and segments[-1].end == len(text)
+    assert all(a.end == b.start and a.kind != b.kind for a, b in zip(segments, segments[1:]))
+    assert segments[-1].kind == SIGNATURE
+
+    stripped = strip_email(text)
+    position = stripped.text.index("More news")
+    assert text[stripped.to_original(position):].startswith("More news")
+    assert text[:stripped.to_original(len(stripped.text))].endswith("More news.")
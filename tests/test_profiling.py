@@ -0,0 +1,49 @@
+"""Profiler.capture when captures from different sessions overlap"""
+import threading
+import tracemalloc
+
+from email_assistant.profiling import Profiler
+
+
+def test_overlapping_captures_share_tracemalloc():
+    assert not tracemalloc.is_tracing()
+    first, second = Profiler(), Profiler()
+    second_started, first_done = threading.Event(), threading.Event()
+    errors = []
+
+    def run_second():
+        try:
+            with second.capture('second'):
+                second_started.set()
+                first_done.wait(5)
+                # The first capture ended while this one was running; tracing must still be on
+                data = [bytes(1000) for _ in range(100)]
+            del data
+        except BaseException as e:
+            errors.append(e)
+            second_started.set()
+
+    with first.capture('first'):
+        data = bytearray(2_000_000)
+        del data
+        thread = threading.Thread(target=run_second)
+        thread.start()
+        second_started.wait(5)
+    first_done.set()
+    thread.join(5)
+
+    assert not errors
+    assert tracemalloc.is_tracing() is False
+    # Starting the second capture did not reset the first one's peak
+    assert first.captures[0].peak_memory >= 2_000_000
+    assert second.captures[0].allocations
+
+
+def test_capture_leaves_existing_tracing_running():
+    tracemalloc.start()
+    try:
+        with Profiler().capture('nested'):
+            pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
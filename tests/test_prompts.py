@@ -0,0 +1,49 @@
+"""Prompt builders: a fixed system prefix, the per-call values after it and the email last"""
+import pytest
+
+from email_assistant.assistant import EmailAssistant
+from email_assistant.prompts import PROMPTS, prompt_text
+
+assistant = EmailAssistant('sk-test')
+
+BUILDERS = {
+    'analyze': lambda email: assistant._analyze_prompt(email),
+    'improve': lambda email: assistant._improve_prompt(email, 'friendly'),
+    'quick_reply': lambda email: assistant._quick_prompt(email, 'custom'),
+    'analyze_many': lambda email: assistant._analyze_many_prompt(['First email.', email]),
+}
+
+
+@pytest.mark.parametrize('name', sorted(BUILDERS))
+def test_email_comes_last_after_a_shared_prefix(name):
+    first, second = BUILDERS[name]("Please send the report."), BUILDERS[name]("Can we meet on Monday?")
+    assert [message['role'] for message in first] == ['system', 'user']
+    # Only the user message varies, so providers can cache the system prefix
+    assert first[0] == second[0] == {'role': 'system', 'content': PROMPTS[name].instructions}
+    assert first[1]['content'].removesuffix('\n</email>').endswith("Please send the report.")
+
+
+def test_compose_prompt_fills_every_field():
+    content = assistant._compose_prompt('the launch', 'client', '- date\n- price', 'friendly')[1]['content']
+    for value in ('the launch', 'client', '- date\n- price', 'friendly'):
+        assert value in content
+    assert '{' not in content
+
+
+def test_analyze_many_prompt_numbers_the_emails():
+    content = assistant._analyze_many_prompt(['One.', 'Two.'])[1]['content']
+    assert content.startswith('2 emails:')
+    assert '<email index="0">\nOne.\n</email>' in content
+    assert '<email index="1">\nTwo.\n</email>' in content
+
+
+def test_prompt_text_joins_every_message():
+    messages = PROMPTS['repair'].render(reply='{"tone": ')
+    assert prompt_text(messages) == PROMPTS['repair'].instructions + '\nText: {"tone": '
+
+
+def test_fit_email_strips_history_before_cutting():
+    reply = "Thanks, Friday works.\n\nOn Mon, Jan 6, 2025 at 9:00 AM Sam <sam@example.com> wrote:\n> " + "old " * 500
+    text, saved = assistant._fit_email(reply)
+    assert text == "Thanks, Friday works."
+    assert saved > 400
@@ -0,0 +1,30 @@
+"""RuleSet.rewrite framing: a closing is added only where the draft has none"""
+import pytest
+
+from email_assistant.rewrite import DEFAULT_RULES, RuleSet
+
+rules = RuleSet(DEFAULT_RULES)
+
+
+@pytest.mark.parametrize('draft', [
+    "hey, i just wanted to say  the the meeting is moved , thx",
+    "Hi Bob, the meeting is moved. Thanks!",
+    "Hi Bob,\n\nSee attached.\n\nthx\nAnn",
+    "Hi Bob,\n\nSee attached.\n\nBest regards,\nAnn\n",
+])
+def test_existing_sign_off_is_kept_as_the_closing(draft):
+    result = rules.rewrite(draft)
+    assert 'closing' not in [edit.rule.name for edit in result.edits]
+    assert "Best regards" not in result.text or "Best regards" in draft
+
+
+def test_informal_sign_off_is_rewritten_without_a_second_closing():
+    assert rules.rewrite("hey, the meeting is moved, thx").text == "hey, the meeting is moved, thanks"
+
+
+@pytest.mark.parametrize('draft', [
+    "Hi Bob, the meeting is moved.",
+    "Hi Bob, I'd like to say thanks for the help.",
+])
+def test_closing_added_when_missing(draft):
+    assert rules.rewrite(draft).text.endswith("Best regards,\n[Your Name]")
@@ -0,0 +1,51 @@
+"""HybridAssistant routing: confidence scaled by length, fallbacks on API failure, every stream recorded"""
+import pytest
+
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import EmailAssistant
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.router import LONG_EMAIL_WORDS, HybridAssistant, analysis_confidence
+
+free = FreeEmailAssistant()
+
+
+def test_short_email_without_tone_evidence_is_not_trusted():
+    assert analysis_confidence(free, "Please send the report by Friday.") == 0.0
+
+
+def test_short_one_sided_email_is_trusted():
+    assert analysis_confidence(free, "Hey, cheers for that!") == 1.0
+
+
+def test_length_scales_the_evidence_down():
+    short = "Hey, cheers for that!"
+    longer = short + " word" * 150
+    assert 0.0 < analysis_confidence(free, longer) < analysis_confidence(free, short)
+    assert analysis_confidence(free, short + " word" * LONG_EMAIL_WORDS) == 0.0
+
+
+@pytest.fixture
+def server():
+    server = MockOpenAIServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_failed_quick_reply_falls_back_to_the_rules(server):
+    server.error_rate, server.error_status = 1.0, 400
+    hybrid = HybridAssistant(free, EmailAssistant('sk-test', base_url=server.base_url))
+    reply = hybrid.quick_responses("Can we move the call to Thursday?", 'custom')
+    assert reply == free.quick_responses("Can we move the call to Thursday?", 'custom')
+    assert hybrid.last_decision.route == 'fallback'
+    assert hybrid.stats.snapshot()['api'] == 0
+
+
+def test_stream_closed_early_is_still_recorded(server):
+    hybrid = HybridAssistant(free, EmailAssistant('sk-test', base_url=server.base_url))
+    stream = hybrid.compose_email_stream('a chat', 'colleague', 'nothing much', 'casual', force_api=True)
+    next(iter(stream))
+    stream.close()
+    assert hybrid.last_decision.route == 'api'
+    assert hybrid.last_decision.forced
+    assert hybrid.stats.snapshot()['api'] == 1
@@ -0,0 +1,195 @@
+"""RequestScheduler retries, Retry-After handling and circuit breaker states, directly and against the mock endpoint"""
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant import scheduler as scheduler_module
+from email_assistant.assistant import EmailAssistant
+from email_assistant.scheduler import CircuitBreaker, CircuitOpenError, DeadlineExceeded, RequestScheduler
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type('Response', (), {'headers': headers or {}})()
+
+
+def make_scheduler(**kwargs):
+    kwargs.setdefault('breaker', CircuitBreaker(failure_threshold=kwargs.pop('failure_threshold', 5),
+                                                reset_timeout=kwargs.pop('reset_timeout', 30)))
+    return RequestScheduler(requests_per_minute=6000, tokens_per_minute=10 ** 6, base_delay=0.001, **kwargs)
+
+
+def failing(*errors, result='ok'):
+    """fn raising each of errors in turn, then returning result; calls counts the attempts"""
+    errors = list(errors)
+
+    def fn(timeout=None):
+        fn.calls += 1
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    fn.calls = 0
+    return fn
+
+
+def open_breaker(scheduler):
+    """Trip the breaker and make it due for a trial call"""
+    breaker = scheduler.breaker
+    breaker.state = 'open'
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+
+def test_retries_transient_errors():
+    scheduler = make_scheduler()
+    fn = failing(APIError(503), APIError(429))
+    assert scheduler.call(fn) == 'ok'
+    assert fn.calls == 3
+    assert scheduler.retries == 2
+    assert scheduler.breaker.state == 'closed'
+
+
+def test_does_not_retry_client_errors():
+    scheduler = make_scheduler()
+    fn = failing(APIError(400))
+    with pytest.raises(APIError):
+        scheduler.call(fn)
+    assert fn.calls == 1
+    assert scheduler.breaker.failures == 0
+
+
+def test_gives_up_after_max_retries():
+    scheduler = make_scheduler(max_retries=2)
+    fn = failing(*[APIError(500)] * 5)
+    with pytest.raises(APIError):
+        scheduler.call(fn)
+    assert fn.calls == 3
+
+
+def test_backoff_grows_and_honors_retry_after(monkeypatch):
+    delays = []
+    monkeypatch.setattr(scheduler_module.time, 'sleep', delays.append)
+    scheduler = make_scheduler(max_delay=10)
+    scheduler.base_delay = 1
+    fn = failing(APIError(503), APIError(503), APIError(429, {'retry-after-ms': '250'}),
+                 APIError(429, {'retry-after': '3'}))
+    assert scheduler.call(fn) == 'ok'
+    # Jittered exponential backoff: within [cap / 2, cap] for caps 1 and 2
+    assert 0.5 <= delays[0] <= 1 and 1 <= delays[1] <= 2
+    assert delays[2:] == [0.25, 3.0]
+
+
+def test_retry_after_past_the_deadline_gives_up():
+    scheduler = make_scheduler()
+    fn = failing(APIError(429, {'retry-after': '30'}))
+    start = time.monotonic()
+    with pytest.raises(APIError):
+        scheduler.call(fn, deadline=1)
+    assert time.monotonic() - start < 0.5
+
+
+def test_breaker_opens_rejects_then_closes_after_successful_trial():
+    scheduler = make_scheduler(max_retries=0, failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(APIError):
+            scheduler.call(failing(APIError(503)))
+    assert scheduler.breaker.state == 'open'
+    fn = failing()
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(fn)
+    assert fn.calls == 0
+
+    time.sleep(0.06)
+    assert scheduler.call(fn) == 'ok'
+    assert scheduler.breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_breaker():
+    scheduler = make_scheduler(max_retries=0, reset_timeout=0.05)
+    open_breaker(scheduler)
+    with pytest.raises(APIError):
+        scheduler.call(failing(APIError(503)))
+    assert scheduler.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(failing())
+
+
+def test_trial_missing_its_deadline_frees_the_trial_slot():
+    scheduler = make_scheduler()
+    open_breaker(scheduler)
+    # The trial would have to wait for the request bucket past its deadline
+    scheduler.requests.level = -100
+    with pytest.raises(DeadlineExceeded):
+        scheduler.call(failing(), deadline=0.01)
+    assert scheduler.breaker.state == 'open'
+
+    scheduler.requests.level = scheduler.requests.capacity
+    assert scheduler.call(failing()) == 'ok'
+    assert scheduler.breaker.state == 'closed'
+
+
+def test_cancelled_async_trial_frees_the_slot_and_refunds_tokens():
+    scheduler = make_scheduler()
+    open_breaker(scheduler)
+
+    async def hang(timeout=None):
+        await asyncio.sleep(10)
+
+    async def ok(timeout=None):
+        return 'ok'
+
+    async def main():
+        level = scheduler.tokens.level
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.call_async(hang, tokens=1000), 0.01)
+        assert scheduler.breaker.state == 'open'
+        assert scheduler.tokens.level == pytest.approx(level, abs=1)
+        return await scheduler.call_async(ok)
+
+    assert asyncio.run(main()) == 'ok'
+    assert scheduler.breaker.state == 'closed'
+
+
+def test_failed_call_refunds_its_tokens():
+    scheduler = make_scheduler(max_retries=0)
+    level = scheduler.tokens.level
+    with pytest.raises(APIError):
+        scheduler.call(failing(APIError(503)), tokens=5000)
+    assert scheduler.tokens.level == pytest.approx(level, abs=1)
+
+
+@pytest.fixture
+def server():
+    server = MockOpenAIServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_stub_server_retry_after(server):
+    server.error_rate, server.error_status, server.retry_after = 1.0, 429, 0.05
+    assistant = EmailAssistant('sk-test', base_url=server.base_url, scheduler=make_scheduler(max_retries=2))
+    start = time.monotonic()
+    assert 'error' in assistant.analyze_email_tone("Please send the report.", use_cache=False)
+    assert server.requests == 3
+    assert time.monotonic() - start >= 0.1
+
+
+def test_stub_server_breaker_recovers(server):
+    scheduler = make_scheduler(max_retries=0, failure_threshold=2, reset_timeout=0.2)
+    assistant = EmailAssistant('sk-test', base_url=server.base_url, scheduler=scheduler)
+    server.error_rate = 1.0
+    for _ in range(3):
+        assert 'error' in assistant.analyze_email_tone("Please send the report.", use_cache=False)
+    # The third call was rejected by the open breaker without reaching the server
+    assert server.requests == 2
+    assert not assistant.backends.primary.healthy
+
+    server.error_rate = 0.0
+    time.sleep(0.25)
+    assert 'error' not in assistant.analyze_email_tone("Please send the report.", use_cache=False)
+    assert scheduler.breaker.state == 'closed'
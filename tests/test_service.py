@@ -0,0 +1,106 @@
+"""The HTTP service through Starlette's TestClient: endpoints, NDJSON streams and request errors"""
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from benchmarks.mock_openai import MockOpenAIServer
+from email_assistant.assistant import AsyncEmailAssistant
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.service import NDJSON, AssistantService, create_app
+
+EMAIL = "Hi Sam, could you please send the report by Friday? Thanks, Alex"
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = MockOpenAIServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client_for(factory):
+    with TestClient(create_app(factory)) as client:
+        yield client
+
+
+@pytest.fixture
+def client(server):
+    yield from client_for(lambda: AssistantService(AsyncEmailAssistant('sk-test', base_url=server.base_url),
+                                                   FreeEmailAssistant(), max_batch=10))
+
+
+@pytest.fixture
+def free_client():
+    yield from client_for(lambda: AssistantService(None, FreeEmailAssistant()))
+
+
+def lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_health(client, free_client):
+    assert client.get('/health').json()['engines'] == ['free', 'ai']
+    assert free_client.get('/health').json() == {'status': 'ok', 'engines': ['free']}
+
+
+@pytest.mark.parametrize('engine', ['ai', 'free'])
+def test_single_endpoints(client, engine):
+    analysis = client.post('/analyze', json={'email': EMAIL, 'engine': engine}).json()
+    assert analysis['engine'] == engine
+    assert {'tone', 'clarity_score', 'politeness_score', 'improvements'} <= set(analysis['result'])
+    composed = client.post('/compose', json={'purpose': 'the launch', 'recipient_type': 'Client',
+                                             'key_points': 'date\nprice', 'engine': engine}).json()
+    assert composed['result'].startswith('Subject:')
+    reply = client.post('/quick-reply', json={'email': EMAIL, 'response_type': 'meeting', 'engine': engine})
+    assert reply.status_code == 200 and reply.json()['result']
+
+
+def test_engine_defaults_to_ai_when_available(client, free_client):
+    assert client.post('/analyze', json={'email': EMAIL}).json()['engine'] == 'ai'
+    assert free_client.post('/analyze', json={'email': EMAIL}).json()['engine'] == 'free'
+
+
+@pytest.mark.parametrize('engine', ['ai', 'free'])
+def test_streamed_improve_ends_with_the_whole_reply(client, engine):
+    response = client.post('/improve', json={'email': EMAIL, 'engine': engine, 'stream': True})
+    assert response.headers['content-type'].startswith(NDJSON)
+    *deltas, done = lines(response)
+    assert deltas and all('delta' in line for line in deltas)
+    assert done['done'] and done['engine'] == engine
+    assert done['result'].strip() == ''.join(line['delta'] for line in deltas).strip()
+
+
+@pytest.mark.parametrize('engine', ['ai', 'free'])
+def test_batch_results_keep_input_order(client, engine):
+    items = [{'email': f"{EMAIL} Item {i}."} for i in range(5)]
+    results = client.post('/analyze/batch', json={'items': items, 'engine': engine}).json()['results']
+    assert len(results) == 5 and all('tone' in result for result in results)
+
+    # Streamed, every item comes back once, tagged with its index, in whatever order it finished
+    response = client.post('/quick-reply/batch', json={'items': items, 'engine': engine},
+                           headers={'accept': NDJSON})
+    assert sorted(line['index'] for line in lines(response)) == list(range(5))
+
+
+def test_unavailable_engine_is_503(free_client):
+    response = free_client.post('/analyze', json={'email': EMAIL, 'engine': 'ai'})
+    assert response.status_code == 503
+    assert response.json() == {'error': "Engine 'ai' is not available"}
+
+
+@pytest.mark.parametrize('path, body, status', [
+    ('/analyze', 'not json', 400),
+    ('/analyze', '["a list"]', 400),
+    ('/analyze', '{"email": 5}', 400),
+    ('/compose', '{"purpose": "x"}', 400),
+    ('/analyze', '{"email": "x", "engine": "other"}', 400),
+    ('/analyze/batch', '{"items": "x"}', 400),
+    ('/analyze/batch', '{"items": [{"email": "x"}, {"text": "y"}]}', 400),
+    ('/analyze/batch', json.dumps({'items': [{'email': 'x'}] * 11}), 413),
+])
+def test_bad_requests(client, path, body, status):
+    response = client.post(path, content=body, headers={'content-type': 'application/json'})
+    assert response.status_code == status
+    assert response.json()['error']
@@ -0,0 +1,37 @@
+"""AnalysisStore versioning: rows of different versions coexist, prune drops stale versions"""
+from email_assistant.free import FreeEmailAssistant
+from email_assistant.store import AnalysisStore
+
+ANALYSIS = {'tone': 'Neutral', 'clarity_score': 8, 'politeness_score': 5, 'improvements': []}
+
+
+def test_versions_coexist(tmp_path):
+    store = AnalysisStore(str(tmp_path / 'store.db'))
+    store.put('openai', 'primary', 'k', ANALYSIS)
+    store.put('openai', 'fallback', 'k', dict(ANALYSIS, tone='Friendly'))
+    # Looking up one version leaves the other's rows alone
+    assert store.get('openai', 'fallback', 'k')['tone'] == 'Friendly'
+    assert store.get('openai', 'primary', 'k')['tone'] == 'Neutral'
+    assert store.get('openai', 'other', 'k') is None
+    store.close()
+
+    reopened = AnalysisStore(str(tmp_path / 'store.db'))
+    assert reopened.counts() == {('openai', 'primary'): 1, ('openai', 'fallback'): 1}
+    assert reopened.get('openai', 'primary', 'k')['tone'] == 'Neutral'
+
+
+def test_prune_keeps_latest_versions(tmp_path):
+    store = AnalysisStore(str(tmp_path / 'store.db'))
+    for version in ('v1', 'v2', 'v3'):
+        store.put_many('free', version, [('a', ANALYSIS), ('b', ANALYSIS)])
+    store.put('openai', 'x', 'a', ANALYSIS)
+    assert store.prune(keep=1) == 4
+    assert store.counts() == {('free', 'v3'): 2, ('openai', 'x'): 1}
+    assert store.get('free', 'v1', 'a') is None
+
+
+def test_free_version_tracks_word_lists():
+    class Renamed(FreeEmailAssistant):
+        lexicon = type(FreeEmailAssistant.lexicon)({'polite': ['please']})
+
+    assert Renamed().analysis_version != FreeEmailAssistant().analysis_version
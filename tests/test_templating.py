@@ -0,0 +1,97 @@
+"""Template compilation matches str.format, bad templates fail with ValueError, and reload keeps the last good set"""
+import os
+
+import pytest
+
+from email_assistant.templating import CompiledTemplate, TemplateLibrary, load_template
+
+DEFAULT = '''default = true
+triggers = ["follow"]
+subject = "Re: {purpose}"
+body = "Hi {recipient}, following up on {purpose}."
+'''
+
+FRIENDLY = '''tones = ["friendly"]
+priority = 10
+subject = "{purpose}"
+body = "Hi {recipient}!"
+'''
+
+
+def write(directory, name, text):
+    path = directory / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('source', [
+    'Hello {name}, {count:>5d} items {price:.2f} {name!r}',
+    'No fields at all',
+    'Braces {{kept}} and quotes \' " \\ here {x}',
+    '',
+])
+def test_render_matches_format(source):
+    values = {'name': "O'Brien", 'count': 3, 'price': 1.5, 'x': 'y'}
+    template = CompiledTemplate(source)
+    assert template.render(**values) == source.format(**values)
+    assert template.render_many([values, dict(values, count=7)]) == [
+        source.format(**values), source.format(**dict(values, count=7))]
+
+
+@pytest.mark.parametrize('source', ['{a.b}', '{a[0]}', '{_private}', '{class}', '{x:{y}}', '{x!z}', '{x:"}'])
+def test_unsupported_templates_raise_value_error(source):
+    with pytest.raises(ValueError):
+        CompiledTemplate(source)
+
+
+def test_load_template_names_the_file(tmp_path):
+    path = write(tmp_path, 'bad.toml', 'subject = "{x!z}"\nbody = "b"\n')
+    with pytest.raises(ValueError, match='bad.toml'):
+        load_template(path)
+    missing = write(tmp_path, 'missing.toml', 'subject = "s"\n')
+    with pytest.raises(ValueError, match="missing.toml: template is missing 'body'"):
+        load_template(missing)
+
+
+def test_select(tmp_path):
+    write(tmp_path, 'follow_up.toml', DEFAULT)
+    write(tmp_path, 'friendly.toml', FRIENDLY)
+    library = TemplateLibrary(str(tmp_path))
+    assert sorted(library) == ['follow_up', 'friendly']
+    assert library.select('Following up on the invoice').name == 'follow_up'
+    assert library.select('the invoice', 'Friendly').name == 'friendly'
+    assert library.select('something else').name == 'follow_up'
+
+
+def test_reload_keeps_previous_templates_on_error(tmp_path):
+    write(tmp_path, 'follow_up.toml', DEFAULT)
+    write(tmp_path, 'friendly.toml', FRIENDLY)
+    library = TemplateLibrary(str(tmp_path))
+    assert len(library) == 2
+
+    write(tmp_path, 'friendly.toml', FRIENDLY.replace('{recipient}', '{recipient!z}'))
+    with pytest.raises(ValueError, match='friendly.toml'):
+        library.reload()
+    assert library['friendly'].body.render(recipient='Sam') == 'Hi Sam!'
+
+    write(tmp_path, 'friendly.toml', FRIENDLY)
+    write(tmp_path, 'copy.toml', 'name = "follow_up"\n' + DEFAULT)
+    with pytest.raises(ValueError, match='defined in both'):
+        library.reload()
+    assert sorted(library) == ['follow_up', 'friendly']
+
+
+def test_reload_picks_up_edits(tmp_path):
+    write(tmp_path, 'follow_up.toml', DEFAULT)
+    path = write(tmp_path, 'friendly.toml', FRIENDLY)
+    library = TemplateLibrary(str(tmp_path))
+    assert library.reload() == ['follow_up', 'friendly']
+    assert library.reload() == []
+
+    write(tmp_path, 'friendly.toml', FRIENDLY.replace('Hi {recipient}!', 'Hey there {recipient}!'))
+    assert library.reload() == ['friendly']
+    assert library['friendly'].body.render(recipient='Sam') == 'Hey there Sam!'
+
+    os.remove(path)
+    assert library.reload() == ['friendly']
+    assert list(library) == ['follow_up']
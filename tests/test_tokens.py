@@ -0,0 +1,52 @@
+"""fit_tokens keeps the start and end of an email within budget and counts what it left out"""
+import re
+
+import pytest
+
+from email_assistant import tokens
+from email_assistant.tokens import count_tokens, fit_tokens
+
+
+class WordEncoding:
+    """One token per whitespace-separated word, so short words cost more per character than long ones"""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(params=['gpt-3.5-turbo', 'words'])
+def model(request, monkeypatch):
+    if request.param == 'words':
+        monkeypatch.setitem(tokens._encodings, 'words', WordEncoding())
+    return request.param
+
+
+def split(text):
+    head, omitted, tail = re.fullmatch(r'(.*)\n\[\.\.\. (\d+) tokens omitted \.\.\.\]\n?(.*)', text, re.S).groups()
+    return head, int(omitted), tail
+
+
+def test_text_within_budget_is_unchanged(model):
+    assert fit_tokens("Short email.", 100, model) == ("Short email.", 0)
+
+
+@pytest.mark.parametrize('text', [
+    ' '.join(f'word{i}' for i in range(3000)),
+    # Dense at the start and sparse at the end, so the first cut misses the budget for a word tokenizer
+    'a ' * 2000 + ' '.join('x' * 40 for _ in range(400)),
+], ids=['uniform', 'dense_then_sparse'])
+def test_marker_counts_everything_left_out(model, text):
+    total = count_tokens(text, model)
+    fitted, saved = fit_tokens(text, 200, model)
+    assert count_tokens(fitted, model) <= 200
+    assert saved == total - count_tokens(fitted, model)
+    head, omitted, tail = split(fitted)
+    assert text.startswith(head) and text.endswith(tail)
+    assert omitted == total - count_tokens(head, model) - count_tokens(tail, model)
+
+
+def test_tiny_budget_terminates(model):
+    text = 'word ' * 500
+    fitted, saved = fit_tokens(text, 1, model)
+    assert 'tokens omitted' in fitted
+    assert saved > 0